@@ -0,0 +1,165 @@
+"""
+Cache of verified API keys.
+
+Verifying an API key hashes it with the (deliberately slow) password hasher and loads the key,
+account and user in separate queries. Once a key has been verified, the resolved objects are cached
+by the prefix of the key, together with a SHA-256 digest of the full key. A request is only served
+from the cache if the digest of the key it presents matches.
+
+The cache has a bounded per-process tier and an optional shared tier (the Django cache, Redis).
+Entries are invalidated when an API key is saved or deleted. The per-process tier of the other
+processes is not reached: a key revoked (or whose expiry date is changed) in another process is
+still accepted by this process until its entry expires, at most `API_KEY_CACHE_TTL` seconds later.
+An expiry date passing while the key is cached is checked on every hit.
+"""
+import hashlib
+import hmac
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+import api_logging as logging
+from django.conf import settings
+from django.contrib.auth.models import AbstractBaseUser
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from scorer.lru_cache import ExpiringLRUCache
+
+from .models import Account, AccountAPIKey
+
+log = logging.getLogger(__name__)
+
+local_api_key_cache = ExpiringLRUCache("api_keys", settings.API_KEY_CACHE_SIZE)
+
+
+@dataclass
+class VerifiedApiKey:
+    # SHA-256 digest of the full key
+    digest: str
+    api_key: AccountAPIKey
+    account: Optional[Account]
+    user: Optional[AbstractBaseUser]
+
+
+def is_shared_api_key_cache_enabled() -> bool:
+    return settings.FF_API_KEY_SHARED_CACHE == "on"
+
+
+def get_key_digest(key: str) -> str:
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+def get_api_key_cache_key(prefix: str) -> str:
+    return f"api-key:{prefix}"
+
+
+def _match(verified: Optional[VerifiedApiKey], key: str) -> Optional[VerifiedApiKey]:
+    if (
+        verified
+        and hmac.compare_digest(verified.digest, get_key_digest(key))
+        and not verified.api_key.revoked
+        and not verified.api_key.has_expired
+    ):
+        return verified
+    return None
+
+
+def get_verified_api_key(key: str) -> Optional[VerifiedApiKey]:
+    prefix, _, _ = key.partition(".")
+    cache_key = get_api_key_cache_key(prefix)
+
+    verified = local_api_key_cache.get(cache_key)
+    if verified is None and is_shared_api_key_cache_enabled():
+        try:
+            verified = cache.get(cache_key)
+        except Exception:
+            log.warning("Failed to read API key cache", exc_info=True)
+        if verified:
+            _set_local(cache_key, verified)
+
+    return _match(verified, key)
+
+
+async def aget_verified_api_key(key: str) -> Optional[VerifiedApiKey]:
+    prefix, _, _ = key.partition(".")
+    cache_key = get_api_key_cache_key(prefix)
+
+    verified = local_api_key_cache.get(cache_key)
+    if verified is None and is_shared_api_key_cache_enabled():
+        try:
+            verified = await cache.aget(cache_key)
+        except Exception:
+            log.warning("Failed to read API key cache", exc_info=True)
+        if verified:
+            _set_local(cache_key, verified)
+
+    return _match(verified, key)
+
+
+def _set_local(cache_key: str, verified: VerifiedApiKey) -> None:
+    local_api_key_cache.set(
+        cache_key, verified, time.time() + settings.API_KEY_CACHE_TTL
+    )
+
+
+def cache_verified_api_key(
+    key: str,
+    api_key: AccountAPIKey,
+    account: Optional[Account],
+    user: Optional[AbstractBaseUser],
+) -> VerifiedApiKey:
+    """
+    Cache an API key that has been verified against its hashed key
+    """
+    verified = VerifiedApiKey(get_key_digest(key), api_key, account, user)
+    cache_key = get_api_key_cache_key(api_key.prefix)
+    _set_local(cache_key, verified)
+
+    if is_shared_api_key_cache_enabled():
+        try:
+            cache.set(cache_key, verified, settings.API_KEY_CACHE_TTL)
+        except Exception:
+            log.warning("Failed to write API key cache", exc_info=True)
+
+    return verified
+
+
+async def acache_verified_api_key(
+    key: str,
+    api_key: AccountAPIKey,
+    account: Optional[Account],
+    user: Optional[AbstractBaseUser],
+) -> VerifiedApiKey:
+    verified = VerifiedApiKey(get_key_digest(key), api_key, account, user)
+    cache_key = get_api_key_cache_key(api_key.prefix)
+    _set_local(cache_key, verified)
+
+    if is_shared_api_key_cache_enabled():
+        try:
+            await cache.aset(cache_key, verified, settings.API_KEY_CACHE_TTL)
+        except Exception:
+            log.warning("Failed to write API key cache", exc_info=True)
+
+    return verified
+
+
+def invalidate_api_key(prefix: str) -> None:
+    cache_key = get_api_key_cache_key(prefix)
+    local_api_key_cache.delete(cache_key)
+
+    if is_shared_api_key_cache_enabled():
+        try:
+            cache.delete(cache_key)
+        except Exception:
+            log.error("Failed to invalidate API key cache", exc_info=True)
+
+
+@receiver(post_save, sender=AccountAPIKey)
+@receiver(post_delete, sender=AccountAPIKey)
+def api_key_changed(sender, instance, **kwargs):
+    # Invalidate right away for this process, and again after the commit so that a concurrent
+    # request cannot cache the previous version of the key in between
+    invalidate_api_key(instance.prefix)
+    transaction.on_commit(lambda: invalidate_api_key(instance.prefix))
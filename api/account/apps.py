@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class AccountConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "account"
+
+    def ready(self):
+        # Connect the signal receivers that invalidate the API key cache
+        import account.api_key_cache  # noqa: F401
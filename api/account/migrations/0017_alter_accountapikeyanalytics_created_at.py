@@ -0,0 +1,20 @@
+# Generated by Django 4.2.6 on 2026-10-19 09:21
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("account", "0016_accountapikey_create_scorers_and_more"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="accountapikeyanalytics",
+            name="created_at",
+            field=models.DateTimeField(
+                blank=True, default=django.utils.timezone.now, null=True
+            ),
+        ),
+    ]
@@ -8,6 +8,7 @@ from typing import Optional, Type
 import api_logging as logging
 from django.conf import settings
 from django.db import models
+from django.utils.timezone import now
 from rest_framework_api_key.models import AbstractAPIKey
 from scorer_weighted.models import BinaryWeightedScorer, Scorer, WeightedScorer
 
@@ -149,7 +150,8 @@ class AccountAPIKeyAnalytics(models.Model):
     api_key = models.ForeignKey(
         AccountAPIKey, on_delete=models.CASCADE, related_name="analytics"
     )
-    created_at = models.DateTimeField(auto_now_add=True, null=True, blank=True)
+    # Not `auto_now_add`, analytics are written in batches and keep the time of the request
+    created_at = models.DateTimeField(default=now, null=True, blank=True)
     path = models.CharField(max_length=100, blank=False, null=False, default="/")
 
 
@@ -2,6 +2,7 @@
 from scorer.test.conftest import (
     access_token,
     scorer_account,
+    scorer_api_key,
     scorer_community,
     scorer_user,
 )
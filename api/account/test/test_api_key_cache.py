@@ -0,0 +1,96 @@
+from datetime import timedelta
+from unittest.mock import patch
+
+import pytest
+from account.api_key_cache import local_api_key_cache
+from account.models import AccountAPIKey
+from django.conf import settings
+from django.test import Client
+from django.utils import timezone
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture(autouse=True)
+def clear_api_key_cache():
+    local_api_key_cache.clear()
+    yield
+    local_api_key_cache.clear()
+
+
+def get_signing_message(api_key):
+    return Client().get("/registry/signing-message", HTTP_X_API_KEY=api_key)
+
+
+def test_verified_api_key_is_cached(scorer_api_key):
+    with patch.object(
+        AccountAPIKey.objects,
+        "get_from_key",
+        wraps=AccountAPIKey.objects.get_from_key,
+    ) as get_from_key:
+        for _ in range(3):
+            assert get_signing_message(scorer_api_key).status_code == 200
+
+    get_from_key.assert_called_once()
+
+
+def test_cached_prefix_with_wrong_secret_is_rejected(scorer_api_key):
+    assert get_signing_message(scorer_api_key).status_code == 200
+
+    prefix, _, secret = scorer_api_key.partition(".")
+    wrong_key = f"{prefix}.{'x' * len(secret)}"
+    assert get_signing_message(wrong_key).status_code == 401
+
+
+def test_revoked_api_key_is_invalidated(scorer_api_key):
+    assert get_signing_message(scorer_api_key).status_code == 200
+
+    api_key = AccountAPIKey.objects.get_from_key(scorer_api_key)
+    api_key.revoked = True
+    api_key.save()
+
+    assert get_signing_message(scorer_api_key).status_code == 401
+
+
+def test_deleted_api_key_is_invalidated(scorer_api_key, access_token):
+    assert get_signing_message(scorer_api_key).status_code == 200
+
+    api_key = AccountAPIKey.objects.get_from_key(scorer_api_key)
+    response = Client().delete(
+        f"/account/api-key/{api_key.id}",
+        HTTP_AUTHORIZATION=f"Bearer {access_token}",
+    )
+    assert response.status_code == 200
+
+    assert get_signing_message(scorer_api_key).status_code == 401
+
+
+def test_api_key_expiring_while_cached_is_rejected(scorer_account):
+    (_, key) = AccountAPIKey.objects.create_key(
+        account=scorer_account,
+        name="Expiring token",
+        expiry_date=timezone.now() + timedelta(hours=1),
+    )
+    assert get_signing_message(key).status_code == 200
+
+    with patch(
+        "django.utils.timezone.now",
+        return_value=timezone.now() + timedelta(hours=2),
+    ):
+        assert get_signing_message(key).status_code == 401
+
+
+def test_revocation_by_another_process_is_applied_after_the_ttl(scorer_api_key):
+    assert get_signing_message(scorer_api_key).status_code == 200
+
+    # Revoked by another process, which does not reach the local cache of this one
+    AccountAPIKey.objects.filter(prefix=scorer_api_key.partition(".")[0]).update(
+        revoked=True
+    )
+    assert get_signing_message(scorer_api_key).status_code == 200
+
+    now = local_api_key_cache.clock()
+    with patch.object(
+        local_api_key_cache, "clock", lambda: now + settings.API_KEY_CACHE_TTL
+    ):
+        assert get_signing_message(scorer_api_key).status_code == 401
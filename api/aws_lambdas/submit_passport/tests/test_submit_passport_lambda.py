@@ -3,6 +3,8 @@ import json
 from copy import deepcopy
 
 import pytest
+from account.models import AccountAPIKeyAnalytics
+from django.test import override_settings
 
 from aws_lambdas.scorer_api_passport.tests.helpers import MockContext
 from registry.test.test_passport_submission import mock_passport
@@ -167,6 +169,27 @@ def test_successful_authentication_and_base64_encoded_body(
             assert response["statusCode"] == 200
 
 
+@override_settings(FF_API_ANALYTICS="on")
+def test_analytics_are_saved_by_each_invocation(
+    scorer_api_key,
+    scorer_community_with_binary_scorer,
+    passport_holder_addresses,
+    mocker,
+):
+    mocker.patch("registry.atasks.aget_passport", return_value=mock_passport)
+    mocker.patch("registry.atasks.validate_credential", side_effect=[[], [], []])
+    address = passport_holder_addresses[0]["address"].lower()
+    event = make_test_event(
+        scorer_api_key, address, scorer_community_with_binary_scorer.id
+    )
+
+    response = handler(event, MockContext())
+
+    assert response["statusCode"] == 200
+    # Written before the invocation returns, not by a background thread
+    assert AccountAPIKeyAnalytics.objects.count() == 1
+
+
 def test_unsucessfull_auth(scorer_account, scorer_community_with_binary_scorer):
     """
     Tests that authentication fails given incorrect credentials.
@@ -25,8 +25,13 @@ import api_logging as logging
 
 logger = logging.getLogger(__name__)
 
+from registry.analytics import api_key_analytics_buffer
 from registry.exceptions import Unauthorized
 
+# Lambda freezes the process between invocations (and does not reliably run `atexit`), so the
+# buffered API key analytics are written at the end of each invocation instead of by a thread
+api_key_analytics_buffer.background = False
+
 RESPONSE_HEADERS = {
     "Content-Type": "application/json",
     "Access-Control-Allow-Origin": "*",
@@ -68,6 +73,8 @@ def with_request_exception_handling(func):
                 "headers": RESPONSE_HEADERS,
                 "body": '{"error": "' + message + '"}',
             }
+        finally:
+            api_key_analytics_buffer.flush()
 
     return wrapper
 
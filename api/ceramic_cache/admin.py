@@ -9,11 +9,18 @@ from .models import CeramicCache
 
 @admin.register(CeramicCache)
 class CeramicCacheAdmin(ScorerModelAdmin):
-    list_display = ("id", "address", "provider", "stamp")
+    list_display = ("id", "address", "provider", "stamp_credential")
+    list_select_related = ("stamp_ref",)
     search_fields = ("address",)
     search_help_text = "This will perform a search by 'address'"
     show_full_result_count = False
 
+    def stamp_credential(self, obj):
+        # `stamp` is empty for the stamps in the credential store
+        return obj.get_stamp()
+
+    stamp_credential.short_description = "Stamp"
+
 
 class AccountAPIKeyAdmin(ScorerModelAdmin):
     list_display = ("id", "name", "prefix", "created", "expiry_date", "revoked")
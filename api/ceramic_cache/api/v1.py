@@ -1,7 +1,8 @@
 """Ceramic Cache API"""
 
 from datetime import datetime, timedelta
-from typing import Any, Dict, List, Optional, Type
+from hashlib import sha256
+from typing import Any, Dict, List, Optional, Tuple, Type
 
 import api_logging as logging
 import requests
@@ -10,7 +11,8 @@ from asgiref.sync import async_to_sync
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import AbstractUser
-from django.http import HttpRequest
+from django.db.models import Count, Max
+from django.http import HttpRequest, HttpResponse
 from django.shortcuts import get_object_or_404
 from ninja import Router, Schema
 from ninja_extra import status
@@ -22,14 +24,19 @@ from ninja_jwt.authentication import InvalidToken
 from ninja_jwt.settings import api_settings
 from ninja_jwt.tokens import RefreshToken, Token, TokenError
 from ninja_schema import Schema
+from registry.api.utils import get_not_modified_response, make_etag
 from registry.api.v1 import (
     DetailedScoreResponse,
     SubmitPassportPayload,
     ahandle_submit_passport,
+    get_score_validators,
     handle_get_score,
     handle_submit_passport,
 )
 from registry.models import Score
+from registry.score_cache import get_cached_score, is_score_cache_enabled
+from scorer.db_router import set_request_address
+from scorer.lru_cache import ExpiringLRUCache
 
 from ..exceptions import (
     InternalServerException,
@@ -37,7 +44,7 @@ from ..exceptions import (
     TooManyStampsException,
 )
 from ..models import CeramicCache
-from ..utils import validate_dag_jws_payload, verify_jws
+from ..utils import validate_dag_jws_nonce_payload, verify_jws
 
 log = logging.getLogger(__name__)
 
@@ -52,6 +59,12 @@ def get_address_from_did(did: str):
     return did.split(":")[-1]
 
 
+# Validated access tokens, keyed by the digest of the encoded token. Entries expire together with the token.
+validated_token_cache = ExpiringLRUCache(
+    "validated_tokens", settings.CERAMIC_CACHE_VALIDATED_TOKEN_CACHE_SIZE
+)
+
+
 class JWTDidAuthentication:
     """
     This authentication class will validate an access token that contains a claim named `did`
@@ -64,6 +77,26 @@ class JWTDidAuthentication:
 
     @classmethod
     def get_validated_token(cls, raw_token) -> Type[Token]:
+        """
+        Returns the validated token wrapper object for an encoded JSON web token.
+        Tokens that have already been validated by this process are served from `validated_token_cache`
+        until they expire, skipping the decoding and signature verification.
+        """
+        cache_key = sha256(
+            raw_token.encode("utf-8") if isinstance(raw_token, str) else raw_token
+        ).digest()
+
+        validated_token = validated_token_cache.get(cache_key)
+        if validated_token is None:
+            validated_token = cls.validate_token(raw_token)
+            validated_token_cache.set(
+                cache_key, validated_token, validated_token["exp"]
+            )
+
+        return validated_token
+
+    @classmethod
+    def validate_token(cls, raw_token) -> Type[Token]:
         """
         Validates an encoded JSON web token and returns a validated token
         wrapper object.
@@ -93,6 +126,7 @@ class JWTDidAuthentication:
         request.did = None
         validated_token = self.get_validated_token(token)
         request.did = validated_token["did"]
+        set_request_address(get_address_from_did(request.did))
         return request
 
 
@@ -162,22 +196,17 @@ def handle_add_stamps(
         )
         stamp_objects.append(stamp_object)
 
-    created = CeramicCache.objects.bulk_create(
-        stamp_objects,
-        update_conflicts=True,
-        update_fields=["stamp", "updated_at"],
-        unique_fields=["type", "address", "provider"],
-    )
+    created = CeramicCache.objects.bulk_upsert(stamp_objects)
 
-    updated_passport_state = CeramicCache.objects.filter(
-        address=address, type=CeramicCache.StampType.V1
+    updated_passport_state = get_passport_state_after_upsert(
+        address, CeramicCache.StampType.V1, created
     )
 
     return GetStampsWithScoreResponse(
         success=True,
         stamps=[
             CachedStampResponse(
-                address=stamp.address, provider=stamp.provider, stamp=stamp.stamp
+                address=stamp.address, provider=stamp.provider, stamp=stamp.get_stamp()
             )
             for stamp in updated_passport_state
         ],
@@ -185,6 +214,33 @@ def handle_add_stamps(
     )
 
 
+def get_passport_state_after_upsert(
+    address: str, stamp_type: CeramicCache.StampType, upserted: List[CeramicCache]
+) -> List[CeramicCache]:
+    """
+    Build the passport state for `stamp_type` after a bulk upsert.
+
+    The objects returned by `bulk_upsert` already hold the values that
+    were written, so only the providers that were not part of the upsert are read back, and
+    only the columns needed for the response are loaded.
+    """
+    upserted_by_provider = {}
+    for stamp in upserted:
+        # EthAddressField only lower-cases the value sent to the DB, align the in-memory object with it
+        stamp.address = stamp.address.lower()
+        upserted_by_provider[stamp.provider] = stamp
+
+    untouched = (
+        CeramicCache.objects.filter(address=address, type=stamp_type)
+        .exclude(provider__in=upserted_by_provider.keys())
+        .only("address", "provider", "stamp", "stamp_ref")
+        .with_credentials()
+        .order_by("id")
+    )
+
+    return list(untouched) + list(upserted_by_provider.values())
+
+
 @router.patch(
     "stamps/bulk", response={200: GetStampsWithScoreResponse}, auth=JWTDidAuth()
 )
@@ -227,12 +283,7 @@ def handle_patch_stamps(
             providers_to_delete.append(p.provider)
 
     if stamp_objects:
-        updated = CeramicCache.objects.bulk_create(
-            stamp_objects,
-            update_conflicts=True,
-            update_fields=["stamp", "updated_at"],
-            unique_fields=["type", "address", "provider"],
-        )
+        updated = CeramicCache.objects.bulk_upsert(stamp_objects)
 
     if providers_to_delete:
         stamps = CeramicCache.objects.filter(
@@ -242,15 +293,15 @@ def handle_patch_stamps(
         )
         stamps.delete()
 
-    updated_passport_state = CeramicCache.objects.filter(
-        address=address, type=CeramicCache.StampType.V1
+    updated_passport_state = get_passport_state_after_upsert(
+        address, CeramicCache.StampType.V1, updated
     )
 
     return GetStampsWithScoreResponse(
         success=True,
         stamps=[
             CachedStampResponse(
-                address=stamp.address, provider=stamp.provider, stamp=stamp.stamp
+                address=stamp.address, provider=stamp.provider, stamp=stamp.get_stamp()
             )
             for stamp in updated_passport_state
         ],
@@ -282,13 +333,15 @@ def handle_delete_stamps(
         raise InvalidDeleteCacheRequestException()
     stamps.delete()
 
-    updated_passport_state = CeramicCache.objects.filter(address=address)
+    updated_passport_state = CeramicCache.objects.filter(
+        address=address
+    ).with_credentials()
 
     return GetStampsWithScoreResponse(
         success=True,
         stamps=[
             CachedStampResponse(
-                address=stamp.address, provider=stamp.provider, stamp=stamp.stamp
+                address=stamp.address, provider=stamp.provider, stamp=stamp.get_stamp()
             )
             for stamp in updated_passport_state
         ],
@@ -306,33 +359,66 @@ def handle_get_scorer_weights() -> Dict[str, str]:
 
 
 @router.get("stamp", response=GetStampResponse)
-def get_stamps(request, address):
+def get_stamps(request, address, response: HttpResponse):
     try:
+        not_modified = get_not_modified_response(
+            request,
+            response,
+            *get_stamps_validators(address, [CeramicCache.StampType.V1]),
+        )
+        # A new passport is scored when its stamps are first read, which a 304 must not skip
+        if not_modified and has_ui_score(address):
+            return not_modified
+
         return handle_get_stamps(address)
     except Exception as e:
         raise e
 
 
-def handle_get_stamps(address):
-    stamps = CeramicCache.objects.filter(
-        address=address, type=CeramicCache.StampType.V1
+def get_stamps_validators(
+    address: str, stamp_types: List[CeramicCache.StampType]
+) -> Tuple[Optional[str], Optional[datetime]]:
+    """
+    Returns the (ETag, Last-Modified) validators for the cached stamps of `address`.
+    These are derived from an aggregate over `updated_at` (the count covers deletions), the stamps are not loaded.
+    """
+    state = CeramicCache.objects.filter(
+        address=address, type__in=stamp_types
+    ).aggregate(last_modified=Max("updated_at"), count=Count("id"))
+
+    return (
+        make_etag("stamps", *stamp_types, state["count"], state["last_modified"]),
+        state["last_modified"],
     )
 
+
+def has_ui_score(address: str) -> bool:
+    """
+    Whether the passport has a score in the UI community (always True if no UI scorer is set)
+    """
     scorer_id = settings.CERAMIC_CACHE_SCORER_ID
-    if (
-        scorer_id
-        and not Score.objects.filter(
+    return (
+        not scorer_id
+        or Score.objects.filter(
             passport__address=address.lower(),
             passport__community_id=scorer_id,
         ).exists()
-    ):
+    )
+
+
+def handle_get_stamps(address):
+    stamps = CeramicCache.objects.filter(
+        address=address, type=CeramicCache.StampType.V1
+    ).with_credentials()
+
+    if not has_ui_score(address):
         get_detailed_score_response_for_address(address)
 
     return GetStampResponse(
         success=True,
         stamps=[
             CachedStampResponse(
-                address=stamp.address, provider=stamp.provider, stamp=stamp.stamp
+                address=stamp.address, provider=stamp.provider, stamp=stamp.get_stamp()
             )
             for stamp in stamps
         ],
@@ -344,12 +430,26 @@ def handle_get_stamps(address):
     response=DetailedScoreResponse,
     auth=JWTDidAuth(),
 )
-def get_score(request, address: str) -> DetailedScoreResponse:
+def get_score(request, address: str, response: HttpResponse) -> DetailedScoreResponse:
+    not_modified = get_not_modified_response(
+        request,
+        response,
+        *get_score_validators(address, settings.CERAMIC_CACHE_SCORER_ID),
+    )
+    if not_modified:
+        return not_modified
+
     return handle_get_ui_score(address)
 
 
 def handle_get_ui_score(address: str) -> DetailedScoreResponse:
     scorer_id = settings.CERAMIC_CACHE_SCORER_ID
+    if is_score_cache_enabled():
+        # The UI scorer is configured, no need to look up its community for a cached score
+        cached_score = get_cached_score(scorer_id, address)
+        if cached_score:
+            return cached_score.get_response()
+
     account = get_object_or_404(Account, community__id=scorer_id)
     return handle_get_score(address, scorer_id, account)
 
@@ -407,7 +507,7 @@ def handle_authenticate(payload: CacaoVerifySubmit) -> AccessTokenResponse:
             log.error("Invalid or expired nonce: '%s'", payload.nonce)
             raise FailedVerificationException(detail="Invalid nonce!")
 
-        if not validate_dag_jws_payload({"nonce": payload.nonce}, payload.payload):
+        if not validate_dag_jws_nonce_payload(payload.nonce, payload.payload):
             log.error("Failed to validate nonce: '%s'", payload.nonce)
             raise FailedVerificationException(detail="Invalid nonce or payload!")
 
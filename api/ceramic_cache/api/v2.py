@@ -1,14 +1,15 @@
 """Ceramic Cache API"""
 
-from typing import Dict, List
+from typing import Dict, List, Optional
 
 import requests
 from django.conf import settings
+from django.http import HttpResponse
 from ninja import Router
 
 import api_logging as logging
+from registry.api.utils import get_not_modified_response
 from registry.api.v1 import DetailedScoreResponse
-from registry.models import Score
 
 from ..exceptions import (InternalServerException,
                           InvalidDeleteCacheRequestException,
@@ -18,9 +19,11 @@ from .v1 import (AccessTokenResponse, CacaoVerifySubmit, CachedStampResponse,
                  CacheStampPayload, DeleteStampPayload, GetStampResponse,
                  GetStampsWithScoreResponse, JWTDidAuth)
 from .v1 import authenticate as authenticate_v1
-from .v1 import get_address_from_did, get_detailed_score_response_for_address
+from .v1 import (get_address_from_did, get_detailed_score_response_for_address,
+                 get_passport_state_after_upsert)
 from .v1 import get_score as get_score_v1
-from .v1 import get_utc_time, handle_get_scorer_weights
+from .v1 import get_stamps_validators
+from .v1 import get_utc_time, handle_get_scorer_weights, has_ui_score
 
 log = logging.getLogger(__name__)
 
@@ -29,7 +32,7 @@ router = Router()
 
 def migrate_stamp_to_v2(v1_stamp: CeramicCache) -> CeramicCache:
     v2_stamp_response = requests.post(
-        settings.CERAMIC_CACHE_CONVERT_STAMP_TO_V2_URL, json=v1_stamp.stamp
+        settings.CERAMIC_CACHE_CONVERT_STAMP_TO_V2_URL, json=v1_stamp.get_stamp()
     )
 
     if v2_stamp_response.status_code == 200:
@@ -41,7 +44,7 @@ def migrate_stamp_to_v2(v1_stamp: CeramicCache) -> CeramicCache:
             updated_at=v1_stamp.updated_at,
             stamp=v2_stamp_response.json(),
         )
-        v2_stamp.save()
+        CeramicCache.objects.bulk_upsert([v2_stamp])
         return v2_stamp
     else:
         log.error(
@@ -54,18 +57,26 @@ def migrate_stamp_to_v2(v1_stamp: CeramicCache) -> CeramicCache:
     return None
 
 
-def get_passport_state(address: str) -> list[CeramicCache]:
-    v1_stamp_list = CeramicCache.objects.filter(
-        type=CeramicCache.StampType.V1, address=address
-    )
-
+def get_passport_state(
+    address: str, upserted: Optional[List[CeramicCache]] = None
+) -> list[CeramicCache]:
+    """
+    `upserted` are V2 stamps that have just been written, these are not read back from the DB
+    """
     v2_stamps = {
         c.provider: c
-        for c in CeramicCache.objects.filter(
-            type=CeramicCache.StampType.V2, address=address
+        for c in get_passport_state_after_upsert(
+            address, CeramicCache.StampType.V2, upserted or []
         )
     }
 
+    # Only the V1 stamps that have no V2 equivalent are relevant here
+    v1_stamp_list = (
+        CeramicCache.objects.filter(type=CeramicCache.StampType.V1, address=address)
+        .exclude(provider__in=list(v2_stamps.keys()))
+        .with_credentials()
+    )
+
     # We want to make sure that all stamps in v2_stamps are also in v1_stamps, and that no
     # v1_stamp is newer than it's equivalent in v2_stamps
     for v1_stamp in v1_stamp_list:
@@ -108,20 +119,17 @@ def handle_add_stamps(address: str, payload: List[CacheStampPayload]):
         )
         stamp_objects.append(stamp_object)
 
-    created = CeramicCache.objects.bulk_create(
-        stamp_objects,
-        update_conflicts=True,
-        update_fields=["stamp", "updated_at"],
-        unique_fields=["type", "address", "provider"],
-    )
+    created = CeramicCache.objects.bulk_upsert(stamp_objects)
 
-    updated_passport_state = get_passport_state(address)
+    updated_passport_state = get_passport_state(address, created)
 
     return GetStampsWithScoreResponse(
         success=True,
         stamps=[
             CachedStampResponse(
-                address=stamp.address, provider=stamp.provider, stamp=stamp.stamp
+                address=stamp.address,
+                provider=stamp.provider,
+                stamp=stamp.get_stamp(),
             )
             for stamp in updated_passport_state
         ],
@@ -167,12 +175,7 @@ def handle_patch_stamps(address: str, payload: List[CacheStampPayload]):
             providers_to_delete.append(p.provider)
 
     if stamp_objects:
-        updated = CeramicCache.objects.bulk_create(
-            stamp_objects,
-            update_conflicts=True,
-            update_fields=["stamp", "updated_at"],
-            unique_fields=["type", "address", "provider"],
-        )
+        updated = CeramicCache.objects.bulk_upsert(stamp_objects)
 
     if providers_to_delete:
         stamps = CeramicCache.objects.filter(
@@ -182,13 +185,15 @@ def handle_patch_stamps(address: str, payload: List[CacheStampPayload]):
         )
         stamps.delete()
 
-    updated_passport_state = get_passport_state(address)
+    updated_passport_state = get_passport_state(address, updated)
 
     return GetStampsWithScoreResponse(
         success=True,
         stamps=[
             CachedStampResponse(
-                address=stamp.address, provider=stamp.provider, stamp=stamp.stamp
+                address=stamp.address,
+                provider=stamp.provider,
+                stamp=stamp.get_stamp(),
             )
             for stamp in updated_passport_state
         ],
@@ -225,7 +230,9 @@ def handle_delete_stamps(address: str, payload: List[DeleteStampPayload]):
         success=True,
         stamps=[
             CachedStampResponse(
-                address=stamp.address, provider=stamp.provider, stamp=stamp.stamp
+                address=stamp.address,
+                provider=stamp.provider,
+                stamp=stamp.get_stamp(),
             )
             for stamp in updated_passport_state
         ],
@@ -239,8 +246,20 @@ def get_scorer_weights(request):
 
 
 @router.get("stamp", response=GetStampResponse)
-def get_stamps(request, address):
+def get_stamps(request, address, response: HttpResponse):
     try:
+        # V1 stamps are included, because these are migrated to V2 when reading the passport state
+        not_modified = get_not_modified_response(
+            request,
+            response,
+            *get_stamps_validators(
+                address, [CeramicCache.StampType.V1, CeramicCache.StampType.V2]
+            ),
+        )
+        # A new passport is scored when its stamps are first read, which a 304 must not skip
+        if not_modified and has_ui_score(address):
+            return not_modified
+
         return handle_get_stamps(address)
     except Exception as e:
         raise e
@@ -249,21 +268,16 @@ def get_stamps(request, address):
 def handle_get_stamps(address: str):
     stamps = get_passport_state(address)
 
-    scorer_id = settings.CERAMIC_CACHE_SCORER_ID
-    if (
-        scorer_id
-        and not Score.objects.filter(
-            passport__address=address.lower(),
-            passport__community_id=scorer_id,
-        ).exists()
-    ):
+    if not has_ui_score(address):
         get_detailed_score_response_for_address(address)
 
     return GetStampResponse(
         success=True,
         stamps=[
             CachedStampResponse(
-                address=stamp.address, provider=stamp.provider, stamp=stamp.stamp
+                address=stamp.address,
+                provider=stamp.provider,
+                stamp=stamp.get_stamp(),
             )
             for stamp in stamps
         ],
@@ -275,8 +289,8 @@ def handle_get_stamps(address: str):
     response=DetailedScoreResponse,
     auth=JWTDidAuth(),
 )
-def get_score(request, address: str) -> DetailedScoreResponse:
-    return get_score_v1(request, address)
+def get_score(request, address: str, response: HttpResponse) -> DetailedScoreResponse:
+    return get_score_v1(request, address, response)
 
 
 @router.post(
@@ -0,0 +1,107 @@
+import base64
+import json
+import secrets
+import timeit
+from hashlib import sha256
+
+from ceramic_cache.api.v1 import DbCacheToken
+from ceramic_cache.utils import (
+    CIDV1_DAG_CBOR_SHA256_PREFIX,
+    dag_cbor_encode_nonce_payload,
+    get_verify_key,
+    validate_dag_jws_nonce_payload,
+    validate_dag_jws_payload,
+    verify_jws,
+)
+from django.core.management.base import BaseCommand
+from multibase import encode
+from nacl.signing import SigningKey
+
+
+def b64url(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).decode("utf-8").rstrip("=")
+
+
+def build_signed_payload(nonce: str) -> dict:
+    """
+    Builds a DAG-JWS for `{"nonce": nonce}`, signed by a fresh did:key (ed25519), in the same
+    shape as the payload submitted to the authenticate endpoint.
+    """
+    signing_key = SigningKey.generate()
+    # 0xed01 is the multicodec prefix for ed25519-pub
+    did_key = encode("base58btc", b"\xed\x01" + bytes(signing_key.verify_key)).decode(
+        "utf-8"
+    )
+    kid = f"did:key:{did_key}#{did_key}"
+
+    protected = b64url(json.dumps({"alg": "EdDSA", "kid": kid}).encode("utf-8"))
+    payload = b64url(
+        CIDV1_DAG_CBOR_SHA256_PREFIX
+        + sha256(dag_cbor_encode_nonce_payload(nonce)).digest()
+    )
+    signature = signing_key.sign(f"{protected}.{payload}".encode("utf-8")).signature
+
+    return {
+        "issuer": f"did:key:{did_key}",
+        "nonce": nonce,
+        "payload": payload,
+        "signatures": [{"protected": protected, "signature": b64url(signature)}],
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Micro-benchmark for the non-DB part of the ceramic-cache authenticate endpoint "
+        "(payload validation, signature verification and token issuing)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--iterations",
+            type=int,
+            default=2000,
+            help="Number of iterations for each benchmark",
+        )
+
+    def report(self, name: str, seconds: float, iterations: int):
+        self.stdout.write(
+            f"{name:<45} {seconds * 1e6 / iterations:>10.1f} us/op ({iterations} ops)"
+        )
+
+    def handle(self, *args, **options):
+        iterations = options["iterations"]
+        data = build_signed_payload(secrets.token_hex(30))
+        nonce = data["nonce"]
+        payload = data["payload"]
+
+        assert validate_dag_jws_payload({"nonce": nonce}, payload)
+        assert validate_dag_jws_nonce_payload(nonce, payload)
+        verify_jws(data)
+
+        def verify_jws_cold():
+            get_verify_key.cache_clear()
+            verify_jws(data)
+
+        def authenticate():
+            validate_dag_jws_nonce_payload(nonce, payload)
+            verify_jws(data)
+            token = DbCacheToken()
+            token["did"] = data["issuer"]
+            str(token.access_token)
+
+        benchmarks = [
+            (
+                "validate_dag_jws_payload (generic)",
+                lambda: validate_dag_jws_payload({"nonce": nonce}, payload),
+            ),
+            (
+                "validate_dag_jws_nonce_payload (fast path)",
+                lambda: validate_dag_jws_nonce_payload(nonce, payload),
+            ),
+            ("verify_jws (verify key not cached)", verify_jws_cold),
+            ("verify_jws (verify key cached)", lambda: verify_jws(data)),
+            ("authenticate (without nonce lookup)", authenticate),
+        ]
+
+        for name, fn in benchmarks:
+            self.report(name, timeit.timeit(fn, number=iterations), iterations)
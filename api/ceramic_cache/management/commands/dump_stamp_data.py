@@ -8,6 +8,7 @@ from django.conf import settings
 from django.core.management.base import BaseCommand
 from django.core.paginator import Paginator
 from django.utils import timezone
+from scorer.export import after_key
 from tqdm import tqdm
 
 s3 = boto3.client(
@@ -34,8 +35,9 @@ class Command(BaseCommand):
         print(f"Getting Stamps updated since {latest_export.last_export_ts}")
 
         query = (
-            CeramicCache.objects.values("stamp", "updated_at")
-            .order_by("updated_at")
+            CeramicCache.objects.only("stamp", "stamp_ref", "updated_at")
+            .with_credentials()
+            .order_by("updated_at", "id")
             .using("read_replica_0")
         )
 
@@ -43,6 +45,7 @@ class Command(BaseCommand):
         file_name = f'stamps_{latest_export.last_export_ts.strftime("%Y%m%d_%H%M%S")}_{timezone.now().strftime("%Y%m%d_%H%M%S")}.jsonl'
 
         last_updated_at = latest_export.last_export_ts
+        last_id = None
         chunk_size = 1000
 
         try:
@@ -53,19 +56,29 @@ class Command(BaseCommand):
                 ) as progress_bar:
                     has_more = True
                     while has_more:
-                        objects = list(
-                            query.filter(updated_at__gt=last_updated_at)[:chunk_size]
+                        # Keyset on (updated_at, id), to not skip the stamps sharing the
+                        # timestamp of the last stamp of the previous chunk
+                        page_query = (
+                            query.filter(
+                                after_key(
+                                    ["updated_at", "id"], [last_updated_at, last_id]
+                                )
+                            )
+                            if last_id is not None
+                            else query.filter(updated_at__gt=last_updated_at)
                         )
+                        objects = list(page_query[:chunk_size])
                         if objects:
                             num_objects = len(objects)
                             progress_bar.update(num_objects)
 
                             for cache_obj in objects:
                                 f.write(
-                                    json.dumps({"stamp": cache_obj["stamp"]}) + "\n"
+                                    json.dumps({"stamp": cache_obj.get_stamp()}) + "\n"
                                 )
 
-                            last_updated_at = cache_obj["updated_at"]
+                            last_updated_at = cache_obj.updated_at
+                            last_id = cache_obj.id
 
                             # If we get less than the chunk size, we've reached the end
                             # No need to keep querying which could result in querying forever
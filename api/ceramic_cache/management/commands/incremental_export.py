@@ -0,0 +1,334 @@
+import datetime
+import json
+from concurrent.futures import as_completed
+from dataclasses import dataclass, field
+from itertools import chain
+from typing import List, Optional, Tuple, Union
+
+from ceramic_cache.models import ExportWatermark
+from django.apps import apps
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import Max, Min, QuerySet
+from django.utils import timezone
+from scorer.export import (
+    COMPRESSION_EXTENSIONS,
+    CompressedWriter,
+    JsonlRows,
+    S3MultipartWriter,
+    get_s3_client,
+    iter_keyset_pages,
+    parse_s3_uri,
+)
+from scorer.utils import create_process_executor
+
+
+@dataclass
+class IncrementalExport:
+    model: str
+    # Rows are exported in the order of (timestamp_field, id), and the watermark is a timestamp. Without
+    # timestamp field, rows are exported in the order of their ID, and the watermark is an ID.
+    timestamp_field: Optional[str] = None
+    # For exports by ID, only the rows with `created_field` older than INCREMENTAL_EXPORT_LAG are exported
+    created_field: Optional[str] = None
+    select_related: List[str] = field(default_factory=list)
+
+    @property
+    def key(self) -> List[str]:
+        return [self.timestamp_field, "id"] if self.timestamp_field else ["id"]
+
+    @property
+    def watermark_field(self) -> str:
+        return self.timestamp_field or "id"
+
+
+INCREMENTAL_EXPORTS = {
+    "score": IncrementalExport(
+        "registry.Score", timestamp_field="last_score_timestamp"
+    ),
+    # Stamps are updated in place when a passport is scored again (see `asave_stamps`)
+    "stamp": IncrementalExport("registry.Stamp", timestamp_field="updated_at"),
+    "event": IncrementalExport("registry.Event", created_field="created_at"),
+    "ceramic_cache": IncrementalExport(
+        "ceramic_cache.CeramicCache",
+        timestamp_field="updated_at",
+    ),
+}
+
+Bound = Union[datetime.datetime, int, None]
+
+
+@dataclass
+class Partition:
+    """
+    Range (after, until] of the watermark field of an export. `after` is None for the first
+    partition of the first run.
+    """
+
+    index: int
+    after: Bound
+    until: Bound
+
+    def filter(self, queryset: QuerySet, export: IncrementalExport) -> QuerySet:
+        watermark_field = export.watermark_field
+        if self.after is not None:
+            queryset = queryset.filter(**{f"{watermark_field}__gt": self.after})
+        return queryset.filter(**{f"{watermark_field}__lte": self.until})
+
+
+def plan_partitions(
+    export: IncrementalExport,
+    watermark: Optional[ExportWatermark],
+    database: str,
+    num_partitions: int,
+    now: datetime.datetime,
+) -> Tuple[List[Partition], Bound]:
+    """
+    Split the rows after the watermark into (at most) `num_partitions` ranges of the same width.
+    Returns the partitions and the new watermark.
+    """
+    queryset = apps.get_model(export.model).objects.using(database)
+    cutoff = now - datetime.timedelta(seconds=settings.INCREMENTAL_EXPORT_LAG)
+
+    if export.timestamp_field:
+        after = watermark.last_timestamp if watermark else None
+        until = cutoff
+        start = (
+            after
+            if after is not None
+            else queryset.aggregate(start=Min(export.timestamp_field))["start"]
+        )
+        if start is None or start >= until:
+            return [], after
+        step = (until - start) / num_partitions
+        bounds = [start + step * i for i in range(1, num_partitions)]
+    else:
+        after = watermark.last_id if watermark else None
+        if export.created_field:
+            queryset = queryset.filter(**{f"{export.created_field}__lte": cutoff})
+        until = queryset.aggregate(until=Max("id"))["until"]
+        start = (
+            after if after is not None else queryset.aggregate(start=Min("id"))["start"]
+        )
+        if until is None or start is None or start >= until:
+            return [], after
+        step = -(-(until - start) // num_partitions)
+        bounds = list(range(start + step, until, step))
+
+    lower_bounds = [after] + bounds
+    upper_bounds = bounds + [until]
+    return [
+        Partition(index, lower, upper)
+        for index, (lower, upper) in enumerate(zip(lower_bounds, upper_bounds))
+    ], until
+
+
+def export_partition(
+    name: str,
+    partition: Partition,
+    s3_uri: str,
+    file_prefix: str,
+    database: str,
+    batch_size: int,
+    compression: Optional[str],
+) -> dict:
+    """
+    Write the rows of the partition to a JSONL file on S3, in the order of the export's key. Empty
+    partitions are skipped.
+    """
+    export = INCREMENTAL_EXPORTS[name]
+    model = apps.get_model(export.model)
+    rows = JsonlRows(model, export.select_related)
+
+    pages = iter_keyset_pages(
+        partition.filter(model.objects.using(database), export),
+        rows.lookups,
+        export.key,
+        batch_size,
+    )
+    first_page = next(pages, None)
+    if first_page is None:
+        return {"partition": partition.index, "records": 0, "s3_key": None}
+
+    s3_bucket_name, _ = parse_s3_uri(s3_uri)
+    s3_key = f"{file_prefix}-part-{partition.index:05d}.jsonl{COMPRESSION_EXTENSIONS[compression]}"
+    records = 0
+    with CompressedWriter(
+        S3MultipartWriter(get_s3_client(), s3_bucket_name, s3_key), compression
+    ) as stream:
+        for page in chain([first_page], pages):
+            stream.write(rows.encode(page))
+            records += len(page)
+
+    return {"partition": partition.index, "records": records, "s3_key": s3_key}
+
+
+def format_bound(bound: Bound):
+    return bound.isoformat() if isinstance(bound, datetime.datetime) else bound
+
+
+class Command(BaseCommand):
+    help = """Export the rows created or updated since the previous run (delta files) to S3.
+
+    The position of each export is stored in an `ExportWatermark`, and is only advanced when all the
+    files of the delta are written. Each run writes its files under
+    `<s3-uri>/<export>/dt=<date>/`, followed by a `<export>_<time>-manifest.json` file listing them.
+
+    Deleted rows are not part of the deltas.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--exports",
+            type=str,
+            default=",".join(INCREMENTAL_EXPORTS),
+            help=f"Comma separated list of the exports to run, out of: {', '.join(INCREMENTAL_EXPORTS)}",
+        )
+        parser.add_argument(
+            "--s3-uri", type=str, help="The S3 URI target location for the files"
+        )
+        parser.add_argument(
+            "--database",
+            default=DEFAULT_DB_ALIAS,
+            help="Nominates a specific database to export from. "
+            'Defaults to the "default" database.',
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=10000,
+            help="Number of records read per (keyset) query.",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Number of processes exporting the partitions of an export in parallel.",
+        )
+        parser.add_argument(
+            "--partitions",
+            type=int,
+            default=None,
+            help="Number of partitions (and files) per export, defaults to the number of workers.",
+        )
+        parser.add_argument(
+            "--compression",
+            choices=["none", "gzip", "zstd"],
+            default="zstd",
+            help="Compression of the delta files.",
+        )
+
+    def handle(self, *args, **options):
+        names = options["exports"].split(",")
+        unknown = set(names) - set(INCREMENTAL_EXPORTS)
+        if unknown:
+            raise CommandError(f"Unknown exports: {', '.join(sorted(unknown))}")
+
+        workers = options["workers"]
+        num_partitions = options["partitions"] or workers
+        compression = (
+            None if options["compression"] == "none" else options["compression"]
+        )
+
+        failed = []
+        for name in names:
+            if not self.run_export(name, options, workers, num_partitions, compression):
+                failed.append(name)
+
+        if failed:
+            raise CommandError(f"Failed exports: {', '.join(failed)}")
+
+    def run_export(
+        self,
+        name: str,
+        options: dict,
+        workers: int,
+        num_partitions: int,
+        compression: Optional[str],
+    ) -> bool:
+        export = INCREMENTAL_EXPORTS[name]
+        watermark = ExportWatermark.objects.filter(name=name).first()
+        now = timezone.now()
+
+        partitions, until = plan_partitions(
+            export, watermark, options["database"], num_partitions, now
+        )
+        if not partitions:
+            self.stdout.write(f"{name}: nothing to export")
+            return True
+
+        after = partitions[0].after
+        self.stdout.write(
+            f"{name}: exporting ({format_bound(after)}, {format_bound(until)}] in {len(partitions)} partitions"
+        )
+
+        s3_bucket_name, s3_folder = parse_s3_uri(options["s3_uri"])
+        file_prefix = f"{s3_folder}/{name}/dt={now.date().isoformat()}/{name}_{now.strftime('%Y%m%d_%H%M%S')}"
+        export_args = (
+            options["s3_uri"],
+            file_prefix,
+            options["database"],
+            options["batch_size"],
+            compression,
+        )
+
+        results = []
+        errors = []
+        if workers > 1:
+            with create_process_executor(workers) as executor:
+                futures = [
+                    executor.submit(export_partition, name, partition, *export_args)
+                    for partition in partitions
+                ]
+                for future in as_completed(futures):
+                    try:
+                        results.append(future.result())
+                    except Exception as e:
+                        errors.append(e)
+        else:
+            for partition in partitions:
+                try:
+                    results.append(export_partition(name, partition, *export_args))
+                except Exception as e:
+                    errors.append(e)
+
+        if errors:
+            for e in errors:
+                self.stderr.write(self.style.ERROR(f"{name}: ERROR: {e}"))
+            self.stderr.write(
+                self.style.ERROR(f"{name}: the watermark was not advanced")
+            )
+            return False
+
+        results.sort(key=lambda r: r["partition"])
+        records = sum(r["records"] for r in results)
+        manifest = {
+            "export": name,
+            "model": export.model,
+            "watermark_field": export.watermark_field,
+            "after": format_bound(after),
+            "until": format_bound(until),
+            "records": records,
+            "files": [r["s3_key"] for r in results if r["s3_key"]],
+            "created_at": now.isoformat(),
+        }
+        with S3MultipartWriter(
+            get_s3_client(), s3_bucket_name, f"{file_prefix}-manifest.json"
+        ) as stream:
+            stream.write(json.dumps(manifest).encode("utf-8"))
+
+        ExportWatermark.objects.update_or_create(
+            name=name,
+            defaults={
+                "last_timestamp" if export.timestamp_field else "last_id": until,
+                "last_records": records,
+            },
+        )
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{name}: {records} records exported in {len(manifest['files'])} files"
+            )
+        )
+        return True
@@ -1,32 +1,74 @@
 import json
+import time
 import traceback
-from pprint import pprint
-from urllib.parse import urlparse
+from concurrent.futures import as_completed
+from itertools import chain
 
-import boto3
-import pyarrow as pa
 import pyarrow.parquet as pq
-from ceramic_cache.models import CeramicCache
 from django.apps import apps
-from django.conf import settings
 from django.core.management.base import BaseCommand
-from django.db import DEFAULT_DB_ALIAS, connection
-from registry.models import Passport
-from tqdm import tqdm
-
-# The following mapping will map django field types to pyarrow types
-pa_schema_map = {
-    "AutoField": {"pa_type": pa.int64()},
-    "BigAutoField": {"pa_type": pa.int64()},
-    # "ForeignKey": {"pa_type": pa.int64()},
-    # "OneToOneField": {"pa_type": pa.int64()},
-    "CharField": {"pa_type": pa.string()},
-    "JSONField": {"pa_type": pa.string(), "map_value": str},
-    "DateTimeField": {"pa_type": pa.timestamp("ms")},
-    "IntegerField": {"pa_type": pa.int64()},
-    "BooleanField": {"pa_type": pa.bool_()},
-    "DecimalField": {"pa_type": pa.decimal256(18, 9)},
-}
+from django.db import DEFAULT_DB_ALIAS
+from scorer.export import (
+    DEFAULT_PART_SIZE,
+    ArrowColumns,
+    RowGroupBuffer,
+    S3MultipartWriter,
+    get_s3_client,
+    parse_s3_uri,
+)
+from scorer.utils import create_process_executor
+
+
+def export_model(
+    model_label: str,
+    s3_uri: str,
+    database: str,
+    batch_size: int,
+    row_group_size: int,
+    compression: str,
+    typed_json: bool,
+    extra_args: dict,
+) -> dict:
+    """
+    Stream the rows of the model to a parquet file on S3, returns a summary of the export. Models
+    without rows are skipped.
+    """
+    start = time.monotonic()
+    model = apps.get_model(model_label)
+    columns = ArrowColumns(model, typed_json=typed_json)
+    s3_bucket_name, s3_folder = parse_s3_uri(s3_uri)
+    s3_key = f"{s3_folder}/{model._meta.db_table}.parquet"
+
+    batches = columns.iter_batches(
+        model.objects.using(database).order_by(model._meta.pk.attname), batch_size
+    )
+    first_batch = next(batches, None)
+    if first_batch is None:
+        return {"model": model_label, "records": 0, "s3_key": None}
+
+    records = 0
+    with S3MultipartWriter(
+        get_s3_client(),
+        s3_bucket_name,
+        s3_key,
+        part_size=DEFAULT_PART_SIZE,
+        extra_args=extra_args,
+    ) as stream:
+        with pq.ParquetWriter(
+            stream, columns.schema, compression=compression
+        ) as writer:
+            row_groups = RowGroupBuffer(writer, row_group_size)
+            for batch in chain([first_batch], batches):
+                row_groups.write_batch(batch)
+                records += batch.num_rows
+            row_groups.flush()
+
+    return {
+        "model": model_label,
+        "records": records,
+        "s3_key": s3_key,
+        "elapsed": time.monotonic() - start,
+    }
 
 
 class Command(BaseCommand):
@@ -36,11 +78,8 @@ class Command(BaseCommand):
         parser.add_argument(
             "--batch-size",
             type=int,
-            default=1000,
-            help="""Size of record batches.
-            If present, this will read the records in batches. The result list is ordered by pk (id), to get
-            to the next batch we query by id__gt=last_id.
-            """,
+            default=10000,
+            help="""Number of records fetched from the (server-side) cursor and converted to Arrow at once.""",
         )
         parser.add_argument(
             "--s3-uri", type=str, help="The S3 URI target location for the files"
@@ -60,162 +99,112 @@ class Command(BaseCommand):
             "--s3-extra-args",
             type=str,
             help="""JSON object, that contains extra args for the files uploaded to S3.
-            This will be passed in as the `ExtraArgs` parameter to boto3's upload_file method.""",
+            These are the same as the `ExtraArgs` of boto3's upload_file method (ACL, ContentType, ...).""",
         )
-
-    def get_pa_schema(self, model):
-        schema = pa.schema(
-            [
-                # We need to take into consideration that for relation fields, we actually need the `fieldname + "_id"`
-                (field.name, self.map_to_pa_schema_field(field.get_internal_type()))
-                if not field.is_relation
-                else (
-                    f"{field.name}_id",
-                    self.map_to_pa_schema_field(field.target_field.get_internal_type()),
-                )
-                for field in model._meta.fields
-            ]
+        parser.add_argument(
+            "--row-group-size",
+            type=int,
+            default=100000,
+            help="Number of records per row group of the parquet files.",
         )
-        return schema
-
-    def map_to_pa_schema_field(self, django_internal_field_type):
-        if django_internal_field_type in pa_schema_map:
-            return pa_schema_map[django_internal_field_type]["pa_type"]
-
-        self.stdout.write(
-            self.style.WARNING(
-                f"Unmapped django field type '{django_internal_field_type}'. Will default to `string`"
-            )
+        parser.add_argument(
+            "--compression",
+            choices=["none", "snappy", "gzip", "zstd", "brotli", "lz4"],
+            default="snappy",
+            help="Compression codec of the parquet files.",
+        )
+        parser.add_argument(
+            "--typed-json",
+            action="store_true",
+            help="Export the JSON fields with a known shape (for example `Score.evidence`) as typed struct / map columns, instead of JSON strings.",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Number of processes exporting models in parallel.",
         )
-        return pa.string()
-
-    def get_data(self, model, last_id):
-        q = model.objects.using(self.database).all().order_by("id")
-
-        if last_id:
-            q = q.filter(id__gt=last_id)
-
-        data = q[: self.batch_size].values()
-
-        # In case of JSONField, the value will be a dict, which is not possible to serialize to Parquet
-        # This is why we serialize that to JSON
-        data = [
-            {k: v if type(v) is not dict else json.dumps(v) for k, v in d.items()}
-            for d in data
-        ]
-
-        return (self.get_pa_schema(model), data)
-
-    def export_data_for_model(self, model, s3_folder, s3_bucket_name, extra_args):
-        schema, data = self.get_data(model, None)
-        # Define the output Parquet file
-        table_name = model._meta.db_table
-        output_file = f"{table_name}.parquet"
-
-        # Export data for the model
-        with tqdm(
-            unit="records",
-            unit_scale=True,
-            desc=f"Exporting records of {table_name}",
-        ) as progress_bar:
-            if data:
-                progress_bar.update(len(data))
-                with pq.ParquetWriter(output_file, schema) as writer:
-                    batch = pa.RecordBatch.from_pylist(data, schema=schema)
-                    writer.write_batch(batch)
-
-                    has_more = True
-                    last_id = data[-1]["id"]
-
-                    while has_more:
-                        _, data = self.get_data(model, last_id)
-
-                        if data:
-                            progress_bar.update(len(data))
-                            has_more = True
-                            last_id = data[-1]["id"]
-
-                            # Write the Pandas DataFrame to a Parquet file
-                            batch = pa.RecordBatch.from_pylist(data, schema=schema)
-                            writer.write_batch(batch)
-                        else:
-                            has_more = False
-
-                self.stdout.write(
-                    self.style.SUCCESS(f"EXPORT - Data exported to '{output_file}'")
-                )
-
-                s3_key = f"{s3_folder}/{output_file}"
-
-                # Upload to S3 bucket
-                self.s3.upload_file(
-                    output_file,
-                    s3_bucket_name,
-                    s3_key,
-                    ExtraArgs=extra_args,
-                )
-
-                self.stdout.write(
-                    self.style.SUCCESS(
-                        f"EXPORT - Data uploaded to '{s3_bucket_name}/{s3_key}'"
-                    )
-                )
 
     def handle(self, *args, **options):
-        last_id = 0
-        has_more = True
-
         self.batch_size = options["batch_size"]
         self.s3_uri = options["s3_uri"]
         self.database = options["database"]
         apps_to_export = options["apps"].split(",") if options["apps"] else None
         extra_args = (
-            json.parse(options["s3_extra_args"]) if options["s3_extra_args"] else None
+            json.loads(options["s3_extra_args"]) if options["s3_extra_args"] else None
         )
+        workers = options["workers"]
 
         self.stdout.write(f"EXPORT - s3_uri      : '{self.s3_uri}'")
         self.stdout.write(f"EXPORT - batch_size  : '{self.batch_size}'")
         self.stdout.write(f"EXPORT - database    : '{self.database}'")
         self.stdout.write(f"EXPORT - apps        : '{apps_to_export}'")
+        self.stdout.write(f"EXPORT - workers     : '{workers}'")
 
-        if not apps:
+        if not apps_to_export:
             return
 
-        parsed_uri = urlparse(self.s3_uri)
-        s3_bucket_name = parsed_uri.netloc
-        s3_folder = parsed_uri.path.strip("/")
-
-        self.s3 = boto3.client(
-            "s3",
-            aws_access_key_id=settings.S3_DATA_AWS_SECRET_KEY_ID,
-            aws_secret_access_key=settings.S3_DATA_AWS_SECRET_ACCESS_KEY,
+        model_labels = [
+            model._meta.label
+            for app_name in apps_to_export
+            for model in apps.get_app_config(app_name).get_models()
+        ]
+        export_args = (
+            self.s3_uri,
+            self.database,
+            self.batch_size,
+            options["row_group_size"],
+            None if options["compression"] == "none" else options["compression"],
+            options["typed_json"],
+            extra_args,
         )
 
-        for app_name in apps_to_export:
-            self.stdout.write(f"EXPORT - START export data for app: '{app_name}'")
-            # Get the app's configuration
-            app_config = apps.get_app_config(app_name)
-
-            for model in app_config.get_models():
+        if workers > 1:
+            with create_process_executor(workers) as executor:
+                futures = {
+                    executor.submit(
+                        export_model, model_label, *export_args
+                    ): model_label
+                    for model_label in model_labels
+                }
+                for future in as_completed(futures):
+                    self.report(futures[future], future)
+        else:
+            for model_label in model_labels:
                 self.stdout.write(
-                    f"EXPORT - START export data for model: '{app_name}.{model._meta.model_name}'"
+                    f"EXPORT - START export data for model: '{model_label}'"
                 )
                 try:
-                    self.export_data_for_model(
-                        model,
-                        s3_folder,
-                        s3_bucket_name,
-                        extra_args,
-                    )
-
+                    self.report_summary(export_model(model_label, *export_args))
                 except Exception as e:
-                    self.stdout.write(
-                        self.style.ERROR(f"EXPORT - Error when exporting data '{e}'")
-                    )
-                    self.stdout.write(self.style.ERROR(traceback.format_exc()))
+                    self.report_error(model_label, e)
 
-                self.stdout.write(
-                    f"EXPORT - END export data for model: '{app_name}.{model._meta.model_name}'"
-                )
+    def report(self, model_label, future):
+        try:
+            self.report_summary(future.result())
+        except Exception as e:
+            self.report_error(model_label, e)
 
-            self.stdout.write(f"EXPORT - END export data for app: '{app_name}'")
+    def report_summary(self, summary: dict):
+        if summary["s3_key"] is None:
+            self.stdout.write(f"EXPORT - No data for model: '{summary['model']}'")
+            return
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"EXPORT - {summary['records']} records of '{summary['model']}' uploaded to "
+                f"'{summary['s3_key']}' in {summary['elapsed']:.1f}s"
+            )
+        )
+
+    def report_error(self, model_label, e: Exception):
+        self.stdout.write(
+            self.style.ERROR(
+                f"EXPORT - Error when exporting data for '{model_label}': '{e}'"
+            )
+        )
+        self.stdout.write(
+            self.style.ERROR(
+                "".join(traceback.format_exception(type(e), e, e.__traceback__))
+            )
+        )
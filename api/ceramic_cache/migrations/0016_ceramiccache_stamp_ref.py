@@ -0,0 +1,29 @@
+# Generated by Django 4.2.6 on 2026-10-19 08:32
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("registry", "0029_storedcredential_stamp_credential_ref"),
+        (
+            "ceramic_cache",
+            "0015_alter_ceramiccache_unique_together_ceramiccache_type_and_more",
+        ),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="ceramiccache",
+            name="stamp_ref",
+            field=models.ForeignKey(
+                blank=True,
+                db_index=False,
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="+",
+                to="registry.storedcredential",
+            ),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 4.2.6 on 2026-10-19 10:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("ceramic_cache", "0016_ceramiccache_stamp_ref"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ExportWatermark",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=100, unique=True)),
+                ("last_timestamp", models.DateTimeField(blank=True, null=True)),
+                ("last_id", models.BigIntegerField(blank=True, null=True)),
+                (
+                    "last_records",
+                    models.BigIntegerField(
+                        default=0, help_text="Number of rows in the last delta"
+                    ),
+                ),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="ceramiccache",
+            index=models.Index(
+                fields=["updated_at", "id"], name="ceramic_cache_export_index"
+            ),
+        ),
+    ]
@@ -1,9 +1,37 @@
 """Ceramic Cache Models"""
 
 from enum import IntEnum
+from typing import List
 
 from account.models import EthAddressField
+from django.conf import settings
 from django.db import models
+from registry.models import StoredCredential
+
+
+class CeramicCacheQuerySet(models.QuerySet):
+    def with_credentials(self):
+        return self.select_related("stamp_ref")
+
+    def bulk_upsert(self, stamps: List["CeramicCache"]) -> List["CeramicCache"]:
+        """
+        Insert or update the stamps (unique by type, address and provider).
+        With the credential store enabled, the stamps are written to the store and only referenced from the
+        cache rows.
+        """
+        if settings.FF_CREDENTIAL_STORE == "on":
+            stored = StoredCredential.objects.store(s.stamp for s in stamps)
+            for stamp in stamps:
+                stamp.stamp_ref = stored[StoredCredential.hash_credential(stamp.stamp)]
+                stamp.stamp = {}
+
+        return self.bulk_create(
+            stamps,
+            update_conflicts=True,
+            # stamp_ref is always updated, to not leave a stale reference behind when writing inline
+            update_fields=["stamp", "stamp_ref", "updated_at"],
+            unique_fields=["type", "address", "provider"],
+        )
 
 
 class CeramicCache(models.Model):
@@ -16,6 +44,16 @@ class CeramicCache(models.Model):
         null=False, blank=False, default="", max_length=256, db_index=True
     )
     stamp = models.JSONField(default=dict)
+    # When set, the stamp is read from the credential store and `stamp` is left empty
+    stamp_ref = models.ForeignKey(
+        StoredCredential,
+        related_name="+",
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        # Lookups only go from the cache to the credential, no need for an index
+        db_index=False,
+    )
     created_at = models.DateTimeField(
         auto_now_add=True,
         blank=True,
@@ -36,8 +74,22 @@ class CeramicCache(models.Model):
         default=StampType.V1, choices=[(tag.value, tag.name) for tag in StampType]
     )
 
+    objects = CeramicCacheQuerySet.as_manager()
+
     class Meta:
         unique_together = ["type", "address", "provider"]
+        indexes = [
+            # Keyset pagination of the incremental exports, see the `incremental_export` command
+            models.Index(
+                fields=["updated_at", "id"],
+                name="ceramic_cache_export_index",
+            ),
+        ]
+
+    def get_stamp(self) -> dict:
+        if self.stamp_ref_id:
+            return self.stamp_ref.get_credential()
+        return self.stamp
 
 
 class StampExports(models.Model):
@@ -45,6 +97,25 @@ class StampExports(models.Model):
     stamp_total = models.IntegerField(default=0)
 
 
+class ExportWatermark(models.Model):
+    """
+    Position of an incremental export (see the `incremental_export` command): all the rows up to this
+    position have been exported. Exports keyed by timestamp store the timestamp (every row with a
+    timestamp <= `last_timestamp` is exported), exports keyed by ID store the ID.
+    """
+
+    name = models.CharField(max_length=100, unique=True)
+    last_timestamp = models.DateTimeField(null=True, blank=True)
+    last_id = models.BigIntegerField(null=True, blank=True)
+    last_records = models.BigIntegerField(
+        default=0, help_text="Number of rows in the last delta"
+    )
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"ExportWatermark {self.name}, last_timestamp={self.last_timestamp}, last_id={self.last_id}"
+
+
 class CeramicCacheLegacy(models.Model):
     address = EthAddressField(null=True, blank=False, max_length=100, db_index=True)
     provider = models.CharField(
@@ -49,7 +49,7 @@ class TestAuthenticate:
             return_value=None,
         ):
             with mocker.patch(
-                "ceramic_cache.api.v1.validate_dag_jws_payload", return_value=True
+                "ceramic_cache.api.v1.validate_dag_jws_nonce_payload", return_value=True
             ):
                 payload = copy.deepcopy(sample_authenticate_payload)
                 payload["nonce"] = Nonce.create_nonce().nonce
@@ -77,7 +77,7 @@ class TestAuthenticate:
         The test should fail at step 1 as we will corupt the payload
         """
         with mocker.patch(
-            "ceramic_cache.api.v1.validate_dag_jws_payload", return_value=False
+            "ceramic_cache.api.v1.validate_dag_jws_nonce_payload", return_value=False
         ):
             auth_response = client.post(
                 f"{self.base_url}/authenticate",
@@ -98,11 +98,11 @@ class TestAuthenticate:
         1. validates the payload against the nonce
         2. makes a validation request for the dagJWS to the verifier
 
-        The test should fail at step 1 if the validate_dag_jws_payload throws
+        The test should fail at step 1 if the validate_dag_jws_nonce_payload throws
         """
 
         with mocker.patch(
-            "ceramic_cache.api.v1.validate_dag_jws_payload",
+            "ceramic_cache.api.v1.validate_dag_jws_nonce_payload",
             side_effect=Exception("something bad happened"),
         ):
             auth_response = client.post(
@@ -132,7 +132,7 @@ class TestAuthenticate:
             side_effect=Exception("JWS validation failed"),
         ):
             with mocker.patch(
-                "ceramic_cache.api.v1.validate_dag_jws_payload", return_value=True
+                "ceramic_cache.api.v1.validate_dag_jws_nonce_payload", return_value=True
             ):
                 payload = copy.deepcopy(sample_authenticate_payload)
                 payload["nonce"] = Nonce.create_nonce().nonce
@@ -163,7 +163,7 @@ class TestAuthenticate:
             side_effect=Exception("this is broken"),
         ):
             with mocker.patch(
-                "ceramic_cache.api.v1.validate_dag_jws_payload", return_value=True
+                "ceramic_cache.api.v1.validate_dag_jws_nonce_payload", return_value=True
             ):
                 payload = copy.deepcopy(sample_authenticate_payload)
                 payload["nonce"] = Nonce.create_nonce().nonce
@@ -94,6 +94,45 @@ class TestBulkStampUpdates:
                 "updated": True
             }
 
+    def test_bulk_update_returns_untouched_stamps(
+        self,
+        sample_providers,
+        sample_address,
+        sample_stamps,
+        sample_token,
+        ui_scorer,
+    ):
+        CeramicCache.objects.create(
+            type=self.stamp_version,
+            address=sample_address,
+            provider=sample_providers[0],
+            stamp=sample_stamps[0],
+        )
+
+        bulk_payload = [
+            {
+                "provider": sample_providers[i],
+                "stamp": {"updated": True},
+            }
+            for i in range(1, len(sample_providers))
+        ]
+
+        cache_stamp_response = client.post(
+            f"{self.base_url}/stamps/bulk",
+            json.dumps(bulk_payload),
+            content_type="application/json",
+            **{"HTTP_AUTHORIZATION": f"Bearer {sample_token}"},
+        )
+
+        assert cache_stamp_response.status_code == 201
+
+        stamps = {s["provider"]: s for s in cache_stamp_response.json()["stamps"]}
+        assert len(stamps) == len(sample_providers)
+        assert stamps[sample_providers[0]]["stamp"] == sample_stamps[0]
+        for i in range(1, len(sample_providers)):
+            assert stamps[sample_providers[i]]["stamp"] == {"updated": True}
+            assert stamps[sample_providers[i]]["address"] == sample_address.lower()
+
     def test_bulk_patch(
         self,
         sample_providers,
@@ -12,6 +12,7 @@ client = Client()
 class TestGetStamp:
     base_url = "/ceramic-cache"
     stamp_version = CeramicCache.StampType.V1
+    api_module = "ceramic_cache.api.v1"
 
     def test_succesfully_get_stamp(
         self, sample_provider, sample_address, verifiable_credential, ui_scorer
@@ -34,6 +35,65 @@ class TestGetStamp:
         assert first_stamp["provider"] == sample_provider
         assert first_stamp["stamp"] == verifiable_credential
 
+    def test_get_stamp_returns_304_if_not_modified(
+        self, sample_provider, sample_address, verifiable_credential, ui_scorer
+    ):
+        CeramicCache.objects.create(
+            type=self.stamp_version,
+            address=sample_address,
+            provider=sample_provider,
+            stamp=verifiable_credential,
+        )
+
+        response = client.get(
+            f"{self.base_url}/stamp?address={sample_address}",
+        )
+        assert response.status_code == 200
+        etag = response.headers["ETag"]
+
+        response = client.get(
+            f"{self.base_url}/stamp?address={sample_address}",
+            HTTP_IF_NONE_MATCH=etag,
+        )
+        assert response.status_code == 304
+
+        CeramicCache.objects.filter(address=sample_address).delete()
+
+        response = client.get(
+            f"{self.base_url}/stamp?address={sample_address}",
+            HTTP_IF_NONE_MATCH=etag,
+        )
+        assert response.status_code == 200
+        assert response.json()["stamps"] == []
+
+    def test_get_stamp_scores_new_passport_instead_of_304(
+        self, mocker, sample_provider, sample_address, verifiable_credential, ui_scorer
+    ):
+        score_passport = mocker.patch(
+            f"{self.api_module}.get_detailed_score_response_for_address"
+        )
+        CeramicCache.objects.create(
+            type=self.stamp_version,
+            address=sample_address,
+            provider=sample_provider,
+            stamp=verifiable_credential,
+        )
+
+        response = client.get(
+            f"{self.base_url}/stamp?address={sample_address}",
+        )
+        assert response.status_code == 200
+
+        # The passport has still no score, the stamps are read again to score it
+        response = client.get(
+            f"{self.base_url}/stamp?address={sample_address}",
+            HTTP_IF_NONE_MATCH=response.headers["ETag"],
+        )
+        assert response.status_code == 200
+        assert response.json()["stamps"][0]["provider"] == sample_provider
+        assert score_passport.call_count == 2
+        score_passport.assert_called_with(sample_address)
+
     def test_get_stamp_returns_empty_list_if_no_stamps_exist(
         self, sample_address, ui_scorer
     ):
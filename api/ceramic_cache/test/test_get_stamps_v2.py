@@ -8,3 +8,4 @@ pytestmark = pytest.mark.django_db
 class TestGetStampV2(TestGetStamp):
     base_url = "/ceramic-cache/v2"
     stamp_version = CeramicCache.StampType.V2
+    api_module = "ceramic_cache.api.v2"
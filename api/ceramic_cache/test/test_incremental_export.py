@@ -0,0 +1,191 @@
+import json
+from datetime import timedelta
+from io import StringIO
+
+import pytest
+import zstandard
+from ceramic_cache.models import ExportWatermark
+from django.core.management import call_command
+from django.utils import timezone
+from registry.models import Event, Passport, Score, Stamp
+from scorer.test.test_export import InlineExecutor, LocalS3
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def local_s3(mocker):
+    s3 = LocalS3()
+    mocker.patch(
+        "ceramic_cache.management.commands.incremental_export.get_s3_client",
+        return_value=s3,
+    )
+    mocker.patch(
+        "ceramic_cache.management.commands.incremental_export.create_process_executor",
+        return_value=InlineExecutor(),
+    )
+    return s3
+
+
+@pytest.fixture
+def scores(scorer_community_with_binary_scorer):
+    passports = Passport.objects.bulk_create(
+        [
+            Passport(
+                address=f"0x{i:040x}", community=scorer_community_with_binary_scorer
+            )
+            for i in range(20)
+        ]
+    )
+    # Groups of 4 scores share the same timestamp
+    day_ago = timezone.now() - timedelta(days=1)
+    return Score.objects.bulk_create(
+        [
+            Score(
+                passport=passport,
+                score=i,
+                status=Score.Status.DONE,
+                last_score_timestamp=day_ago + timedelta(minutes=i // 4),
+            )
+            for i, passport in enumerate(passports)
+        ]
+    )
+
+
+def read_delta(s3: LocalS3, manifest_key: str):
+    manifest = json.loads(s3.objects[("bucket", manifest_key)])
+    rows = []
+    for key in manifest["files"]:
+        data = (
+            zstandard.ZstdDecompressor()
+            .decompressobj()
+            .decompress(s3.objects[("bucket", key)])
+        )
+        rows += [json.loads(line) for line in data.decode("utf-8").splitlines()]
+    return manifest, rows
+
+
+def get_manifests(s3: LocalS3, export: str):
+    return sorted(
+        key
+        for _, key in s3.objects
+        if key.startswith(f"deltas/{export}/") and key.endswith("-manifest.json")
+    )
+
+
+def run_export(**kwargs):
+    call_command(
+        "incremental_export",
+        s3_uri="s3://bucket/deltas/",
+        stdout=StringIO(),
+        **kwargs,
+    )
+
+
+def test_score_deltas(scores, local_s3, mocker):
+    now = timezone.now()
+    mock_now = mocker.patch(
+        "ceramic_cache.management.commands.incremental_export.timezone.now",
+        return_value=now - timedelta(hours=1),
+    )
+    run_export(exports="score", batch_size=3)
+
+    [manifest_key] = get_manifests(local_s3, "score")
+    manifest, rows = read_delta(local_s3, manifest_key)
+    # Pages of 3 rows end in the middle of the groups sharing a timestamp
+    assert sorted(row["id"] for row in rows) == sorted(score.id for score in scores)
+    assert manifest["records"] == len(scores)
+    assert manifest["after"] is None
+
+    watermark = ExportWatermark.objects.get(name="score")
+    assert watermark.last_timestamp.isoformat() == manifest["until"]
+    assert watermark.last_records == len(scores)
+
+    # Rescored since the previous run: one score old enough to be exported, one too recent (its
+    # transaction could still be in progress)
+    Score.objects.filter(id=scores[2].id).update(
+        score=100, last_score_timestamp=now - timedelta(minutes=10)
+    )
+    Score.objects.filter(id=scores[5].id).update(
+        score=200, last_score_timestamp=now - timedelta(seconds=30)
+    )
+
+    mock_now.return_value = now
+    run_export(exports="score", batch_size=3)
+
+    manifest, rows = read_delta(local_s3, get_manifests(local_s3, "score")[1])
+    assert [(row["id"], row["score"]) for row in rows] == [
+        (scores[2].id, "100.000000000")
+    ]
+    assert manifest["after"] == watermark.last_timestamp.isoformat()
+
+
+def test_partitioned_event_deltas(scorer_community_with_binary_scorer, local_s3):
+    events = Event.objects.bulk_create(
+        [
+            Event(
+                action=Event.Action.SCORE_UPDATE,
+                address=f"0x{i:040x}",
+                community=scorer_community_with_binary_scorer,
+                data={"score": i},
+            )
+            for i in range(10)
+        ]
+    )
+    Event.objects.update(created_at=timezone.now() - timedelta(hours=1))
+
+    run_export(exports="event", workers=3, batch_size=2)
+
+    manifest, rows = read_delta(local_s3, get_manifests(local_s3, "event")[0])
+    assert len(manifest["files"]) == 3
+    assert [row["id"] for row in rows] == [event.id for event in events]
+    assert rows[0]["data"] == {"score": 0}
+    assert ExportWatermark.objects.get(name="event").last_id == events[-1].id
+
+    # Nothing new
+    run_export(exports="event", workers=3)
+    assert len(get_manifests(local_s3, "event")) == 1
+
+
+def test_failed_export_keeps_the_watermark(scores, local_s3, mocker):
+    mocker.patch(
+        "ceramic_cache.management.commands.incremental_export.JsonlRows.encode",
+        side_effect=RuntimeError("encoding failed"),
+    )
+
+    with pytest.raises(Exception, match="Failed exports: score"):
+        run_export(exports="score")
+
+    assert not ExportWatermark.objects.filter(name="score").exists()
+    assert not get_manifests(local_s3, "score")
+    assert not local_s3.objects
+
+
+def test_updated_stamps_are_exported_again(
+    scorer_community_with_binary_scorer, local_s3, mocker
+):
+    passport = Passport.objects.create(
+        address="0x" + "0" * 40, community=scorer_community_with_binary_scorer
+    )
+    stamp = Stamp.objects.create(
+        passport=passport, hash="v0.0.0:1234", provider="Google", credential={"a": 1}
+    )
+    Stamp.objects.update(updated_at=timezone.now() - timedelta(hours=1))
+    now = timezone.now()
+    mock_now = mocker.patch(
+        "ceramic_cache.management.commands.incremental_export.timezone.now",
+        return_value=now,
+    )
+    run_export(exports="stamp")
+
+    # Scoring the passport again updates the stamp in place
+    Stamp.objects.update_or_create(
+        hash=stamp.hash, passport=passport, defaults={"credential": {"a": 2}}
+    )
+    mock_now.return_value = now + timedelta(hours=1)
+    run_export(exports="stamp")
+
+    manifests = get_manifests(local_s3, "stamp")
+    assert len(manifests) == 2
+    _, rows = read_delta(local_s3, manifests[1])
+    assert [(row["id"], row["credential"]) for row in rows] == [(stamp.id, {"a": 2})]
@@ -1,11 +1,18 @@
 import copy
 
+import dag_cbor
 import pytest
 from ceramic_cache.test.test_utils_data import (
     verify_jws_data_good,
     verify_jws_data_good_2,
 )
-from ceramic_cache.utils import validate_dag_jws_payload, verify_jws
+from ceramic_cache.utils import (
+    dag_cbor_encode_nonce_payload,
+    get_verify_key,
+    validate_dag_jws_nonce_payload,
+    validate_dag_jws_payload,
+    verify_jws,
+)
 from nacl.exceptions import BadSignatureError
 
 
@@ -17,6 +24,34 @@ def test_validate_dag_jws_payload():
     assert not validate_dag_jws_payload({"nonce": nonce + "BAD"}, payload)
 
 
+def test_validate_dag_jws_nonce_payload():
+    payload = "AXESIJ-t3oi3FWOnXzz1JomHf4BeT-DVOaW5-RtZGPf_miHs"
+    nonce = "super-secure-nonce"
+
+    assert validate_dag_jws_nonce_payload(nonce, payload)
+    assert not validate_dag_jws_nonce_payload(nonce + "BAD", payload)
+    assert validate_dag_jws_nonce_payload(
+        verify_jws_data_good["nonce"], verify_jws_data_good["payload"]
+    )
+
+
+@pytest.mark.parametrize("length", [0, 1, 23, 24, 60, 255, 256, 65535, 65536])
+def test_dag_cbor_encode_nonce_payload_matches_dag_cbor(length):
+    nonce = "a" * length
+    assert dag_cbor_encode_nonce_payload(nonce) == dag_cbor.encode({"nonce": nonce})
+
+
+def test_verify_key_is_cached_per_kid():
+    get_verify_key.cache_clear()
+
+    verify_jws(verify_jws_data_good)
+    verify_jws(verify_jws_data_good)
+
+    cache_info = get_verify_key.cache_info()
+    assert cache_info.misses == 1
+    assert cache_info.hits == 1
+
+
 def test_verify_jws():
     """
     Test that JWS verification works correctly for valid payloads
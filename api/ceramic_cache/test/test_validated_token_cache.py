@@ -0,0 +1,57 @@
+from datetime import datetime, timezone
+
+import pytest
+from ceramic_cache.api.v1 import (
+    DbCacheToken,
+    JWTDidAuthentication,
+    validated_token_cache,
+)
+from ninja_jwt.authentication import InvalidToken
+
+
+@pytest.fixture(autouse=True)
+def clear_token_cache():
+    validated_token_cache.clear()
+    yield
+    validated_token_cache.clear()
+
+
+def create_access_token(did: str) -> str:
+    token = DbCacheToken()
+    token["did"] = did
+    return str(token.access_token)
+
+
+def test_repeated_validation_is_served_from_cache(mocker):
+    raw_token = create_access_token("did:pkh:eip155:1:0x0")
+    validate_token = mocker.spy(JWTDidAuthentication, "validate_token")
+
+    first = JWTDidAuthentication.get_validated_token(raw_token)
+    second = JWTDidAuthentication.get_validated_token(raw_token)
+
+    assert first["did"] == second["did"] == "did:pkh:eip155:1:0x0"
+    assert validate_token.call_count == 1
+    assert validated_token_cache.stats()["hits"] == 1
+
+
+def test_expired_token_is_not_served_from_cache(mocker):
+    raw_token = create_access_token("did:pkh:eip155:1:0x0")
+    validated = JWTDidAuthentication.get_validated_token(raw_token)
+
+    mocker.patch.object(
+        validated_token_cache, "clock", return_value=validated["exp"] + 1
+    )
+    mocker.patch(
+        "ninja_jwt.tokens.aware_utcnow",
+        return_value=datetime.fromtimestamp(validated["exp"] + 1, tz=timezone.utc),
+    )
+
+    with pytest.raises(InvalidToken):
+        JWTDidAuthentication.get_validated_token(raw_token)
+
+
+def test_invalid_token_is_not_cached():
+    with pytest.raises(InvalidToken):
+        JWTDidAuthentication.get_validated_token("not-a-token")
+
+    assert len(validated_token_cache) == 0
@@ -1,5 +1,6 @@
 import base64
 import json
+from functools import lru_cache
 from hashlib import sha256
 from pprint import pprint
 
@@ -41,6 +42,51 @@ def validate_dag_jws_payload(payload: dict, payload_cid_str: str) -> bool:
     return payload_cid == expected_cid
 
 
+# The dag-cbor encoding of `{"nonce": <string>}` starts with the header of a map with 1 entry (0xa1),
+# followed by the encoded key: a text string (major type 3) of length 5
+DAG_CBOR_NONCE_MAP_PREFIX = b"\xa1\x65nonce"
+
+# Binary prefix of a CIDv1 (0x01) for dag-cbor content (0x71), hashed with sha2-256 (0x12) into 32 bytes (0x20)
+CIDV1_DAG_CBOR_SHA256_PREFIX = b"\x01\x71\x12\x20"
+
+VERIFY_KEY_CACHE_SIZE = 4096
+
+
+def dag_cbor_encode_nonce_payload(nonce: str) -> bytes:
+    """
+    Precomputed version of `dag_cbor.encode({"nonce": nonce})`.
+    The payload always has the same shape, so only the header of the text string needs to be built.
+    """
+    encoded_nonce = nonce.encode("utf-8")
+    length = len(encoded_nonce)
+
+    # Header for major type 3 (text string), see https://www.rfc-editor.org/rfc/rfc8949.html#section-3
+    if length < 24:
+        header = bytes([0x60 + length])
+    elif length < 0x100:
+        header = bytes([0x78, length])
+    elif length < 0x10000:
+        header = b"\x79" + length.to_bytes(2, "big")
+    elif length < 0x100000000:
+        header = b"\x7a" + length.to_bytes(4, "big")
+    else:
+        header = b"\x7b" + length.to_bytes(8, "big")
+
+    return DAG_CBOR_NONCE_MAP_PREFIX + header + encoded_nonce
+
+
+def validate_dag_jws_nonce_payload(nonce: str, payload_cid_str: str) -> bool:
+    """
+    Fast path of `validate_dag_jws_payload({"nonce": nonce}, payload_cid_str)`.
+    The expected CID is assembled directly in its binary form and compared to the received bytes,
+    without going through the generic dag-cbor encoder and CID objects.
+    """
+    digest = sha256(dag_cbor_encode_nonce_payload(nonce)).digest()
+    payload_cid_bytes = base64.urlsafe_b64decode(payload_cid_str)
+
+    return payload_cid_bytes == CIDV1_DAG_CBOR_SHA256_PREFIX + digest
+
+
 def pad_b64decoded_string(base64url_string):
     return base64url_string + "=" * (4 - len(base64url_string) % 4)
 
@@ -69,11 +115,6 @@ def verify_jws(data):
     p = base64url_to_json(data["signatures"][0]["protected"])
     kid = p["kid"]
 
-    kid_key = kid.split("#")[1]
-    decoded_kid = decode(kid_key)
-
-    decoded_bytes = decoded_kid[2:]
-
     signature = base64.urlsafe_b64decode(
         pad_b64decoded_string(data["signatures"][0]["signature"])
     )
@@ -82,5 +123,20 @@ def verify_jws(data):
         "utf-8"
     )
 
-    vk = VerifyKey(decoded_bytes)
+    vk = get_verify_key(kid)
     vk.verify(signing_input, signature)
+
+
+@lru_cache(maxsize=VERIFY_KEY_CACHE_SIZE)
+def get_verify_key(kid: str) -> VerifyKey:
+    """
+    Returns the ed25519 VerifyKey for a `did:key` key id (the multibase encoded key is the fragment of the kid).
+    Keys are cached per kid, as the same session key signs all requests of a session.
+    """
+    kid_key = kid.split("#")[1]
+    decoded_kid = decode(kid_key)
+
+    # Skip the 2 bytes of the multicodec prefix (ed25519-pub)
+    decoded_bytes = decoded_kid[2:]
+
+    return VerifyKey(decoded_bytes)
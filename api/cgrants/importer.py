@@ -0,0 +1,339 @@
+"""
+Bulk import of the cgrants JSONL dumps (one `{"pk": ..., "fields": {...}}` record per line).
+
+The dump is streamed from a local file or from S3 (optionally gzip or zstd compressed) and split in
+chunks of lines, which are parsed by a pool of processes. On PostgreSQL, each parsed chunk is
+COPYed into a temporary staging table and merged into the model's table with a single
+`INSERT ... SELECT ... ON CONFLICT`: existing rows are either skipped (`DO NOTHING`) or overwritten
+(`DO UPDATE`). Other databases use `bulk_create` with `ignore_conflicts` / `update_conflicts`.
+
+Records that cannot be parsed and chunks that cannot be written are reported, and the import
+carries on with the next chunk.
+"""
+import gzip
+import io
+import json
+import time
+from collections import deque
+from contextlib import ExitStack, contextmanager
+from dataclasses import dataclass, field
+from itertools import islice
+from typing import Callable, Iterator, List, Tuple, Union
+
+import zstandard
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections, models, transaction
+from scorer.export import get_s3_client, parse_s3_uri
+from scorer.utils import create_process_executor
+
+READ_SIZE = 1024 * 1024
+
+COPY_NULL = "\\N"
+
+# Number of errors printed, the others are only counted
+MAX_REPORTED_ERRORS = 20
+
+ON_CONFLICT_CHOICES = ["skip", "update"]
+
+
+@contextmanager
+def open_input(path: str):
+    """
+    Open the dump as a binary stream, from S3 for `s3://` URIs. Files ending with `.gz` or `.zst`
+    are decompressed while they are read.
+    """
+    with ExitStack() as stack:
+        if path.startswith("s3://"):
+            bucket, key = parse_s3_uri(path)
+            stream = get_s3_client().get_object(Bucket=bucket, Key=key)["Body"]
+            stack.callback(stream.close)
+        else:
+            stream = stack.enter_context(open(path, "rb"))
+
+        if path.endswith(".gz"):
+            stream = stack.enter_context(gzip.GzipFile(fileobj=stream))
+        elif path.endswith(".zst"):
+            stream = stack.enter_context(
+                zstandard.ZstdDecompressor().stream_reader(stream)
+            )
+        yield stream
+
+
+def iter_lines(stream, read_size: int = READ_SIZE) -> Iterator[bytes]:
+    """
+    Split a binary stream in lines. Only `read` is required, which is all the S3 response body and
+    the decompression readers provide.
+    """
+    pending = b""
+    while True:
+        data = stream.read(read_size)
+        if not data:
+            break
+        lines = (pending + data).split(b"\n")
+        pending = lines.pop()
+        yield from lines
+    if pending:
+        yield pending
+
+
+def iter_chunks(lines: Iterator[bytes], size: int) -> Iterator[Tuple[int, List[bytes]]]:
+    """
+    Group the lines in chunks of `size` lines, yields the (1-based) number of the first line of each
+    chunk with its lines
+    """
+    first_line = 1
+    while True:
+        chunk = list(islice(lines, size))
+        if not chunk:
+            break
+        yield first_line, chunk
+        first_line += len(chunk)
+
+
+@dataclass
+class ParsedChunk:
+    first_line: int
+    records: int
+    # The attnames of the fields set by the record converter, updated on conflict
+    fields: List[str]
+    # CSV text for COPY, or the model instances for `bulk_create`
+    rows: Union[str, List[models.Model]]
+    errors: List[str] = field(default_factory=list)
+
+
+def format_copy_value(model_field: models.Field, value) -> str:
+    """
+    Format a value in the CSV format of COPY: all values are quoted, and NULL is written as an
+    unquoted `\\N` (a quoted value is never read as NULL).
+    """
+    if value is None:
+        return COPY_NULL
+    if isinstance(model_field, models.JSONField):
+        value = json.dumps(value, cls=model_field.encoder)
+    return '"' + str(value).replace('"', '""') + '"'
+
+
+def parse_lines(
+    model_label: str,
+    to_fields: Callable[[dict], dict],
+    first_line: int,
+    lines: List[bytes],
+    copy: bool,
+) -> ParsedChunk:
+    """
+    Convert a chunk of JSONL records to rows of the model. Runs in the worker processes, which is
+    why the model is passed by label and `to_fields` must be a module level function.
+    """
+    model = apps.get_model(model_label)
+    concrete_fields = model._meta.concrete_fields
+    errors = []
+    fields = []
+    rows = []
+    csv_lines = []
+
+    for line_number, line in enumerate(lines, start=first_line):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+            values = to_fields(record)
+            obj = model(pk=record["pk"], **values)
+        except Exception as e:
+            errors.append(f"line {line_number}: {type(e).__name__}: {e}")
+            continue
+
+        if not fields:
+            fields = [model._meta.get_field(name).attname for name in values]
+        if copy:
+            csv_lines.append(
+                ",".join(
+                    format_copy_value(f, getattr(obj, f.attname))
+                    for f in concrete_fields
+                )
+            )
+        else:
+            rows.append(obj)
+
+    records = len(csv_lines) if copy else len(rows)
+    return ParsedChunk(
+        first_line=first_line,
+        records=records,
+        fields=fields,
+        rows="\n".join(csv_lines) + "\n" if copy else rows,
+        errors=errors,
+    )
+
+
+def copy_rows(model, rows: str, fields: List[str], on_conflict: str, using: str) -> int:
+    """
+    COPY the rows into the staging table and merge them into the model's table. Returns the number
+    of rows inserted or updated.
+    """
+    connection = connections[using]
+    quote_name = connection.ops.quote_name
+    table = quote_name(model._meta.db_table)
+    staging_table = quote_name(f"{model._meta.db_table}_import")
+    pk_column = quote_name(model._meta.pk.column)
+    columns = ", ".join(quote_name(f.column) for f in model._meta.concrete_fields)
+
+    if on_conflict == "update":
+        update_columns = [
+            quote_name(model._meta.get_field(name).column) for name in fields
+        ]
+        updates = ", ".join(f"{c} = EXCLUDED.{c}" for c in update_columns)
+        # A row cannot be updated twice by the same statement, the dump could repeat a record
+        select = f"SELECT DISTINCT ON ({pk_column}) {columns} FROM {staging_table} ORDER BY {pk_column}"
+        merge = f"ON CONFLICT ({pk_column}) DO UPDATE SET {updates}"
+    else:
+        select = f"SELECT {columns} FROM {staging_table}"
+        # Without a conflict target, rows violating any unique constraint are skipped
+        merge = "ON CONFLICT DO NOTHING"
+
+    with connection.cursor() as cursor:
+        # Same columns and types as the model's table, without its constraints (except NOT NULL)
+        cursor.execute(
+            f"CREATE TEMPORARY TABLE IF NOT EXISTS {staging_table} (LIKE {table}) ON COMMIT DELETE ROWS"
+        )
+        cursor.execute(f"TRUNCATE {staging_table}")
+        cursor.copy_expert(
+            f"COPY {staging_table} ({columns}) FROM STDIN WITH (FORMAT csv, NULL '{COPY_NULL}')",
+            io.StringIO(rows),
+        )
+        cursor.execute(f"INSERT INTO {table} ({columns}) {select} {merge}")
+        return cursor.rowcount
+
+
+def write_chunk(model, chunk: ParsedChunk, on_conflict: str, using: str) -> int:
+    """
+    Write the rows of a parsed chunk in one transaction, returns the number of rows written (for
+    databases other than PostgreSQL, the number of rows sent, conflicts included).
+    """
+    with transaction.atomic(using=using):
+        if isinstance(chunk.rows, str):
+            return copy_rows(model, chunk.rows, chunk.fields, on_conflict, using)
+
+        if on_conflict == "update":
+            model.objects.using(using).bulk_create(
+                chunk.rows,
+                update_conflicts=True,
+                unique_fields=[model._meta.pk.name],
+                update_fields=chunk.fields,
+            )
+        else:
+            model.objects.using(using).bulk_create(chunk.rows, ignore_conflicts=True)
+        return len(chunk.rows)
+
+
+class ImportCommand(BaseCommand):
+    """
+    Base class of the cgrants import commands. Subclasses set the `model`, and `to_fields`, a module
+    level function returning the field values of the model for a record of the dump.
+    """
+
+    model = None
+    to_fields = None
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--in",
+            required=True,
+            help="""JSONL input file, a local path or an S3 URI (for example 's3://bucket/folder/file.jsonl').
+            Files ending with '.gz' or '.zst' are decompressed.""",
+        )
+        parser.add_argument(
+            "--on-conflict",
+            choices=ON_CONFLICT_CHOICES,
+            default="skip",
+            help="What to do with the records that already exist: skip them or update them.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=50000,
+            help="Number of records parsed and written at once.",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Number of processes parsing the records.",
+        )
+        parser.add_argument(
+            "--database",
+            default=DEFAULT_DB_ALIAS,
+            help='Nominates a database to import into. Defaults to the "default" database.',
+        )
+
+    def handle(self, *args, **options):
+        input_file = options["in"]
+        self.stdout.write(self.style.SUCCESS(f'Input file "{input_file}"'))
+
+        self.using = options["database"]
+        self.on_conflict = options["on_conflict"]
+        self.copy = connections[self.using].vendor == "postgresql"
+        self.start = time.monotonic()
+        self.records = 0
+        self.written = 0
+        self.errors = 0
+
+        batch_size = options["batch_size"]
+        workers = options["workers"]
+
+        with open_input(input_file) as stream:
+            chunks = iter_chunks(iter_lines(stream), batch_size)
+            parse_args = (self.model._meta.label, type(self).to_fields)
+            if workers > 1:
+                with create_process_executor(workers) as executor:
+                    # Bounded number of chunks in flight, written in the order of the dump
+                    pending = deque()
+                    for first_line, lines in chunks:
+                        pending.append(
+                            executor.submit(
+                                parse_lines, *parse_args, first_line, lines, self.copy
+                            )
+                        )
+                        if len(pending) >= 2 * workers:
+                            self.write(pending.popleft().result())
+                    while pending:
+                        self.write(pending.popleft().result())
+            else:
+                for first_line, lines in chunks:
+                    self.write(parse_lines(*parse_args, first_line, lines, self.copy))
+
+        elapsed = time.monotonic() - self.start
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{self.records} records parsed, {self.written} written, {self.errors} errors "
+                f"in {elapsed:.1f}s ({self.records / max(elapsed, 1e-6):.0f} records/s)"
+            )
+        )
+        if self.errors:
+            raise CommandError(f"{self.errors} records could not be imported")
+
+    def write(self, chunk: ParsedChunk):
+        self.records += chunk.records
+        for error in chunk.errors:
+            self.report_error(error)
+
+        if chunk.records:
+            try:
+                self.written += write_chunk(
+                    self.model, chunk, self.on_conflict, self.using
+                )
+            except DatabaseError as e:
+                self.report_error(
+                    f"{chunk.records} records from line {chunk.first_line}: {e}",
+                    count=chunk.records,
+                )
+
+        elapsed = time.monotonic() - self.start
+        self.stdout.write(
+            f"{self.records} records, {self.written} written, {self.errors} errors "
+            f"({self.records / max(elapsed, 1e-6):.0f} records/s)"
+        )
+
+    def report_error(self, message: str, count: int = 1):
+        if self.errors < MAX_REPORTED_ERRORS:
+            self.stderr.write(self.style.ERROR(f"ERROR: {message}"))
+        self.errors += count
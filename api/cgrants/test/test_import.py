@@ -0,0 +1,148 @@
+import gzip
+import json
+from io import StringIO
+
+import pytest
+import zstandard
+from cgrants.models import Grant, GrantContributionIndex, Profile
+from django.core.management import CommandError, call_command
+from scorer.test.test_export import InlineExecutor, LocalS3
+
+pytestmark = pytest.mark.django_db
+
+
+def profile_record(pk, handle):
+    return {"model": "dashboard.profile", "pk": pk, "fields": {"handle": handle}}
+
+
+def grant_record(pk, admin_profile, active=True):
+    return {
+        "model": "grants.grant",
+        "pk": pk,
+        "fields": {
+            "admin_profile": admin_profile,
+            "hidden": False,
+            "active": active,
+            "is_clr_eligible": True,
+            "title": f"Grant {pk}",
+        },
+    }
+
+
+def to_jsonl(records) -> bytes:
+    return "".join(json.dumps(record) + "\n" for record in records).encode("utf-8")
+
+
+def run_import(command, path, stderr=None, **kwargs):
+    out = StringIO()
+    call_command(command, stdout=out, stderr=stderr, **{"in": str(path)}, **kwargs)
+    return out.getvalue()
+
+
+@pytest.fixture
+def profiles_file(tmp_path):
+    path = tmp_path / "profiles.jsonl"
+    path.write_bytes(to_jsonl(profile_record(pk, f"user{pk}") for pk in range(1, 11)))
+    return path
+
+
+def test_import_profiles(profiles_file):
+    out = run_import("import_profile", profiles_file, batch_size=3)
+
+    assert Profile.objects.count() == 10
+    profile = Profile.objects.get(id=4)
+    assert profile.handle == "user4"
+    assert profile.data == profile_record(4, "user4")
+    assert "10 records parsed, 10 written, 0 errors" in out
+
+
+def test_existing_records_are_skipped_or_updated(profiles_file, tmp_path):
+    run_import("import_profile", profiles_file)
+    Profile.objects.filter(id=1).update(github_id=1234)
+
+    grants_file = tmp_path / "grants.jsonl"
+    grants_file.write_bytes(to_jsonl([grant_record(1, 1), grant_record(2, 2)]))
+    run_import("import_grant", grants_file)
+
+    grants_file.write_bytes(
+        to_jsonl([grant_record(1, 1, active=False), grant_record(3, 1)])
+    )
+    run_import("import_grant", grants_file)
+    assert Grant.objects.get(id=1).active
+    assert Grant.objects.count() == 3
+
+    run_import("import_grant", grants_file, on_conflict="update")
+    grant = Grant.objects.get(id=1)
+    assert not grant.active
+    assert grant.data["fields"]["active"] is False
+
+    # Fields that are not part of the dump are kept
+    profiles_file.write_bytes(to_jsonl([profile_record(1, "renamed")]))
+    run_import("import_profile", profiles_file, on_conflict="update")
+    profile = Profile.objects.get(id=1)
+    assert (profile.handle, profile.github_id) == ("renamed", 1234)
+
+
+@pytest.mark.parametrize(
+    "extension,compress",
+    [
+        ("", lambda data: data),
+        (".gz", gzip.compress),
+        (".zst", lambda data: zstandard.ZstdCompressor().compress(data)),
+    ],
+)
+def test_import_from_s3(mocker, extension, compress):
+    s3 = LocalS3()
+    mocker.patch("cgrants.importer.get_s3_client", return_value=s3)
+    mocker.patch(
+        "cgrants.importer.create_process_executor", return_value=InlineExecutor()
+    )
+    s3.objects[("bucket", f"cgrants/profiles.jsonl{extension}")] = compress(
+        to_jsonl(profile_record(pk, f"user{pk}") for pk in range(1, 101))
+    )
+
+    run_import(
+        "import_profile",
+        f"s3://bucket/cgrants/profiles.jsonl{extension}",
+        batch_size=7,
+        workers=3,
+    )
+
+    assert list(Profile.objects.order_by("id").values_list("id", flat=True)) == list(
+        range(1, 101)
+    )
+
+
+def test_errors_are_reported(profiles_file, tmp_path):
+    run_import("import_profile", profiles_file)
+
+    indices_file = tmp_path / "indices.jsonl"
+    records = [
+        {
+            "pk": pk,
+            "fields": {
+                "profile": 1,
+                "contribution": None,
+                "grant": 1,
+                "round_num": 15,
+                "amount": "1.5",
+            },
+        }
+        for pk in range(1, 6)
+    ]
+    del records[1]["fields"]["round_num"]
+    indices_file.write_bytes(to_jsonl(records) + b"{not json\n")
+    Grant.objects.create(id=1, admin_profile_id=1)
+
+    err = StringIO()
+    with pytest.raises(CommandError, match="2 records could not be imported"):
+        run_import("import_grantcontributionindex", indices_file, stderr=err)
+
+    assert "line 2: KeyError: 'round_num'" in err.getvalue()
+    assert "line 6: JSONDecodeError" in err.getvalue()
+    assert sorted(GrantContributionIndex.objects.values_list("id", flat=True)) == [
+        1,
+        3,
+        4,
+        5,
+    ]
@@ -21,11 +21,12 @@ def get_did(address, network="1"):
 
 
 async def aget_passport(address: str = "") -> Dict:
-    db_stamp_list = CeramicCache.objects.filter(address=address)
+    db_stamp_list = CeramicCache.objects.filter(address=address).with_credentials()
 
     return {
         "stamps": [
-            {"provider": s.provider, "credential": s.stamp} async for s in db_stamp_list
+            {"provider": s.provider, "credential": s.get_stamp()}
+            async for s in db_stamp_list
         ]
     }
 
@@ -0,0 +1,121 @@
+"""
+Buffered writer for the API key analytics.
+
+Requests only append a record to an in-memory buffer. A background thread per process writes the
+buffered records with `bulk_create` every `API_ANALYTICS_FLUSH_INTERVAL` seconds, or as soon as
+`API_ANALYTICS_BATCH_SIZE` records are waiting, so the database write is never on the request path.
+"""
+import atexit
+import threading
+from typing import List, Optional
+
+import api_logging as logging
+from account.models import AccountAPIKeyAnalytics
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+log = logging.getLogger(__name__)
+
+PATH_MAX_LENGTH = AccountAPIKeyAnalytics._meta.get_field("path").max_length
+
+
+class ApiKeyAnalyticsBuffer:
+    def __init__(
+        self,
+        batch_size: int,
+        flush_interval: float,
+        max_buffer_size: int,
+        background: bool = True,
+    ):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_buffer_size = max_buffer_size
+        self.background = background
+        self.dropped = 0
+        self._records: List[AccountAPIKeyAnalytics] = []
+        self._lock = threading.Lock()
+        self._batch_ready = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def add(self, api_key_id: str, path: str) -> None:
+        """
+        Buffer the analytics record of a request. This never blocks on the database and can be
+        called from async views as well.
+        """
+        record = AccountAPIKeyAnalytics(
+            api_key_id=api_key_id,
+            path=path[:PATH_MAX_LENGTH],
+            created_at=timezone.now(),
+        )
+
+        with self._lock:
+            if len(self._records) >= self.max_buffer_size:
+                # The database is not keeping up, drop the record rather than growing without bounds
+                self.dropped += 1
+                return
+
+            self._records.append(record)
+            batch_ready = len(self._records) >= self.batch_size
+
+        if self.background:
+            self._ensure_flusher()
+            if batch_ready:
+                self._batch_ready.set()
+
+    def flush(self) -> int:
+        """
+        Write all the buffered records, returns the number of records written
+        """
+        with self._lock:
+            records, self._records = self._records, []
+            dropped, self.dropped = self.dropped, 0
+
+        if dropped:
+            log.warning("Dropped %s API key analytics records", dropped)
+
+        if not records:
+            return 0
+
+        try:
+            AccountAPIKeyAnalytics.objects.bulk_create(
+                records, batch_size=self.batch_size
+            )
+        except Exception:
+            log.error(
+                "Failed to save %s API key analytics records",
+                len(records),
+                exc_info=True,
+            )
+            return 0
+
+        return len(records)
+
+    def _ensure_flusher(self) -> None:
+        if self._thread:
+            return
+
+        with self._lock:
+            if self._thread:
+                return
+            self._thread = threading.Thread(
+                target=self._run, name="api-key-analytics", daemon=True
+            )
+            self._thread.start()
+
+        atexit.register(self.flush)
+
+    def _run(self) -> None:
+        while True:
+            self._batch_ready.wait(self.flush_interval)
+            self._batch_ready.clear()
+            self.flush()
+            # This thread has its own database connection, make sure it does not go stale
+            close_old_connections()
+
+
+api_key_analytics_buffer = ApiKeyAnalyticsBuffer(
+    batch_size=settings.API_ANALYTICS_BATCH_SIZE,
+    flush_interval=settings.API_ANALYTICS_FLUSH_INTERVAL,
+    max_buffer_size=settings.API_ANALYTICS_MAX_BUFFER_SIZE,
+)
@@ -5,6 +5,7 @@ import api_logging as logging
 
 # --- Deduplication Modules
 from account.models import Community
+from django.conf import settings
 from registry.api.schema import (
     CursorPaginatedHistoricalScoreResponse,
     DetailedScoreResponse,
@@ -12,12 +13,8 @@ from registry.api.schema import (
 )
 from registry.api.utils import ApiKey, check_rate_limit, with_read_db
 from registry.exceptions import InvalidLimitException, api_get_object_or_404
-from registry.models import Event, Score
-from registry.utils import (
-    decode_cursor,
-    get_cursor_query_condition,
-    get_cursor_tokens_for_results,
-)
+from registry.models import Event, Score, ScoreSnapshot
+from registry.utils import decode_cursor, get_cursor_tokens_for_results, get_keyset_page
 
 log = logging.getLogger(__name__)
 
@@ -53,6 +50,11 @@ def get_score_history(
         else:
             created_at = None
 
+        if settings.FF_SCORE_HISTORY_SNAPSHOTS == "on" and (created_at or not address):
+            return get_score_history_from_snapshots(
+                request, community, address, created_at, cursor, limit
+            )
+
         # Scenario 2 - Snapshot for 1 addresses
         # the user has passed in the address, but no created_at
         # In this case only 1 result will be returned
@@ -115,35 +117,26 @@ def get_score_history(
         # Scenario 3 - Snapshot for all addresses
         # the user has passed in the created_at, but no address
         elif created_at:
-            pagination_sort_fields = ["address"]
-            filter_condition, field_ordering = get_cursor_query_condition(
-                cursor, pagination_sort_fields
-            )
+            query = base_query.filter(created_at__lte=created_at).distinct("address")
 
-            field_ordering.append("-created_at")
-            query = (
-                base_query.filter(filter_condition)
-                .order_by(*field_ordering)
-                .distinct("address")
+            page = get_keyset_page(
+                query,
+                ["address"],
+                cursor,
+                limit,
+                # Only the latest score at `created_at` is returned for each address
+                trailing_ordering=["-created_at"],
+                cursor_state=dict(created_at=created_at.isoformat()),
+                descending=True,
             )
-
-            scores = list(query[:limit])
+            scores = page.items
             for score in scores:
                 score.created_at = score.created_at.isoformat()
 
-            if cursor and cursor["d"] == "prev":
-                scores.reverse()
-
             domain = request.build_absolute_uri("/")[:-1]
 
             page_links = get_cursor_tokens_for_results(
-                query,
-                domain,
-                scores,
-                pagination_sort_fields,
-                limit,
-                [scorer_id],
-                endpoint,
+                domain, page, limit, [scorer_id], endpoint
             )
 
             score_response = []
@@ -168,35 +161,20 @@ def get_score_history(
             return response
         # # Scenario 4 - Just return history ...
         else:
-            pagination_sort_fields = ["id"]
-            filter_condition, field_ordering = get_cursor_query_condition(
-                cursor, pagination_sort_fields
-            )
+            query = base_query.distinct("address")
 
-            field_ordering.insert(0, "address")
-            query = (
-                base_query.filter(filter_condition)
-                .order_by(*field_ordering)
-                .distinct("address")
+            # Only the latest score is returned for each address
+            page = get_keyset_page(
+                query, ["address"], cursor, limit, trailing_ordering=["-id"]
             )
-
-            scores = list(query[:limit])
+            scores = page.items
             for score in scores:
                 score.created_at = score.created_at.isoformat()
 
-            if cursor and cursor["d"] == "prev":
-                scores.reverse()
-
             domain = request.build_absolute_uri("/")[:-1]
 
             page_links = get_cursor_tokens_for_results(
-                query,
-                domain,
-                scores,
-                pagination_sort_fields,
-                limit,
-                [scorer_id],
-                endpoint,
+                domain, page, limit, [scorer_id], endpoint
             )
 
             score_response = []
@@ -228,6 +206,77 @@ def get_score_history(
         raise e
 
 
+def get_snapshot_score_response(
+    snapshot: ScoreSnapshot, address: Optional[str] = None
+) -> DetailedScoreResponse:
+    return DetailedScoreResponse(
+        address=address or snapshot.address,
+        score=float(snapshot.score),
+        status=Score.Status.DONE,
+        last_score_timestamp=snapshot.valid_from.isoformat(),
+        evidence=snapshot.evidence,
+        error=None,
+        stamp_scores=None,
+    )
+
+
+def get_score_history_from_snapshots(
+    request,
+    community: Community,
+    address: Optional[str],
+    created_at: Optional[datetime],
+    cursor: Optional[dict],
+    limit: int,
+) -> CursorPaginatedHistoricalScoreResponse:
+    """
+    Same as the scenarios 2 to 4 of `get_score_history`, but the score valid at a given time
+    is looked up in the ScoreSnapshot intervals, instead of searching the latest event for every address.
+    """
+    base_query = with_read_db(ScoreSnapshot).filter(community_id=community.id)
+
+    # Snapshot for 1 address and timestamp
+    if address:
+        snapshot = (
+            base_query.filter(
+                ScoreSnapshot.as_of_condition(created_at), address=address
+            )
+            .order_by("-valid_from")
+            .first()
+        )
+        return CursorPaginatedHistoricalScoreResponse(
+            next=None,
+            prev=None,
+            items=[get_snapshot_score_response(snapshot, address)] if snapshot else [],
+        )
+
+    if created_at:
+        # Snapshot for all addresses at the timestamp
+        page = get_keyset_page(
+            base_query.filter(ScoreSnapshot.as_of_condition(created_at)),
+            ["address"],
+            cursor,
+            limit,
+            cursor_state=dict(created_at=created_at.isoformat()),
+            descending=True,
+        )
+    else:
+        # Current scores for all addresses
+        page = get_keyset_page(
+            base_query.filter(valid_to__isnull=True), ["address"], cursor, limit
+        )
+
+    domain = request.build_absolute_uri("/")[:-1]
+    page_links = get_cursor_tokens_for_results(
+        domain, page, limit, [community.id], "get_score_history"
+    )
+
+    return CursorPaginatedHistoricalScoreResponse(
+        next=page_links["next"],
+        prev=page_links["prev"],
+        items=[get_snapshot_score_response(snapshot) for snapshot in page.items],
+    )
+
+
 history_endpoint = {
     "url": "/score/{int:scorer_id}/history",
     "auth": ApiKey(),
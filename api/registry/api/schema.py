@@ -125,6 +125,16 @@ class CursorPaginatedHistoricalScoreResponse(Schema):
     items: List[DetailedScoreResponse]
 
 
+class ScoreLookupPayload(Schema):
+    addresses: List[str]
+
+
+class ScoreLookupResponse(Schema):
+    address: str
+    found: bool
+    score: Optional[DetailedScoreResponse]
+
+
 class SimpleScoreResponse(Schema):
     address: str
     score: Decimal  # The score should be represented as string as it will be a decimal number
@@ -1,18 +1,30 @@
+import hashlib
+from datetime import datetime
+from typing import Optional
+
 import api_logging as logging
+from account.api_key_cache import (
+    acache_verified_api_key,
+    aget_verified_api_key,
+    cache_verified_api_key,
+    get_verified_api_key,
+)
 from account.models import Account, AccountAPIKey
+from asgiref.sync import sync_to_async
 from django.conf import settings
-from django.contrib.auth import get_user_model
+from django.http import HttpRequest, HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
 from django.utils.module_loading import import_string
-from django_ratelimit.core import is_ratelimited
-from django_ratelimit.decorators import ALL
 from django_ratelimit.exceptions import Ratelimited
 from ninja.compatibility.request import get_headers
 from ninja.security import APIKeyHeader
 from ninja.security.base import SecuritySchema
+from registry.analytics import api_key_analytics_buffer
 from registry.api.schema import SubmitPassportPayload
-from registry.atasks import asave_api_key_analytics
 from registry.exceptions import InvalidScorerIdException, Unauthorized
-from registry.tasks import save_api_key_analytics
+from registry.rate_limiter import is_ratelimited, local_rate_limiter
+from scorer.db_router import set_request_api_key
 
 log = logging.getLogger(__name__)
 
@@ -39,19 +51,31 @@ class ApiKey(APIKeyHeader):
             except:
                 raise Unauthorized()
 
-        try:
-            api_key = AccountAPIKey.objects.get_from_key(key)
-            request.api_key = api_key
+        verified = get_verified_api_key(key)
+        if not verified:
+            try:
+                api_key = AccountAPIKey.objects.get_from_key(key)
+            except AccountAPIKey.DoesNotExist:
+                raise Unauthorized()
+
+            # The key is not rejected by `get_from_key` once its expiry date has passed
+            if api_key.has_expired:
+                raise Unauthorized()
+
             user_account = api_key.account
+            verified = cache_verified_api_key(
+                key, api_key, user_account, user_account.user if user_account else None
+            )
 
-            if settings.FF_API_ANALYTICS == "on":
-                save_api_key_analytics(api_key.id, request.path)
+        request.api_key = verified.api_key
+        set_request_api_key(verified.api_key.prefix)
 
-            if user_account:
-                request.user = user_account.user
-                return user_account
-        except AccountAPIKey.DoesNotExist:
-            raise Unauthorized()
+        if settings.FF_API_ANALYTICS == "on":
+            api_key_analytics_buffer.add(verified.api_key.id, request.path)
+
+        if verified.account:
+            request.user = verified.user
+            return verified.account
 
 
 async def aapi_key(request):
@@ -77,27 +101,34 @@ async def aapi_key(request):
     if not key:
         raise Unauthorized()
 
-    prefix, _, _ = key.partition(".")
-    queryset = AccountAPIKey.objects.get_usable_keys()
+    verified = await aget_verified_api_key(key)
+    if not verified:
+        prefix, _, _ = key.partition(".")
+        queryset = AccountAPIKey.objects.get_usable_keys()
 
-    try:
-        api_key = await queryset.aget(prefix=prefix)
-        request.api_key = api_key
-    except AccountAPIKey.DoesNotExist:
-        raise Unauthorized()
+        try:
+            api_key = await queryset.aget(prefix=prefix)
+        except AccountAPIKey.DoesNotExist:
+            raise Unauthorized()
 
-    if not api_key.is_valid(key):
-        raise Unauthorized()
+        if not api_key.is_valid(key) or api_key.has_expired:
+            raise Unauthorized()
 
-    if settings.FF_API_ANALYTICS == "on":
-        asave_api_key_analytics(api_key.id, request.path)
+        user_account = await Account.objects.select_related("user").aget(
+            pk=api_key.account_id
+        )
+        verified = await acache_verified_api_key(
+            key, api_key, user_account, user_account.user
+        )
+
+    request.api_key = verified.api_key
+    set_request_api_key(verified.api_key.prefix)
 
-    user_account = await Account.objects.aget(pk=api_key.account_id)
-    if user_account:
-        request.user = await get_user_model().objects.aget(pk=user_account.user_id)
-        return user_account
+    if settings.FF_API_ANALYTICS == "on":
+        api_key_analytics_buffer.add(verified.api_key.id, request.path)
 
-    raise Unauthorized()
+    request.user = verified.user
+    return verified.account
 
 
 # Following information & settings on aapi_key are meant to enable
@@ -108,27 +139,63 @@ aapi_key.openapi_security_schema: SecuritySchema = SecuritySchema(
 )
 
 
-def check_rate_limit(request):
+def check_rate_limit(request, cost: int = 1):
     """
     Check the rate limit for the API.
     This is based on the original ratelimit decorator from django_ratelimit
+
+    `cost` is the number of requests this call counts for (e.g. the size of a batch lookup).
+    It is charged with a single cache increment, instead of `cost` separate checks.
+    """
+    rate = request.api_key.rate_limit
+
+    # Bypass rate limiting for unlimited API keys (empty or NULL rate)
+    if not rate:
+        return
+
+    if is_local_rate_limiter_enabled():
+        ratelimited = local_rate_limiter.is_ratelimited(
+            request.api_key.prefix, rate, cost
+        )
+    else:
+        ratelimited = is_shared_ratelimited(request, rate, cost)
+
+    raise_if_ratelimited(request, ratelimited)
+
+
+async def acheck_rate_limit(request, cost: int = 1):
+    """
+    Async version of `check_rate_limit`, for async views. The event loop is not blocked by the
+    round trip to the shared cache.
     """
-    old_limited = getattr(request, "limited", False)
     rate = request.api_key.rate_limit
 
-    # Bypass rate limiting if rate is set to None
-    if rate == "":
+    # Bypass rate limiting for unlimited API keys (empty or NULL rate)
+    if not rate:
         return
 
-    ratelimited = is_ratelimited(
-        request=request,
-        group="registry",
-        fn=None,
-        key=lambda _request, _group: request.api_key.prefix,
-        rate=rate,
-        method=ALL,
-        increment=True,
+    if is_local_rate_limiter_enabled():
+        ratelimited = await local_rate_limiter.ais_ratelimited(
+            request.api_key.prefix, rate, cost
+        )
+    else:
+        ratelimited = await sync_to_async(is_shared_ratelimited)(request, rate, cost)
+
+    raise_if_ratelimited(request, ratelimited)
+
+
+def is_local_rate_limiter_enabled() -> bool:
+    return settings.FF_LOCAL_RATE_LIMITER == "on" and getattr(
+        settings, "RATELIMIT_ENABLE", True
     )
+
+
+def is_shared_ratelimited(request, rate: str, cost: int) -> bool:
+    return is_ratelimited(request.api_key.prefix, rate, cost)
+
+
+def raise_if_ratelimited(request, ratelimited: bool):
+    old_limited = getattr(request, "limited", False)
     request.limited = ratelimited or old_limited
     if ratelimited:
         cls = getattr(settings, "RATELIMIT_EXCEPTION_CLASS", Ratelimited)
@@ -154,3 +221,38 @@ def get_scorer_id(payload: SubmitPassportPayload) -> str:
 
 def with_read_db(model):
     return model.objects.using(settings.REGISTRY_API_READ_DB)
+
+
+def make_etag(*parts) -> str:
+    """
+    Build a weak ETag from the given validator parts (ids, counts, timestamps ...).
+    Weak, because the validators identify the state of the records and not the exact bytes of the response.
+    """
+    digest = hashlib.sha256("|".join(str(p) for p in parts).encode("utf-8"))
+    return f'W/"{digest.hexdigest()[:32]}"'
+
+
+def get_not_modified_response(
+    request: HttpRequest,
+    response: HttpResponse,
+    etag: Optional[str],
+    last_modified: Optional[datetime],
+) -> Optional[HttpResponse]:
+    """
+    Set the `ETag` and `Last-Modified` headers on the (temporal) response of an endpoint and check the
+    conditional headers of the request against them.
+    Returns a `304 Not Modified` response if the client already has the current version, None otherwise.
+    """
+    last_modified_ts = int(last_modified.timestamp()) if last_modified else None
+
+    if etag:
+        response.headers["ETag"] = etag
+    if last_modified_ts is not None:
+        response.headers["Last-Modified"] = http_date(last_modified_ts)
+
+    conditional_response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified_ts, response=response
+    )
+    if conditional_response is response:
+        return None
+    return conditional_response
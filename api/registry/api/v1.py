@@ -1,17 +1,15 @@
 from datetime import datetime
-from typing import List, Optional
-from urllib.parse import urljoin
+from typing import List, Optional, Tuple
 
 import api_logging as logging
 import django_filters
-import requests
 from account.api import UnauthorizedException, create_community_for_account
 
 # --- Deduplication Modules
 from account.models import Account, Community, Nonce, Rules
 from ceramic_cache.models import CeramicCache
 from django.conf import settings
-from django.core.cache import cache
+from django.http import HttpResponse
 from eth_utils import is_checksum_address, is_checksum_formatted_address, is_hex_address
 from gql import Client, gql
 from gql.transport.requests import RequestsHTTPTransport
@@ -36,9 +34,12 @@ from registry.api.schema import (
 from registry.api.utils import (
     ApiKey,
     aapi_key,
+    acheck_rate_limit,
     check_rate_limit,
     community_requires_signature,
+    get_not_modified_response,
     get_scorer_id,
+    make_etag,
     with_read_db,
 )
 from registry.atasks import ascore_passport
@@ -58,6 +59,8 @@ from registry.exceptions import (
 )
 from registry.filters import GTCStakeEventsFilter
 from registry.models import Event, GTCStakeEvent, Passport, Score, Stamp
+from registry.score_cache import get_cached_score, is_score_cache_enabled
+from registry.stamp_metadata import stamp_metadata_index
 from registry.tasks import score_passport_passport, score_registry_passport
 from registry.utils import (
     decode_cursor,
@@ -80,8 +83,6 @@ Examples of valid values for `timestamp`: \n
 """
 
 
-METADATA_URL = urljoin(settings.PASSPORT_PUBLIC_URL, "stampMetadata.json")
-
 log = logging.getLogger(__name__)
 # api = NinjaExtraAPI(urls_namespace="registry")
 router = Router()
@@ -159,7 +160,7 @@ If the status is **PROCESSING**, this means that your passport is being pulled f
 async def a_submit_passport(
     request, payload: SubmitPassportPayload
 ) -> DetailedScoreResponse:
-    check_rate_limit(request)
+    await acheck_rate_limit(request)
     try:
         log.debug("called a_submit_passport, payload=%s", payload)
 
@@ -353,21 +354,63 @@ This endpoint will return a `DetailedScoreResponse`. This endpoint will also ret
 {SCORE_TIMESTAMP_FIELD_DESCRIPTION}
 """,
 )
-def get_score(request, address: str, scorer_id: int | str) -> DetailedScoreResponse:
+def get_score(
+    request, address: str, scorer_id: int | str, response: HttpResponse
+) -> DetailedScoreResponse:
     check_rate_limit(request)
     account = request.auth
 
     if not request.api_key.read_scores:
         raise InvalidAPIKeyPermissions()
 
-    return handle_get_score(address, scorer_id, account)
+    # Get community object
+    user_community = get_scorer_by_id(scorer_id, account)
+
+    not_modified = get_not_modified_response(
+        request, response, *get_score_validators(address, user_community.pk)
+    )
+    if not_modified:
+        return not_modified
+
+    return handle_get_score(address, scorer_id, account, user_community)
+
+
+def get_score_validators(
+    address: str, community_id: int
+) -> Tuple[Optional[str], Optional[datetime]]:
+    """
+    Returns the (ETag, Last-Modified) validators for the score of `address` in a community.
+    Only the columns describing the state of the score are loaded, not the evidence or stamp scores.
+    """
+    if is_score_cache_enabled():
+        cached_score = get_cached_score(community_id, address)
+        if not cached_score:
+            return (None, None)
+        return (cached_score.etag, cached_score.last_modified)
+
+    score_state = (
+        Score.objects.filter(
+            passport__address=address.lower(), passport__community_id=community_id
+        )
+        .values_list("id", "status", "score", "last_score_timestamp")
+        .first()
+    )
+
+    if not score_state:
+        return (None, None)
+
+    return (make_etag("score", *score_state), score_state[3])
 
 
 def handle_get_score(
-    address: str, scorer_id: int, account: Account
+    address: str,
+    scorer_id: int,
+    account: Account,
+    user_community: Optional[Community] = None,
 ) -> DetailedScoreResponse:
     # Get community object
-    user_community = get_scorer_by_id(scorer_id, account)
+    if not user_community:
+        user_community = get_scorer_by_id(scorer_id, account)
 
     try:
         lower_address = address.lower()
@@ -375,6 +418,11 @@ def handle_get_score(
         if not is_valid_address(lower_address):
             raise InvalidAddressException()
 
+        if is_score_cache_enabled():
+            cached_score = get_cached_score(user_community.pk, lower_address)
+            if cached_score:
+                return cached_score.get_response()
+
         score = Score.objects.get(
             passport__address=lower_address, passport__community=user_community
         )
@@ -527,7 +575,9 @@ def get_passport_stamps(
     if not is_valid_address(address):
         raise InvalidAddressException()
 
-    query = CeramicCache.objects.order_by("-id").filter(address=address)
+    query = (
+        CeramicCache.objects.order_by("-id").filter(address=address).with_credentials()
+    )
 
     cursor = decode_cursor(token) if token else {}
     direction = cursor.get("d")
@@ -554,12 +604,18 @@ def get_passport_stamps(
         has_more_stamps = query.filter(id__lt=next_id).exists()
         has_prev_stamps = query.filter(id__gt=prev_id).exists()
 
+    if include_metadata and cacheStamps:
+        # Resolve the metadata index once for the whole page
+        metadataByProvider = stamp_metadata_index.get_by_provider()
+        if metadataByProvider is None:
+            raise InternalServerErrorException("Error fetching external stamp metadata")
+
     stamps = [
         {
             "version": "1.0.0",
-            "credential": cache.stamp,
+            "credential": cache.get_stamp(),
             **(
-                {"metadata": fetch_stamp_metadata_for_provider(cache.provider)}
+                {"metadata": metadataByProvider.get(cache.provider)}
                 if include_metadata
                 else {}
             ),
@@ -638,34 +694,7 @@ def create_generic_scorer(request, payload: GenericCommunityPayload):
 
 
 def fetch_all_stamp_metadata() -> List[StampDisplayResponse]:
-    # Try to get the metadata from the cache
-    metadata = cache.get("metadata")
-
-    # If it's not in the cache, fetch it from the external API
-    if metadata is None:
-        try:
-            response = requests.get(METADATA_URL)
-            response.raise_for_status()
-
-            responseJson = response.json()
-
-            # Append base URL to icon URLs
-            metadata = [
-                StampDisplayResponse(
-                    **{
-                        **platformData,
-                        "icon": urljoin(
-                            settings.PASSPORT_PUBLIC_URL, platformData["icon"]
-                        ),
-                    }
-                )
-                for platformData in responseJson
-            ]
-
-            # Store the metadata in the cache, with a timeout of 1 hour
-            cache.set("metadata", metadata, 60 * 60)
-        except:
-            log.exception("Error fetching external metadata")
+    metadata = stamp_metadata_index.get_metadata()
 
     if metadata is None:
         raise InternalServerErrorException("Error fetching external stamp metadata")
@@ -674,32 +703,9 @@ def fetch_all_stamp_metadata() -> List[StampDisplayResponse]:
 
 
 def fetch_stamp_metadata_for_provider(provider: str):
-    metadataByProvider = cache.get("metadataByProvider")
+    metadataByProvider = stamp_metadata_index.get_by_provider()
 
-    try:
-        if metadataByProvider is None:
-            metadata = fetch_all_stamp_metadata()
-            metadataByProvider = {
-                stamp.name: {
-                    "name": stamp.name,
-                    "description": stamp.description,
-                    "hash": stamp.hash,
-                    "group": group.name,
-                    "platform": {
-                        "name": platform.name,
-                        "id": platform.id,
-                        "icon": platform.icon,
-                        "description": platform.description,
-                        "connectMessage": platform.connectMessage,
-                    },
-                }
-                for platform in metadata
-                for group in platform.groups
-                for stamp in group.stamps
-            }
-            cache.set("metadataByProvider", metadataByProvider, 60 * 60)
-    except:
-        log.exception("Error fetching external metadata")
+    if metadataByProvider is None:
         raise InternalServerErrorException(
             "Error fetching external stamp metadata for provider " + provider
         )
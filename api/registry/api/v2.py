@@ -1,11 +1,15 @@
-from datetime import datetime
-from typing import List, Optional
+import csv
+import io
+import json
+from typing import AsyncIterator, List, Optional
 
 import api_logging as logging
 
 # --- Deduplication Modules
 from account.models import Account, Community
+from django.conf import settings
 from django.db.models import Max, Q
+from django.http import HttpResponse, StreamingHttpResponse
 from ninja import Router
 from registry.api import common, v1
 from registry.api.schema import (
@@ -14,6 +18,8 @@ from registry.api.schema import (
     CursorPaginatedStampCredentialResponse,
     DetailedScoreResponse,
     ErrorMessageResponse,
+    ScoreLookupPayload,
+    ScoreLookupResponse,
     SigningMessageResponse,
     StampDisplayResponse,
     SubmitPassportPayload,
@@ -21,16 +27,13 @@ from registry.api.schema import (
 from registry.api.utils import ApiKey, check_rate_limit, with_read_db
 from registry.exceptions import (
     InvalidAddressException,
+    InvalidAPIKeyPermissions,
+    InvalidExportFormatException,
     InvalidLimitException,
     api_get_object_or_404,
 )
 from registry.models import Score
-from registry.utils import (
-    decode_cursor,
-    encode_cursor,
-    get_cursor_query_condition,
-    reverse_lazy_with_query,
-)
+from registry.utils import decode_cursor, get_cursor_tokens_for_results, get_keyset_page
 
 log = logging.getLogger(__name__)
 
@@ -111,105 +114,46 @@ def get_scores(
         Community, id=scorer_id, account=request.auth
     )
     try:
-        base_query = (
-            with_read_db(Score)
-            .filter(passport__community__id=user_community.id)
-            .select_related("passport")
-        )
-
-        filter_condition = Q()
-        field_ordering = None
         cursor = decode_cursor(token) if token else None
-        sort_fields = ["last_score_timestamp", "id"]
 
         if cursor:
-            cursor = decode_cursor(token)
-            cursor["last_score_timestamp"] = datetime.fromisoformat(
-                cursor.get("last_score_timestamp")
-            )
-            filter_condition, field_ordering = get_cursor_query_condition(
-                cursor, sort_fields
-            )
-
-        else:
-            field_ordering = ["last_score_timestamp", "id"]
-
-            if address:
-                if not v1.is_valid_address(address):
-                    raise InvalidAddressException()
-                filter_condition &= Q(passport__address=address)
-
-            if last_score_timestamp__gt:
-                filter_condition &= Q(last_score_timestamp__gt=last_score_timestamp__gt)
-
-            if last_score_timestamp__gte:
-                filter_condition &= Q(
-                    last_score_timestamp__gte=last_score_timestamp__gte
-                )
-
-        has_more_scores = has_prev_scores = False
-        next_cursor = prev_cursor = {}
-
-        query = base_query.filter(filter_condition).order_by(*field_ordering)
-        scores = query[:limit]
-        scores = list(scores)
-
-        if cursor and cursor["d"] == "prev":
-            scores.reverse()
-
-        if scores:
-            next_id = scores[-1].id
-            next_lts = scores[-1].last_score_timestamp
-            prev_id = scores[0].id
-            prev_lts = scores[0].last_score_timestamp
-
-            next_cursor = dict(
-                d="next",
-                id=next_id,
-                last_score_timestamp=next_lts.isoformat(),
+            # The filters of the first request are carried over in the cursor
+            address = cursor.get("address")
+            last_score_timestamp__gt = cursor.get("last_score_timestamp__gt")
+            last_score_timestamp__gte = cursor.get("last_score_timestamp__gte")
+
+        filter_condition = Q(passport__community__id=user_community.id)
+
+        if address:
+            if not v1.is_valid_address(address):
+                raise InvalidAddressException()
+            filter_condition &= Q(passport__address=address)
+
+        if last_score_timestamp__gt:
+            filter_condition &= Q(last_score_timestamp__gt=last_score_timestamp__gt)
+
+        if last_score_timestamp__gte:
+            filter_condition &= Q(last_score_timestamp__gte=last_score_timestamp__gte)
+
+        page = get_keyset_page(
+            with_read_db(Score).filter(filter_condition).select_related("passport"),
+            ["last_score_timestamp", "id"],
+            cursor,
+            limit,
+            cursor_state=dict(
                 address=address,
                 last_score_timestamp__gt=last_score_timestamp__gt,
                 last_score_timestamp__gte=last_score_timestamp__gte,
-            )
-            prev_cursor = dict(
-                d="prev",
-                id=prev_id,
-                last_score_timestamp=prev_lts.isoformat(),
-                address=address,
-                last_score_timestamp__gt=last_score_timestamp__gt,
-                last_score_timestamp__gte=last_score_timestamp__gte,
-            )
-
-            next_filter_cond, _ = get_cursor_query_condition(next_cursor, sort_fields)
-            prev_filter_cond, _ = get_cursor_query_condition(prev_cursor, sort_fields)
-
-            has_more_scores = base_query.filter(next_filter_cond).exists()
-            has_prev_scores = base_query.filter(prev_filter_cond).exists()
-
-        domain = request.build_absolute_uri("/")[:-1]
-
-        next_url = (
-            f"""{domain}{reverse_lazy_with_query(
-                "registry_v2:get_scores",
-                args=[scorer_id],
-                query_kwargs={"token": encode_cursor(**next_cursor), "limit": limit},
-            )}"""
-            if has_more_scores
-            else None
+            ),
         )
 
-        prev_url = (
-            f"""{domain}{reverse_lazy_with_query(
-                "registry_v2:get_scores",
-                args=[scorer_id],
-                query_kwargs={"token": encode_cursor(**prev_cursor), "limit": limit},
-            )}"""
-            if has_prev_scores
-            else None
+        domain = request.build_absolute_uri("/")[:-1]
+        page_links = get_cursor_tokens_for_results(
+            domain, page, limit, [scorer_id], "get_scores"
         )
 
         response = CursorPaginatedScoreResponse(
-            next=next_url, prev=prev_url, items=scores
+            next=page_links["next"], prev=page_links["prev"], items=page.items
         )
 
         return response
@@ -295,6 +239,199 @@ def get_score_history(
     )
 
 
+SCORE_EXPORT_FIELDS = [
+    "passport__address",
+    "score",
+    "status",
+    "last_score_timestamp",
+    "evidence",
+    "error",
+    "stamp_scores",
+]
+SCORE_EXPORT_COLUMNS = [
+    "address",
+    "score",
+    "status",
+    "last_score_timestamp",
+    "evidence",
+    "error",
+    "stamp_scores",
+]
+SCORE_EXPORT_CONTENT_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+# Number of rows fetched from the DB cursor, and written to the response at once
+SCORE_EXPORT_CHUNK_SIZE = 1000
+
+# The stdlib encoder is implemented in C when created with the default options
+score_export_json_encoder = json.JSONEncoder(separators=(",", ":"))
+
+
+def get_score_export_values(row: dict) -> list:
+    score = row["score"]
+    last_score_timestamp = row["last_score_timestamp"]
+    return [
+        row["passport__address"],
+        format(score, "f") if score is not None else None,
+        row["status"],
+        last_score_timestamp.isoformat() if last_score_timestamp else None,
+        row["evidence"],
+        row["error"],
+        row["stamp_scores"],
+    ]
+
+
+def encode_score_export_ndjson(rows: List[dict]) -> str:
+    return "".join(
+        score_export_json_encoder.encode(
+            dict(zip(SCORE_EXPORT_COLUMNS, get_score_export_values(row)))
+        )
+        + "\n"
+        for row in rows
+    )
+
+
+def encode_score_export_csv(rows: List[dict]) -> str:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        # Nested objects are written as JSON in the CSV cells
+        writer.writerow(
+            score_export_json_encoder.encode(value)
+            if isinstance(value, (dict, list))
+            else value
+            for value in get_score_export_values(row)
+        )
+    return buffer.getvalue()
+
+
+async def aiter_score_export(query, export_format: str) -> AsyncIterator[str]:
+    """
+    Streams the rows from a server side cursor, so memory usage does not depend on the number of scores
+    """
+    encode = (
+        encode_score_export_csv
+        if export_format == "csv"
+        else encode_score_export_ndjson
+    )
+
+    if export_format == "csv":
+        yield ",".join(SCORE_EXPORT_COLUMNS) + "\r\n"
+
+    rows = []
+    # values() and not values_list(), as only the former can be iterated asynchronously in Django 4.2
+    async for row in query.values(*SCORE_EXPORT_FIELDS).aiterator(
+        chunk_size=SCORE_EXPORT_CHUNK_SIZE
+    ):
+        rows.append(row)
+        if len(rows) >= SCORE_EXPORT_CHUNK_SIZE:
+            yield encode(rows)
+            rows = []
+
+    if rows:
+        yield encode(rows)
+
+
+@router.get(
+    "/score/{int:scorer_id}/export",
+    auth=ApiKey(),
+    response={
+        401: ErrorMessageResponse,
+        400: ErrorMessageResponse,
+        404: ErrorMessageResponse,
+    },
+    summary="Export the scores for all addresses that are associated with a scorer",
+    description="""Use this endpoint to download the scores for all addresses that are associated with a scorer,
+in a single streamed response.\n
+The `format` can be `ndjson` (1 JSON object per line, the default) or `csv`.\n
+For incremental syncs, pass the greatest `last_score_timestamp` of the previous export as `last_score_timestamp__gt`.\n
+\n
+
+Note: results will be sorted ascending by `["last_score_timestamp", "id"]`
+""",
+)
+def export_scores(
+    request,
+    scorer_id: int,
+    format: str = "ndjson",
+    last_score_timestamp__gt: str = "",
+):
+    check_rate_limit(request)
+
+    if format not in SCORE_EXPORT_CONTENT_TYPES:
+        raise InvalidExportFormatException()
+
+    user_community = api_get_object_or_404(
+        Community, id=scorer_id, account=request.auth
+    )
+
+    query = with_read_db(Score).filter(passport__community__id=user_community.id)
+    if last_score_timestamp__gt:
+        query = query.filter(last_score_timestamp__gt=last_score_timestamp__gt)
+
+    return StreamingHttpResponse(
+        aiter_score_export(query.order_by("last_score_timestamp", "id"), format),
+        content_type=SCORE_EXPORT_CONTENT_TYPES[format],
+    )
+
+
+@router.post(
+    "/score/{int:scorer_id}/lookup",
+    auth=ApiKey(),
+    response={
+        200: List[ScoreLookupResponse],
+        401: ErrorMessageResponse,
+        400: ErrorMessageResponse,
+        404: ErrorMessageResponse,
+    },
+    summary="Get the scores for a list of addresses that are associated with a scorer",
+    description=f"""Use this endpoint to fetch the scores of up to {settings.SCORE_LOOKUP_MAX_ADDRESSES} addresses at once.\n
+The results are returned in the order of the requested `addresses`. Addresses without a score have `found` set to `false` and no `score`.\n
+Each address in the batch counts as a request against the rate limit of the API key.\n
+{v1.SCORE_TIMESTAMP_FIELD_DESCRIPTION}
+""",
+)
+def lookup_scores(
+    request, scorer_id: int, payload: ScoreLookupPayload
+) -> List[ScoreLookupResponse]:
+    addresses = [address.lower() for address in payload.addresses]
+
+    if not addresses or len(addresses) > settings.SCORE_LOOKUP_MAX_ADDRESSES:
+        raise InvalidLimitException(
+            f"Between 1 and {settings.SCORE_LOOKUP_MAX_ADDRESSES} addresses can be looked up at once."
+        )
+
+    check_rate_limit(request, cost=len(addresses))
+
+    if not request.api_key.read_scores:
+        raise InvalidAPIKeyPermissions()
+
+    if not all(v1.is_valid_address(address) for address in addresses):
+        raise InvalidAddressException()
+
+    user_community = v1.get_scorer_by_id(scorer_id, request.auth)
+
+    scores = {
+        score.passport.address: score
+        for score in Score.objects.filter(
+            passport__address__in=set(addresses),
+            passport__community=user_community,
+        ).select_related("passport")
+    }
+
+    return [
+        ScoreLookupResponse(
+            address=address,
+            found=True,
+            score=DetailedScoreResponse.from_orm(scores[address]),
+        )
+        if address in scores
+        else ScoreLookupResponse(address=address, found=False, score=None)
+        for address in addresses
+    ]
+
+
 @router.get(
     "/score/{int:scorer_id}/{str:address}",
     auth=ApiKey(),
@@ -310,5 +447,7 @@ This endpoint will return a `DetailedScoreResponse`. This endpoint will also ret
 {v1.SCORE_TIMESTAMP_FIELD_DESCRIPTION}
 """,
 )
-def get_score(request, address: str, scorer_id: int) -> DetailedScoreResponse:
-    return v1.get_score(request, address, scorer_id)
+def get_score(
+    request, address: str, scorer_id: int, response: HttpResponse
+) -> DetailedScoreResponse:
+    return v1.get_score(request, address, scorer_id, response)
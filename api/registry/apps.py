@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class RegistryConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "registry"
+
+    def ready(self):
+        # Connect the signal receivers that invalidate the score response cache
+        import registry.score_cache  # noqa: F401
@@ -7,11 +7,12 @@ from account.deduplication.fifo import afifo
 from account.deduplication.lifo import alifo
 
 # --- Deduplication Modules
-from account.models import AccountAPIKeyAnalytics, Community, Rules
+from account.models import Community, Rules
+from django.conf import settings
 from ninja_extra.exceptions import APIException
 from reader.passport_reader import aget_passport, get_did
 from registry.exceptions import NoPassportException
-from registry.models import Passport, Score, Stamp
+from registry.models import Passport, Score, Stamp, StoredCredential
 from registry.utils import get_utc_time, validate_credential, verify_issuer
 
 log = logging.getLogger(__name__)
@@ -19,18 +20,6 @@ log = logging.getLogger(__name__)
 Hash = str
 
 
-async def asave_api_key_analytics(api_key_id, path):
-    try:
-        await AccountAPIKeyAnalytics.objects.acreate(
-            api_key_id=api_key_id,
-            path=path,
-        )
-    except Exception as e:
-        pass
-
-    return None
-
-
 async def aremove_stale_stamps_from_db(passport: Passport, passport_data: dict):
     current_hashes = [
         stamp["credential"]["credentialSubject"]["hash"]
@@ -170,13 +159,25 @@ async def asave_stamps(passport: Passport, deduped_passport_data) -> None:
         "saving stamps deduped_passport_data: %s", deduped_passport_data["stamps"]
     )
 
+    stored = {}
+    if settings.FF_CREDENTIAL_STORE == "on":
+        stored = await StoredCredential.objects.astore(
+            stamp["credential"] for stamp in deduped_passport_data["stamps"]
+        )
+
     for stamp in deduped_passport_data["stamps"]:
+        credential_ref = (
+            stored[StoredCredential.hash_credential(stamp["credential"])]
+            if stored
+            else None
+        )
         await Stamp.objects.aupdate_or_create(
             hash=stamp["credential"]["credentialSubject"]["hash"],
             passport=passport,
             defaults={
                 "provider": stamp["provider"],
-                "credential": stamp["credential"],
+                "credential": {} if credential_ref else stamp["credential"],
+                "credential_ref": credential_ref,
             },
         )
 
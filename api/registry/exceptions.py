@@ -53,6 +53,11 @@ class InvalidLimitException(APIException):
     default_detail = "Invalid limit."
 
 
+class InvalidCursorException(APIException):
+    status_code = status.HTTP_400_BAD_REQUEST
+    default_detail = "Invalid pagination token."
+
+
 class NoRequiredPermissionsException(APIException):
     status_code = status.HTTP_403_FORBIDDEN
     default_detail = "You are not allowed to access this endpoint."
@@ -78,6 +83,11 @@ class InvalidOrderByFieldException(APIException):
     default_detail = "Invalid order_by_field value"
 
 
+class InvalidExportFormatException(APIException):
+    status_code = status.HTTP_400_BAD_REQUEST
+    default_detail = "Invalid export format, expected one of: ndjson, csv"
+
+
 class StakingRequestError(APIException):
     status_code = status.HTTP_400_BAD_REQUEST
     default_detail = "Error pulling GTC staking data"
@@ -2,9 +2,22 @@ from tqdm import tqdm
 from datetime import datetime, timezone
 
 from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
 from registry.models import Stamp, HashScorerLink
 
 
+def is_valid_at(credential: dict, timestamp: datetime) -> bool:
+    expiration_date = parse_datetime(credential.get("expirationDate") or "")
+    issuance_date = parse_datetime(credential.get("issuanceDate") or "")
+    return (
+        expiration_date is not None
+        and issuance_date is not None
+        and expiration_date > timestamp
+        and issuance_date < timestamp
+    )
+
+
 class Command(BaseCommand):
     help = "Backfill stamps into hash link table"
 
@@ -25,11 +38,19 @@ class Command(BaseCommand):
         self.stdout.write(self.style.SUCCESS(f'Starting ID "{last_id}"'))
         self.stdout.write(self.style.SUCCESS(f'ISO Timestamp "{iso_timestamp}"'))
 
+        timestamp = parse_datetime(iso_timestamp)
+
+        # The dates of the credentials in the credential store (which can be compressed) are
+        # checked after loading them
         query = (
             Stamp.objects.filter(
-                credential__expirationDate__gt=iso_timestamp,
-                credential__issuanceDate__lt=iso_timestamp,
+                Q(
+                    credential__expirationDate__gt=iso_timestamp,
+                    credential__issuanceDate__lt=iso_timestamp,
+                )
+                | Q(credential_ref__isnull=False)
             )
+            .with_credentials()
             .select_related("passport")
             .order_by("id")
         )
@@ -50,14 +71,18 @@ class Command(BaseCommand):
                     )
                     if objects:
                         last_id = objects[-1].id
+                        credentials = [
+                            (stamp, stamp.get_credential()) for stamp in objects
+                        ]
                         hash_links = [
                             HashScorerLink(
                                 hash=stamp.hash,
                                 address=stamp.passport.address,
-                                community=stamp.passport.community,
-                                expires_at=stamp.credential["expirationDate"],
+                                community_id=stamp.passport.community_id,
+                                expires_at=credential["expirationDate"],
                             )
-                            for stamp in objects
+                            for stamp, credential in credentials
+                            if is_valid_at(credential, timestamp)
                         ]
                         HashScorerLink.objects.using("default").bulk_create(
                             hash_links, ignore_conflicts=True
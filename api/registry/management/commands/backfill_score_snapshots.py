@@ -0,0 +1,84 @@
+from account.models import Community
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from registry.models import Event, ScoreSnapshot
+from tqdm import tqdm
+
+
+class Command(BaseCommand):
+    help = """
+Build the ScoreSnapshot intervals from the SCORE_UPDATE events.
+Each community is rebuilt in its own transaction: the existing snapshots of the community are replaced.
+"""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--community-id",
+            type=int,
+            action="append",
+            help="Only rebuild the snapshots for this community (can be repeated), defaults to all communities",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of snapshots inserted at once",
+        )
+
+    def handle(self, *args, **options):
+        community_ids = options["community_id"] or list(
+            Community.objects.order_by("id").values_list("id", flat=True)
+        )
+        batch_size = options["batch_size"]
+
+        for community_id in community_ids:
+            with transaction.atomic():
+                num_snapshots = self.rebuild_community(community_id, batch_size)
+
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f'Community "{community_id}": {num_snapshots} snapshots'
+                )
+            )
+
+    def rebuild_community(self, community_id: int, batch_size: int) -> int:
+        ScoreSnapshot.objects.filter(community_id=community_id).delete()
+
+        events = (
+            Event.objects.filter(
+                community_id=community_id, action=Event.Action.SCORE_UPDATE
+            )
+            .order_by("address", "created_at", "id")
+            .iterator(chunk_size=batch_size)
+        )
+
+        num_snapshots = 0
+        batch = []
+        previous = None
+
+        with tqdm(unit="items", desc=f"Community {community_id}") as progress_bar:
+            for event in events:
+                snapshot = ScoreSnapshot.from_event(event)
+
+                # The interval of the previous event is complete once we have seen the next event
+                if previous:
+                    if previous.address == snapshot.address:
+                        previous.valid_to = snapshot.valid_from
+                    batch.append(previous)
+
+                    if len(batch) >= batch_size:
+                        ScoreSnapshot.objects.bulk_create(batch)
+                        num_snapshots += len(batch)
+                        progress_bar.update(len(batch))
+                        batch = []
+
+                previous = snapshot
+
+            if previous:
+                batch.append(previous)
+
+            ScoreSnapshot.objects.bulk_create(batch)
+            num_snapshots += len(batch)
+            progress_bar.update(len(batch))
+
+        return num_snapshots
@@ -0,0 +1,104 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from registry.models import Passport, Score
+from registry.score_writer import SCORE_COLUMNS, write_scores
+from registry.utils import get_utc_time
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark of the bulk score writer against bulk_create / bulk_update. "
+        "The scores of existing passports are written in a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--community-id",
+            type=int,
+            required=True,
+            help="Community whose passports are used for the benchmark",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            action="append",
+            help="Batch size to benchmark, can be repeated (default: 100, 1000 and 5000)",
+        )
+        parser.add_argument(
+            "--batches",
+            type=int,
+            default=5,
+            help="Number of batches written for each batch size",
+        )
+
+    def report(self, name: str, batch_size: int, seconds: float, rows: int):
+        self.stdout.write(
+            f"{name:<30} batch size {batch_size:>6}: {rows / seconds:>10.1f} rows/s ({rows} rows in {seconds:.2f}s)"
+        )
+
+    def handle(self, *args, **options):
+        batch_sizes = options["batch_size"] or [100, 1000, 5000]
+        batches = options["batches"]
+
+        for batch_size in batch_sizes:
+            passports = list(
+                Passport.objects.filter(community_id=options["community_id"])
+                .order_by("id")
+                .prefetch_related("score")[: batch_size * batches]
+            )
+            if not passports:
+                raise CommandError("The community has no passports")
+
+            chunks = [
+                passports[i : i + batch_size]
+                for i in range(0, len(passports), batch_size)
+            ]
+
+            for name, write in [
+                ("bulk_create / bulk_update", self.write_with_bulk_update),
+                (
+                    "write_scores (COPY upsert)",
+                    lambda scores: write_scores(scores, emit_events=False),
+                ),
+                ("write_scores + events", write_scores),
+            ]:
+                seconds = self.run(chunks, write)
+                self.report(name, batch_size, seconds, len(passports))
+
+    def run(self, chunks, write) -> float:
+        elapsed = 0.0
+        try:
+            with transaction.atomic():
+                for chunk in chunks:
+                    scores = self.make_scores(chunk)
+                    start = time.perf_counter()
+                    write(scores)
+                    elapsed += time.perf_counter() - start
+                raise Rollback()
+        except Rollback:
+            pass
+        return elapsed
+
+    @staticmethod
+    def make_scores(passports):
+        scores = []
+        for passport in passports:
+            existing = list(passport.score.all())
+            score = existing[0] if existing else Score(passport=passport)
+            score.score = (score.score or 0) + 1
+            score.status = Score.Status.DONE
+            score.last_score_timestamp = get_utc_time()
+            score.error = None
+            scores.append(score)
+        return scores
+
+    @staticmethod
+    def write_with_bulk_update(scores):
+        Score.objects.bulk_create([s for s in scores if s.pk is None])
+        Score.objects.bulk_update([s for s in scores if s.pk], SCORE_COLUMNS[1:])
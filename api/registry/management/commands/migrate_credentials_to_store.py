@@ -0,0 +1,118 @@
+from datetime import timedelta
+
+from ceramic_cache.models import CeramicCache
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from registry.models import Stamp, StoredCredential
+from tqdm import tqdm
+
+# model, inline credential field, reference to the credential store
+TABLES = {
+    "ceramic_cache": (CeramicCache, "stamp", "stamp_ref"),
+    "stamp": (Stamp, "credential", "credential_ref"),
+}
+
+
+class Command(BaseCommand):
+    help = """
+Move the inline credentials of CeramicCache and Stamp rows into the content addressed credential store (StoredCredential).
+Rows are processed in batches, in order of their ID, and the inline JSON is cleared once the reference is set.
+Optionally, store entries older than a given number of days are compressed.
+"""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--table",
+            choices=list(TABLES.keys()) + ["all"],
+            default="all",
+            help="The table to migrate (defaults to all)",
+        )
+        parser.add_argument(
+            "--last-id",
+            type=int,
+            default=0,
+            help="Only rows with an ID greater than this are migrated, defaults to 0",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of rows processed per batch (and transaction)",
+        )
+        parser.add_argument(
+            "--compress-older-than-days",
+            type=int,
+            default=None,
+            help="Compress the store entries created more than this number of days ago",
+        )
+
+    def handle(self, *args, **options):
+        tables = TABLES.keys() if options["table"] == "all" else [options["table"]]
+        for table in tables:
+            self.migrate_table(
+                table, *TABLES[table], options["last_id"], options["batch_size"]
+            )
+
+        if options["compress_older_than_days"] is not None:
+            self.compress(
+                timezone.now() - timedelta(days=options["compress_older_than_days"]),
+                options["batch_size"],
+            )
+
+    def migrate_table(self, table, model, field, ref_field, last_id, batch_size):
+        query = (
+            model.objects.filter(**{f"{ref_field}__isnull": True})
+            .only("id", field)
+            .order_by("id")
+        )
+
+        with tqdm(unit="items", desc=f"Migrating {table}") as progress_bar:
+            while True:
+                with transaction.atomic():
+                    # Locking the batch makes sure that we do not overwrite concurrent updates
+                    objects = list(
+                        query.filter(id__gt=last_id).select_for_update()[:batch_size]
+                    )
+                    if not objects:
+                        break
+
+                    last_id = objects[-1].id
+                    objects = [o for o in objects if getattr(o, field)]
+                    stored = StoredCredential.objects.store(
+                        getattr(o, field) for o in objects
+                    )
+                    for o in objects:
+                        setattr(
+                            o,
+                            ref_field,
+                            stored[StoredCredential.hash_credential(getattr(o, field))],
+                        )
+                        setattr(o, field, {})
+
+                    model.objects.bulk_update(objects, [field, ref_field])
+
+                progress_bar.update(len(objects))
+
+        self.stdout.write(self.style.SUCCESS(f'{table}: last ID "{last_id}"'))
+
+    def compress(self, created_before, batch_size):
+        query = StoredCredential.objects.filter(
+            created_at__lt=created_before, credential__isnull=False
+        ).order_by("content_hash")
+        last_hash = ""
+
+        with tqdm(unit="items", desc="Compressing credentials") as progress_bar:
+            while True:
+                objects = list(query.filter(content_hash__gt=last_hash)[:batch_size])
+                if not objects:
+                    break
+
+                last_hash = objects[-1].content_hash
+                for o in objects:
+                    o.compress()
+
+                StoredCredential.objects.bulk_update(
+                    objects, ["credential", "compressed_credential"]
+                )
+                progress_bar.update(len(objects))
@@ -1,12 +1,25 @@
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+
 from account.deduplication import Rules
 from account.models import Community
 from django.conf import settings
 from django.core.management.base import BaseCommand
 from django.db.models import QuerySet
-from registry.models import Score
-from registry.tasks import score_registry_passport
+from registry.models import Passport, Score
+from registry.rescoring import (
+    get_changed_providers,
+    get_checkpoints,
+    get_chunk_ranges,
+    get_weights_version,
+    run_checkpoint,
+    with_providers,
+)
+from registry.tasks import rescore_passport_range, score_registry_passport
 from scorer_weighted.models import BinaryWeightedScorer, WeightedScorer
 
+CHECKPOINT_JOB = "propagate_weights_and_rescore"
+
 
 class Command(BaseCommand):
     help = "Copy latest stamp weights to eligible scorers and launch rescore"
@@ -18,6 +31,33 @@ class Command(BaseCommand):
             action="store_true",
             help="Flag to update all scores.",
         )
+        parser.add_argument(
+            "--resume",
+            action="store_true",
+            help="Resume the previous run from its checkpoints (see the `rescore_status` command).",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of passports flagged and enqueued per checkpoint.",
+        )
+        parser.add_argument(
+            "--changed-providers-only",
+            action="store_true",
+            help="Only rescore the passports holding a stamp of a provider whose weight is changed by the update (all passports if the threshold changes).",
+        )
+        parser.add_argument(
+            "--chunked",
+            action="store_true",
+            help="Rescore from the stored stamps in chunk tasks covering ranges of passport IDs, instead of 1 task per passport. Credentials are not verified again.",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=10000,
+            help="Number of passports per chunk task (with --chunked).",
+        )
 
     def handle(self, *args, **kwargs):
         update_all_scores = kwargs.get("update_all_scores", True)
@@ -26,10 +66,37 @@ class Command(BaseCommand):
 
         community_ids = self.get_eligible_communities()
 
+        # Diff the weights before they are updated, to only rescore the passports holding a stamp
+        # of a provider whose weight changes
+        changed_providers = (
+            {
+                community.id: get_changed_providers(
+                    community.get_scorer(), weights, threshold
+                )
+                # Not cached in the queryset, these scorers still have the previous weights
+                for community in community_ids.all()
+            }
+            if kwargs.get("changed_providers_only", False)
+            else {}
+        )
+
         self.update_scorers(community_ids, weights, threshold)
 
-        if update_all_scores:
-            self.update_scores(community_ids)
+        if update_all_scores and kwargs.get("chunked", False):
+            self.update_scores_in_chunks(
+                community_ids, kwargs.get("chunk_size", 10000), changed_providers
+            )
+        elif update_all_scores:
+            weights_version = get_weights_version(
+                SimpleNamespace(weights=weights, threshold=threshold)
+            )
+            self.update_scores(
+                community_ids,
+                weights_version,
+                kwargs.get("resume", False),
+                kwargs.get("batch_size", 1000),
+                changed_providers,
+            )
 
     @staticmethod
     def get_eligible_communities() -> QuerySet[Community]:
@@ -49,18 +116,83 @@ class Command(BaseCommand):
             weighted_scorers.count() + binary_weighted_scorers.count(),
         )
 
-    def update_scores(self, communities: QuerySet[Community]):
-        scores = Score.objects.filter(
-            passport__community__in=communities
-        ).select_related("passport")
-
-        scores.update(status=Score.Status.BULK_PROCESSING)
+    def update_scores(
+        self,
+        communities: QuerySet[Community],
+        weights_version: str,
+        resume: bool,
+        batch_size: int,
+        changed_providers: Dict[int, Optional[List[str]]],
+    ):
+        count = 0
+        for community in communities:
+            checkpoints = get_checkpoints(
+                CHECKPOINT_JOB,
+                community.id,
+                weights_version,
+                [(0, None)],
+                resume,
+                changed_providers.get(community.id),
+            )
+            for checkpoint in checkpoints:
+                count += run_checkpoint(checkpoint, batch_size, self.enqueue_rescore)
+
+        print("Updating scores:", count)
 
-        for score in scores:
-            passport = score.passport
-            passport.requires_calculation = True
-            passport.save()
-
-            score_registry_passport.delay(passport.community.pk, passport.address)
-
-        print("Updating scores:", scores.count())
+    @staticmethod
+    def enqueue_rescore(passports: List[Passport]):
+        """
+        Flag the passports that have a score and enqueue their rescoring. The passports of the batch
+        can be enqueued again when the run is resumed, rescoring is idempotent.
+        """
+        scored_ids = list(
+            Score.objects.filter(passport_id__in=[p.id for p in passports]).values_list(
+                "passport_id", flat=True
+            )
+        )
+        Score.objects.filter(passport_id__in=scored_ids).update(
+            status=Score.Status.BULK_PROCESSING
+        )
+        Passport.objects.filter(id__in=scored_ids).update(requires_calculation=True)
+
+        scored_ids = set(scored_ids)
+        for passport in passports:
+            if passport.id in scored_ids:
+                score_registry_passport.delay(passport.community_id, passport.address)
+
+    def update_scores_in_chunks(
+        self,
+        communities: QuerySet[Community],
+        chunk_size: int,
+        changed_providers: Dict[int, Optional[List[str]]],
+    ):
+        """
+        Flag the scored passports with set-based UPDATEs, and dispatch 1 task per chunk of flagged
+        passports. The chunk tasks only rescore passports that are still flagged, so running this
+        again after an interruption does not rescore the same passports twice.
+        """
+        count = 0
+        for community in communities:
+            passports = Passport.objects.filter(
+                community=community, score__isnull=False
+            )
+            providers = changed_providers.get(community.id)
+            if providers is not None:
+                passports = with_providers(passports, providers)
+
+            Score.objects.filter(passport__in=passports).update(
+                status=Score.Status.BULK_PROCESSING
+            )
+            count += passports.update(requires_calculation=True)
+
+        chunks = 0
+        for community in communities:
+            flagged = Passport.objects.filter(
+                community=community, requires_calculation=True
+            )
+            for start_id, end_id in get_chunk_ranges(flagged, chunk_size):
+                rescore_passport_range.delay(community.pk, start_id, end_id)
+                chunks += 1
+
+        print("Updating scores:", count)
+        print("Dispatched chunks:", chunks)
@@ -1,24 +1,33 @@
 import json
+import time
+from concurrent.futures import as_completed
 from datetime import datetime
-from decimal import Decimal
-from typing import Dict, List
+from typing import List
 
-from account.deduplication import Rules
 from account.models import Community
-from asgiref.sync import async_to_sync
 from django.conf import settings
 from django.core.management.base import BaseCommand
 from django.db.models import QuerySet
-from registry.atasks import acalculate_score
-from registry.models import Passport, Score, Stamp
-from registry.tasks import score_registry_passport
-from registry.utils import get_utc_time
+from registry.models import RescoreCheckpoint
+from registry.rescoring import (
+    get_changed_providers,
+    get_checkpoints,
+    get_shards,
+    get_weights_version,
+    rescore_checkpoint,
+    rescore_shard,
+)
+from scorer.utils import create_process_executor
 from scorer_weighted.models import BinaryWeightedScorer, WeightedScorer
 
+CHECKPOINT_JOB = "recalculate_scores"
+
 
 class Command(BaseCommand):
     help = "Copy latest stamp weights to eligible scorers and launch rescore"
 
+    shards_per_worker = 4
+
     def add_arguments(self, parser):
         # Optional argument
         parser.add_argument(
@@ -39,6 +48,23 @@ class Command(BaseCommand):
             default=1000,
             help="""Batch size for recoring""",
         )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="""Number of worker processes. With more than 1 worker, the passports of each community are split into shards that are rescored in parallel""",
+        )
+        parser.add_argument(
+            "--resume",
+            action="store_true",
+            help="""Resume the previous run from its checkpoints (see the `rescore_status` command), communities that were rescored with other weights are rescored from the start. The shards of the previous run are kept, whatever the number of workers""",
+        )
+
+        parser.add_argument(
+            "--changed-providers-only",
+            action="store_true",
+            help="""Only rescore the passports holding a stamp of a provider whose weight is changed by the update (all passports if the threshold changes)""",
+        )
 
     def handle(self, *args, **kwargs):
         self.stdout.write("Running ...")
@@ -56,99 +82,123 @@ class Command(BaseCommand):
         )
 
         batch_size = kwargs["batch_size"]
+        workers = kwargs["workers"]
+        resume = kwargs["resume"]
         count = 0
         start = datetime.now()
         communities = Community.objects.filter(**filter).exclude(**exclude)
 
+        # Diff the weights before they are updated, to only rescore the passports holding a stamp
+        # of a provider whose weight changes
+        changed_providers = (
+            {
+                community.id: get_changed_providers(
+                    community.get_scorer(),
+                    settings.GITCOIN_PASSPORT_WEIGHTS,
+                    settings.GITCOIN_PASSPORT_THRESHOLD,
+                )
+                # Not cached in the queryset, these scorers still have the previous weights
+                for community in communities.all()
+            }
+            if kwargs["changed_providers_only"]
+            else {}
+        )
+
         # Update Score weights
         self.update_scorers(communities)
 
         self.stdout.write(f"Recalculating scores for communities: {list(communities)}")
         for community in communities:
-            # Reset has_more and last_id for each community
-            has_more = True
-            last_id = 0
             scorer = community.get_scorer()
             self.stdout.write(
                 f"""
 Community:{community}
 scorer type: {scorer.type}, {type(scorer)}"""
             )
-            while has_more:
-                self.stdout.write(
-                    f"has more: {has_more} / last id: {last_id} / count: {count}"
+            weights_version = get_weights_version(scorer)
+            shards = (
+                # More shards than workers, so that a slow shard does not hold up the whole run
+                get_shards(community.id, workers * self.shards_per_worker)
+                if workers > 1
+                else [(0, None)]
+            )
+            providers = changed_providers.get(community.id)
+            if providers is not None:
+                self.stdout.write(f"Changed providers: {providers}")
+            checkpoints = get_checkpoints(
+                CHECKPOINT_JOB, community.id, weights_version, shards, resume, providers
+            )
+            if all(c.finished for c in checkpoints):
+                self.stdout.write(f"Nothing to rescore for community {community}")
+                continue
+
+            if workers > 1:
+                count += self.rescore_in_parallel(
+                    community, checkpoints, workers, batch_size
                 )
-                passport_query = Passport.objects.order_by("id").select_related("score")
-                if last_id:
-                    passport_query = passport_query.filter(id__gt=last_id)
-                passport_query = passport_query.filter(community=community)
-                passports = list(passport_query[:batch_size].iterator())
-                passport_ids = [p.id for p in passports]
-                count += len(passports)
-                has_more = len(passports) > 0
-                if len(passports) > 0:
-                    last_id = passport_ids[-1]
-                    stamp_query = Stamp.objects.filter(passport_id__in=passport_ids)
-                    stamps = {}
-                    for s in stamp_query:
-                        if s.passport_id not in stamps:
-                            stamps[s.passport_id] = []
-                        stamps[s.passport_id].append(s)
-                    calculated_scores = scorer.recompute_score(passport_ids, stamps)
-                    scores_to_update = []
-                    scores_to_create = []
-
-                    for p, scoreData in zip(passports, calculated_scores):
-                        passport_scores = list(p.score.all())
-                        if passport_scores:
-                            score = passport_scores[0]
-                            scores_to_update.append(score)
-                        else:
-                            score = Score(
-                                passport=p,
-                            )
-                            scores_to_create.append(score)
-
-                        score.score = scoreData.score
-                        score.status = Score.Status.DONE
-                        score.last_score_timestamp = get_utc_time()
-                        score.evidence = (
-                            scoreData.evidence[0].as_dict()
-                            if scoreData.evidence
-                            else None
-                        )
-                        score.error = None
-                        score.stamp_scores = scoreData.stamp_scores
-
-                    if scores_to_create:
-                        Score.objects.bulk_create(scores_to_create)
-
-                    if scores_to_update:
-                        Score.objects.bulk_update(
-                            scores_to_update,
-                            [
-                                "score",
-                                "status",
-                                "last_score_timestamp",
-                                "evidence",
-                                "error",
-                                "stamp_scores",
-                            ],
-                        )
-
-                elapsed = datetime.now() - start
-                rate = "-"
-                if count > 0:
-                    rate = elapsed / count
+                continue
+
+            for checkpoint in checkpoints:
                 self.stdout.write(
-                    f"""
+                    f"Starting after passport id: {checkpoint.last_passport_id} ({checkpoint.processed}/{checkpoint.total} done)"
+                )
+
+                def on_batch(passports):
+                    nonlocal count
+                    count += len(passports)
+                    self.stdout.write(f"last id: {passports[-1].id} / count: {count}")
+
+                    elapsed = datetime.now() - start
+                    rate = "-"
+                    if count > 0:
+                        rate = elapsed / count
+                    self.stdout.write(
+                        f"""
 Community id: {community}
 Elapsed: {elapsed}
 Count: {count}
 Rate: {rate}
 """
+                    )
+
+                rescore_checkpoint(checkpoint, batch_size, on_batch)
+
+    def rescore_in_parallel(
+        self,
+        community: Community,
+        checkpoints: List[RescoreCheckpoint],
+        workers: int,
+        batch_size: int,
+    ) -> int:
+        """
+        Rescore the shards of the community (1 checkpoint per shard), in a pool of `workers` processes
+        """
+        checkpoints = [c for c in checkpoints if not c.finished]
+        self.stdout.write(f"Rescoring {len(checkpoints)} shards with {workers} workers")
+
+        start = time.monotonic()
+        count = 0
+        with create_process_executor(workers) as executor:
+            futures = [
+                executor.submit(rescore_shard, index, checkpoint.id, batch_size)
+                for index, checkpoint in enumerate(checkpoints)
+            ]
+            for done, future in enumerate(as_completed(futures), start=1):
+                result = future.result()
+                count += result.count
+                elapsed = time.monotonic() - start
+                self.stdout.write(
+                    f"Shard {result.index} [{result.start_id} - {result.end_id}]: "
+                    f"{result.count} passports in {result.elapsed:.1f}s "
+                    f"({done}/{len(checkpoints)} shards done, {count} passports, "
+                    f"{count / elapsed if elapsed else 0:.1f} passports/s)"
                 )
 
+        self.stdout.write(
+            f"Community {community}: rescored {count} passports in {time.monotonic() - start:.1f}s"
+        )
+        return count
+
     def update_scorers(self, communities: QuerySet[Community]):
         weights = settings.GITCOIN_PASSPORT_WEIGHTS
         threshold = settings.GITCOIN_PASSPORT_THRESHOLD
@@ -0,0 +1,61 @@
+from datetime import timedelta
+from itertools import groupby
+
+from django.core.management.base import BaseCommand
+from registry.models import RescoreCheckpoint
+
+
+class Command(BaseCommand):
+    help = "Show the progress of the bulk rescores (recalculate_scores, propagate_weights_and_rescore)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--job",
+            type=str,
+            default=None,
+            help="Only show the checkpoints of this job",
+        )
+
+    def handle(self, *args, **kwargs):
+        checkpoints = RescoreCheckpoint.objects.order_by(
+            "job", "community_id", "start_id"
+        )
+        if kwargs["job"]:
+            checkpoints = checkpoints.filter(job=kwargs["job"])
+
+        for (job, community_id), shards in groupby(
+            checkpoints, key=lambda c: (c.job, c.community_id)
+        ):
+            shards = list(shards)
+            self.stdout.write(self.format_progress(job, community_id, shards))
+
+    @staticmethod
+    def format_progress(job, community_id, shards) -> str:
+        processed = sum(c.processed for c in shards)
+        total = sum(c.total for c in shards)
+        finished = sum(1 for c in shards if c.finished)
+        started_at = min(c.created_at for c in shards)
+        updated_at = max(c.updated_at for c in shards)
+
+        if finished == len(shards):
+            status = "finished"
+            eta = "-"
+        else:
+            elapsed = (updated_at - started_at).total_seconds()
+            rate = processed / elapsed if elapsed > 0 else 0
+            status = "in progress"
+            # `total` is counted when the run starts, passports created since are not included
+            eta = (
+                str(timedelta(seconds=int(max(total - processed, 0) / rate)))
+                if rate
+                else "-"
+            )
+
+        percent = 100 * processed / total if total else 100
+        return (
+            f"{job} / community {community_id}: {status}, "
+            f"{processed}/{total} passports ({percent:.1f}%), "
+            f"{finished}/{len(shards)} shards done, "
+            f"started at {started_at.isoformat()}, last update at {updated_at.isoformat()}, "
+            f"ETA: {eta}"
+        )
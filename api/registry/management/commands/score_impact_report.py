@@ -0,0 +1,140 @@
+import json
+
+import pyarrow.parquet as pq
+from account.models import Community
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from registry.score_impact import DIFF_SCHEMA, ScoreImpact, iter_score_chunks
+
+
+class Command(BaseCommand):
+    help = "Dry-run of a weights change: report how the scores would change, without writing any score"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--community-id",
+            type=int,
+            action="append",
+            help="Community to analyze, can be repeated. Defaults to all the communities with a weighted scorer.",
+        )
+        parser.add_argument(
+            "--weights",
+            type=str,
+            default=None,
+            help="Path of a JSON file with the new weights. Defaults to GITCOIN_PASSPORT_WEIGHTS.",
+        )
+        parser.add_argument(
+            "--threshold",
+            type=float,
+            default=None,
+            help="New threshold. Defaults to GITCOIN_PASSPORT_THRESHOLD.",
+        )
+        parser.add_argument(
+            "--database",
+            type=str,
+            default=settings.REGISTRY_API_READ_DB,
+            help="Database to read the stamps from, defaults to the read database of the registry API (REGISTRY_API_READ_DB).",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=50000,
+            help="Number of passports loaded in memory at once.",
+        )
+        parser.add_argument(
+            "--top",
+            type=int,
+            default=20,
+            help="Number of top movers to report.",
+        )
+        parser.add_argument(
+            "--output",
+            type=str,
+            default="score_impact.parquet",
+            help="Parquet file receiving the diff (all passports with a new score or passing state).",
+        )
+
+    def handle(self, *args, **options):
+        database = options["database"]
+
+        if options["weights"]:
+            with open(options["weights"]) as f:
+                new_weights = json.load(f)
+        else:
+            new_weights = settings.GITCOIN_PASSPORT_WEIGHTS
+
+        new_threshold = float(
+            options["threshold"]
+            if options["threshold"] is not None
+            else settings.GITCOIN_PASSPORT_THRESHOLD
+        )
+
+        communities = Community.objects.using(database).select_related("scorer")
+        if options["community_id"]:
+            communities = communities.filter(id__in=options["community_id"])
+            if len(communities) != len(set(options["community_id"])):
+                raise CommandError("Unknown community id")
+
+        impact = ScoreImpact(new_threshold, options["top"])
+        analyzed = 0
+        with pq.ParquetWriter(options["output"], DIFF_SCHEMA) as writer:
+            for community in communities:
+                scorer = community.get_scorer()
+                old_weights = getattr(scorer, "weights", None)
+                if old_weights is None:
+                    continue
+
+                # Weighted scorers (without threshold) are compared against the new threshold
+                old_threshold = float(getattr(scorer, "threshold", new_threshold))
+                analyzed += 1
+
+                self.stdout.write(f"Analyzing community {community.id}")
+                for chunk in iter_score_chunks(
+                    community.id,
+                    old_weights,
+                    new_weights,
+                    options["chunk_size"],
+                    database,
+                ):
+                    writer.write_batch(impact.add(community.id, chunk, old_threshold))
+                    self.stdout.write(f"  {impact.count} passports")
+
+        if not analyzed:
+            self.stdout.write("No community with a weighted scorer")
+            return
+
+        self.write_report(impact)
+        self.stdout.write(f"Diff written to {options['output']}")
+
+    def write_report(self, impact: ScoreImpact):
+        self.stdout.write(
+            f"""
+Passports: {impact.count}
+Changed: {impact.changed}
+Mean score: {impact.mean("old"):.4f} -> {impact.mean("new"):.4f} (mean delta: {impact.mean("delta"):+.4f})
+Now passing the threshold: {impact.now_passing}
+Now failing the threshold: {impact.now_failing}
+"""
+        )
+
+        self.stdout.write("Score distribution (bucket: old -> new):")
+        size = max(len(impact.old_histogram), len(impact.new_histogram))
+        for bucket in range(size):
+            old = (
+                impact.old_histogram[bucket]
+                if bucket < len(impact.old_histogram)
+                else 0
+            )
+            new = (
+                impact.new_histogram[bucket]
+                if bucket < len(impact.new_histogram)
+                else 0
+            )
+            if old or new:
+                self.stdout.write(f"  [{bucket}, {bucket + 1}): {old} -> {new}")
+
+        self.stdout.write("Top movers:")
+        for delta, community_id, passport_id, address, old, new in impact.top_movers:
+            self.stdout.write(
+                f"  community {community_id} / passport {passport_id} ({address}): {old:.4f} -> {new:.4f} ({delta:+.4f})"
+            )
@@ -0,0 +1,42 @@
+# Generated by Django 4.2.6 on 2026-10-19 08:32
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("registry", "0028_gtcstakeevent_gtc_staking_index_by_staker"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StoredCredential",
+            fields=[
+                (
+                    "content_hash",
+                    models.CharField(
+                        help_text="sha256 of the canonical JSON encoding of the credential",
+                        max_length=64,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                ("credential", models.JSONField(blank=True, null=True)),
+                ("compressed_credential", models.BinaryField(blank=True, null=True)),
+                ("created_at", models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name="stamp",
+            name="credential_ref",
+            field=models.ForeignKey(
+                blank=True,
+                db_index=False,
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="+",
+                to="registry.storedcredential",
+            ),
+        ),
+    ]
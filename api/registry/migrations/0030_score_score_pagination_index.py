@@ -0,0 +1,18 @@
+# Generated by Django 4.2.6 on 2026-10-19 08:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("registry", "0029_storedcredential_stamp_credential_ref"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="score",
+            index=models.Index(
+                fields=["last_score_timestamp", "id"], name="score_pagination_index"
+            ),
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 4.2.6 on 2026-10-19 08:50
+
+import account.models
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("account", "0016_accountapikey_create_scorers_and_more"),
+        ("registry", "0030_score_score_pagination_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ScoreSnapshot",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("address", account.models.EthAddressField(max_length=42)),
+                ("valid_from", models.DateTimeField()),
+                ("valid_to", models.DateTimeField(blank=True, null=True)),
+                ("score", models.DecimalField(decimal_places=9, max_digits=18)),
+                ("evidence", models.JSONField(blank=True, null=True)),
+                (
+                    "community",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="score_snapshots",
+                        to="account.community",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["community", "address", "valid_from"],
+                        name="score_snapshot_as_of_index",
+                    )
+                ],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="scoresnapshot",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("valid_to__isnull", True)),
+                fields=("community", "address"),
+                name="score_snapshot_current_unique",
+            ),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 4.2.6 on 2026-10-19 09:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("account", "0017_alter_accountapikeyanalytics_created_at"),
+        ("registry", "0031_scoresnapshot_and_more"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RescoreCheckpoint",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("job", models.CharField(max_length=100)),
+                ("start_id", models.BigIntegerField(default=0)),
+                ("end_id", models.BigIntegerField(blank=True, null=True)),
+                ("last_passport_id", models.BigIntegerField(blank=True, null=True)),
+                ("weights_version", models.CharField(max_length=64)),
+                ("processed", models.IntegerField(default=0)),
+                ("total", models.IntegerField(default=0)),
+                ("finished", models.BooleanField(default=False)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "community",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="rescore_checkpoints",
+                        to="account.community",
+                    ),
+                ),
+            ],
+            options={
+                "unique_together": {("job", "community", "start_id")},
+            },
+        ),
+    ]
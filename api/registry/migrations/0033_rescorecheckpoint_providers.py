@@ -0,0 +1,17 @@
+# Generated by Django 4.2.6 on 2026-10-19 10:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("registry", "0032_rescorecheckpoint"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="rescorecheckpoint",
+            name="providers",
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
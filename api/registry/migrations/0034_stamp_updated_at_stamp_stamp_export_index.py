@@ -0,0 +1,21 @@
+# Generated by Django 4.2.6 on 2026-10-19 11:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("registry", "0033_rescorecheckpoint_providers"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="stamp",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name="stamp",
+            index=models.Index(fields=["updated_at", "id"], name="stamp_export_index"),
+        ),
+    ]
@@ -1,7 +1,11 @@
 import json
+from hashlib import sha256
+from typing import Dict, Iterable
 
+import zstandard
 from account.models import Community, EthAddressField
-from django.db import models
+from django.conf import settings
+from django.db import IntegrityError, models, transaction
 from django.db.models.signals import pre_save
 from django.dispatch import receiver
 
@@ -23,6 +27,100 @@ class Passport(models.Model):
         return f"Passport #{self.id}, address={self.address}, community_id={self.community_id}"
 
 
+class StoredCredentialManager(models.Manager):
+    def build(self, credentials: Iterable[dict]) -> Dict[str, "StoredCredential"]:
+        stored = {}
+        for credential in credentials:
+            content_hash = StoredCredential.hash_credential(credential)
+            if content_hash not in stored:
+                stored[content_hash] = StoredCredential(
+                    content_hash=content_hash, credential=credential
+                )
+        return stored
+
+    def store(self, credentials: Iterable[dict]) -> Dict[str, "StoredCredential"]:
+        """
+        Stores the credentials (if not already stored) and returns them indexed by their content hash
+        """
+        stored = self.build(credentials)
+        self.bulk_create(stored.values(), ignore_conflicts=True)
+        return stored
+
+    async def astore(
+        self, credentials: Iterable[dict]
+    ) -> Dict[str, "StoredCredential"]:
+        stored = self.build(credentials)
+        await self.abulk_create(stored.values(), ignore_conflicts=True)
+        return stored
+
+
+class StoredCredential(models.Model):
+    """
+    Content addressed store for verifiable credentials.
+    Identical credentials (for example the same stamp used in several communities) are stored only once,
+    and referenced from `CeramicCache.stamp_ref` and `Stamp.credential_ref`.
+
+    Cold entries can be compressed, in which case `credential` is cleared and the zstd compressed
+    JSON is kept in `compressed_credential`.
+    """
+
+    content_hash = models.CharField(
+        primary_key=True,
+        max_length=64,
+        help_text="sha256 of the canonical JSON encoding of the credential",
+    )
+    credential = models.JSONField(null=True, blank=True)
+    compressed_credential = models.BinaryField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    objects = StoredCredentialManager()
+
+    def __str__(self):
+        return f"StoredCredential {self.content_hash}, compressed={self.is_compressed}"
+
+    @staticmethod
+    def encode_credential(credential: dict) -> bytes:
+        return json.dumps(credential, sort_keys=True, separators=(",", ":")).encode(
+            "utf-8"
+        )
+
+    @classmethod
+    def hash_credential(cls, credential: dict) -> str:
+        return sha256(cls.encode_credential(credential)).hexdigest()
+
+    @property
+    def is_compressed(self) -> bool:
+        return self.credential is None and self.compressed_credential is not None
+
+    def compress(self) -> None:
+        if self.is_compressed:
+            return
+        compressor = zstandard.ZstdCompressor(
+            level=settings.CREDENTIAL_STORE_COMPRESSION_LEVEL
+        )
+        self.compressed_credential = compressor.compress(
+            self.encode_credential(self.credential)
+        )
+        self.credential = None
+
+    @staticmethod
+    def decompress_credential(compressed_credential) -> bytes:
+        """
+        Returns the JSON encoding of a compressed credential
+        """
+        return zstandard.ZstdDecompressor().decompress(bytes(compressed_credential))
+
+    def get_credential(self) -> dict:
+        if self.is_compressed:
+            return json.loads(self.decompress_credential(self.compressed_credential))
+        return self.credential
+
+
+class StampQuerySet(models.QuerySet):
+    def with_credentials(self):
+        return self.select_related("credential_ref")
+
+
 class Stamp(models.Model):
     passport = models.ForeignKey(
         Passport,
@@ -36,12 +134,37 @@ class Stamp(models.Model):
         null=False, blank=False, default="", max_length=256, db_index=True
     )
     credential = models.JSONField(default=dict)
+    # When set, the credential is read from the credential store and `credential` is left empty
+    credential_ref = models.ForeignKey(
+        StoredCredential,
+        related_name="+",
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        # Lookups only go from the stamp to the credential, no need for an index
+        db_index=False,
+    )
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = StampQuerySet.as_manager()
 
     def __str__(self):
         return f"Stamp #{self.id}, hash={self.hash}, provider={self.provider}, passport={self.passport_id}"
 
+    def get_credential(self) -> dict:
+        if self.credential_ref_id:
+            return self.credential_ref.get_credential()
+        return self.credential
+
     class Meta:
         unique_together = ["hash", "passport"]
+        indexes = [
+            # Keyset pagination of the incremental exports, see the `incremental_export` command
+            models.Index(
+                fields=["updated_at", "id"],
+                name="stamp_export_index",
+            ),
+        ]
 
 
 class Score(models.Model):
@@ -72,6 +195,15 @@ class Score(models.Model):
     evidence = models.JSONField(null=True, blank=True)
     stamp_scores = models.JSONField(null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            # Keyset pagination of scores, see `registry.utils.get_keyset_page`
+            models.Index(
+                fields=["last_score_timestamp", "id"],
+                name="score_pagination_index",
+            ),
+        ]
+
     def __str__(self):
         return f"Score #{self.id}, score={self.score}, last_score_timestamp={self.last_score_timestamp}, status={self.status}, error={self.error}, evidence={self.evidence}, passport_id={self.passport_id}"
 
@@ -81,7 +213,7 @@ def score_updated(sender, instance, **kwargs):
     if instance.status != Score.Status.DONE:
         return instance
 
-    Event.objects.create(
+    event = Event.objects.create(
         action=Event.Action.SCORE_UPDATE,
         address=instance.passport.address,
         community=instance.passport.community,
@@ -91,6 +223,8 @@ def score_updated(sender, instance, **kwargs):
         },
     )
 
+    ScoreSnapshot.record(event)
+
     return instance
 
 
@@ -152,6 +286,86 @@ The reason to have this field (and not use the `data` JSON field) is to be able
         ]
 
 
+class ScoreSnapshot(models.Model):
+    """
+    The score of an address in a community over the interval [valid_from, valid_to).
+    The current score has `valid_to` set to NULL.
+
+    This is maintained from the SCORE_UPDATE events (1 snapshot per event) and allows answering point in time
+    queries (the scores as of T) with a range lookup, instead of searching for the latest event for every address.
+    """
+
+    community = models.ForeignKey(
+        Community,
+        on_delete=models.CASCADE,
+        related_name="score_snapshots",
+    )
+    address = EthAddressField(max_length=42)
+    valid_from = models.DateTimeField()
+    valid_to = models.DateTimeField(null=True, blank=True)
+    score = models.DecimalField(decimal_places=9, max_digits=18)
+    evidence = models.JSONField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["community", "address", "valid_from"],
+                name="score_snapshot_as_of_index",
+            ),
+        ]
+        constraints = [
+            # There can be only 1 current score per address
+            models.UniqueConstraint(
+                fields=["community", "address"],
+                condition=models.Q(valid_to__isnull=True),
+                name="score_snapshot_current_unique",
+            ),
+        ]
+
+    def __str__(self):
+        return f"ScoreSnapshot #{self.id}, address={self.address}, community_id={self.community_id}, valid_from={self.valid_from}, valid_to={self.valid_to}"
+
+    @classmethod
+    def from_event(cls, event: Event) -> "ScoreSnapshot":
+        return cls(
+            community_id=event.community_id,
+            address=event.address,
+            valid_from=event.created_at,
+            score=event.data["score"],
+            evidence=event.data["evidence"],
+        )
+
+    @classmethod
+    def record(cls, event: Event) -> "ScoreSnapshot":
+        """
+        Closes the current interval for the address (if any) and opens a new one, starting at the event
+        """
+        snapshot = cls.from_event(event)
+
+        try:
+            with transaction.atomic():
+                return snapshot.open()
+        except IntegrityError:
+            # A concurrent score update has opened an interval in the meantime, close that one as well
+            with transaction.atomic():
+                return snapshot.open()
+
+    def open(self) -> "ScoreSnapshot":
+        ScoreSnapshot.objects.filter(
+            community_id=self.community_id,
+            address=self.address,
+            valid_to__isnull=True,
+        ).update(valid_to=self.valid_from)
+        self.save()
+        return self
+
+    @staticmethod
+    def as_of_condition(timestamp) -> models.Q:
+        return models.Q(valid_from__lte=timestamp) & (
+            models.Q(valid_to__gt=timestamp) | models.Q(valid_to__isnull=True)
+        )
+
+
 class HashScorerLink(models.Model):
     hash = models.CharField(null=False, blank=False, max_length=100, db_index=True)
     community = models.ForeignKey(
@@ -189,3 +403,37 @@ class GTCStakeEvent(models.Model):
                 name="gtc_staking_index_by_staker",
             ),
         ]
+
+
+class RescoreCheckpoint(models.Model):
+    """
+    Progress of a bulk rescore (`recalculate_scores`, `propagate_weights_and_rescore`) over a range of passport IDs
+    of a community. This is updated in the same transaction as the scores of each batch, so that an interrupted
+    rescore can be resumed after `last_passport_id`.
+    """
+
+    job = models.CharField(max_length=100)
+    community = models.ForeignKey(
+        Community,
+        on_delete=models.CASCADE,
+        related_name="rescore_checkpoints",
+    )
+    # Inclusive range of passport IDs, `end_id` is NULL for an open range
+    start_id = models.BigIntegerField(default=0)
+    end_id = models.BigIntegerField(null=True, blank=True)
+    last_passport_id = models.BigIntegerField(null=True, blank=True)
+    # Hash of the weights (and threshold) of the scorer, a run is only resumed with the same weights
+    weights_version = models.CharField(max_length=64)
+    # Only the passports holding a stamp of one of these providers are rescored, NULL for all passports
+    providers = models.JSONField(null=True, blank=True)
+    processed = models.IntegerField(default=0)
+    total = models.IntegerField(default=0)
+    finished = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ["job", "community", "start_id"]
+
+    def __str__(self):
+        return f"RescoreCheckpoint #{self.id}, job={self.job}, community_id={self.community_id}, range=[{self.start_id}, {self.end_id}], last_passport_id={self.last_passport_id}"
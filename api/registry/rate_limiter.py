@@ -0,0 +1,185 @@
+"""
+Rate limiter with a local allowance per API key, reconciled with the shared cache in batches.
+
+Every process counts the requests of an API key locally and only pushes its count to the shared
+cache (Redis) once it has used its local allowance (a share of the limit of the API key's
+`RateLimits` tier) or when `RATE_LIMIT_SYNC_INTERVAL` seconds have passed. The global count read
+back from the shared cache is used for the following requests, so most requests are decided
+without any I/O. Enforcement is approximate: all processes together can exceed the limit by up
+to their unsynchronized allowance.
+
+`is_ratelimited` counts every request in the shared cache instead.
+
+Windows are fixed: they start at a multiple of the period of the rate.
+"""
+import re
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional, Tuple
+
+import api_logging as logging
+from django.conf import settings
+from django.core.cache import cache, caches
+
+log = logging.getLogger(__name__)
+
+# Rates in the format of django-ratelimit, for example "125/15m"
+RATE_RE = re.compile(r"(\d+)/(\d*)([smhd])?")
+RATE_PERIODS = {"s": 1, "m": 60, "h": 60 * 60, "d": 24 * 60 * 60}
+
+
+def split_rate(rate: Optional[str]) -> Optional[Tuple[int, int]]:
+    """
+    Returns the limit and the period (in seconds) of a rate, None for an unlimited (empty or NULL)
+    rate
+    """
+    if not rate:
+        return None
+    count, multiplier, unit = RATE_RE.match(rate).groups()
+    return int(count), RATE_PERIODS[(unit or "s").lower()] * int(multiplier or 1)
+
+
+def is_ratelimited(
+    key: str, rate: Optional[str], cost: int = 1, clock: Callable[[], float] = time.time
+) -> bool:
+    """
+    Count `cost` requests for `key` in the current window of the shared cache, and return whether
+    the limit of the rate is exceeded. Requests of any cost share the same counter.
+    """
+    if not rate or not getattr(settings, "RATELIMIT_ENABLE", True):
+        return False
+
+    limit, period = split_rate(rate)
+    cache_key = f"rl:{key}:{rate}:{int(clock() // period)}"
+    shared_cache = caches[getattr(settings, "RATELIMIT_USE_CACHE", "default")]
+
+    try:
+        if shared_cache.add(cache_key, cost, period):
+            count = cost
+        else:
+            count = shared_cache.incr(cache_key, cost)
+    except Exception:
+        log.warning("Failed to count rate limited request", exc_info=True)
+        return not getattr(settings, "RATELIMIT_FAIL_OPEN", False)
+
+    return count > limit
+
+
+@dataclass
+class RateLimitState:
+    window: int
+    # Requests of the window counted by all processes, as of the last sync
+    global_count: int = 0
+    # Requests of this process that have not been pushed to the shared cache yet
+    pending: int = 0
+    last_sync: float = 0
+
+
+class LocalRateLimiter:
+    def __init__(
+        self,
+        local_share: float,
+        sync_interval: float,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.local_share = local_share
+        self.sync_interval = sync_interval
+        self.clock = clock
+        self._states: Dict[Tuple[str, str], RateLimitState] = {}
+        self._lock = threading.Lock()
+
+    def _reserve(
+        self, key: str, rate: Optional[str], cost: int
+    ) -> Tuple[bool, Optional[Tuple[str, int, int, RateLimitState]]]:
+        """
+        Count the request locally.
+        Returns whether the request is limited and, if the state needs to be synced with the
+        shared cache, the (cache key, increment, expiry, state) to sync.
+        """
+        if not rate:
+            # Unlimited (empty or NULL rate)
+            return False, None
+
+        limit, period = split_rate(rate)
+        now = self.clock()
+        window = int(now // period)
+
+        with self._lock:
+            state = self._states.get((key, rate))
+            if state is None or state.window != window:
+                state = RateLimitState(window=window, last_sync=now)
+                self._states[(key, rate)] = state
+
+            if state.global_count + state.pending + cost > limit:
+                return True, None
+
+            state.pending += cost
+            allowance = max(1, int(limit * self.local_share))
+            if state.pending < allowance and now - state.last_sync < self.sync_interval:
+                return False, None
+
+            increment, state.pending = state.pending, 0
+            state.last_sync = now
+
+        cache_key = f"rl-local:{key}:{rate}:{window}"
+        return False, (cache_key, increment, period, state)
+
+    def _apply_sync(
+        self, state: RateLimitState, rate: str, count: Optional[int]
+    ) -> bool:
+        limit, _ = split_rate(rate)
+        if count is None:
+            # The shared cache is not available, only the local count is enforced
+            return not getattr(settings, "RATELIMIT_FAIL_OPEN", False)
+
+        with self._lock:
+            state.global_count = max(state.global_count, count)
+
+        return count > limit
+
+    def is_ratelimited(self, key: str, rate: Optional[str], cost: int = 1) -> bool:
+        limited, sync = self._reserve(key, rate, cost)
+        if limited or not sync:
+            return limited
+
+        cache_key, increment, period, state = sync
+        try:
+            if cache.add(cache_key, increment, period):
+                count = increment
+            else:
+                count = cache.incr(cache_key, increment)
+        except Exception:
+            log.warning("Failed to sync rate limit", exc_info=True)
+            count = None
+
+        return self._apply_sync(state, rate, count)
+
+    async def ais_ratelimited(
+        self, key: str, rate: Optional[str], cost: int = 1
+    ) -> bool:
+        limited, sync = self._reserve(key, rate, cost)
+        if limited or not sync:
+            return limited
+
+        cache_key, increment, period, state = sync
+        try:
+            if await cache.aadd(cache_key, increment, period):
+                count = increment
+            else:
+                count = await cache.aincr(cache_key, increment)
+        except Exception:
+            log.warning("Failed to sync rate limit", exc_info=True)
+            count = None
+
+        return self._apply_sync(state, rate, count)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._states.clear()
+
+
+local_rate_limiter = LocalRateLimiter(
+    local_share=settings.RATE_LIMIT_LOCAL_SHARE,
+    sync_interval=settings.RATE_LIMIT_SYNC_INTERVAL,
+)
@@ -0,0 +1,330 @@
+"""
+Bulk rescoring of the passports of a community, used by the `recalculate_scores` command.
+
+Passports are processed in keyset batches (ordered by ID): the stamps of a batch are loaded in one
+query, scored with `recompute_score` and the scores are written with `registry.score_writer`.
+
+For parallel runs, the passport ID space of a community is split into shards (ranges of IDs) that
+are rescored independently by the workers of a process pool.
+
+The progress of each shard is recorded in a `RescoreCheckpoint`, so that an interrupted run can be
+resumed where it stopped.
+"""
+import json
+import time
+from dataclasses import dataclass
+from decimal import Decimal
+from hashlib import sha256
+from typing import Callable, Collection, Iterator, List, Optional, Tuple
+
+from account.models import Community
+from django.db import transaction
+from django.db.models import Exists, Max, Min, OuterRef, QuerySet
+from registry.models import Passport, RescoreCheckpoint, Score, Stamp
+from registry.score_cache import invalidate_scores, is_score_cache_enabled
+from registry.score_writer import write_scores
+from registry.utils import get_utc_time
+
+
+@dataclass
+class ShardResult:
+    index: int
+    start_id: int
+    end_id: Optional[int]
+    count: int
+    elapsed: float
+
+
+def iter_passport_batches(
+    community_id: int,
+    batch_size: int,
+    start_id: int = 0,
+    end_id: Optional[int] = None,
+    requires_calculation: Optional[bool] = None,
+    providers: Optional[Collection[str]] = None,
+) -> Iterator[List[Passport]]:
+    """
+    Yield the passports of the community with `start_id <= id <= end_id`, in batches ordered by ID
+    """
+    last_id = start_id - 1
+    while True:
+        passport_query = Passport.objects.order_by("id").filter(
+            community_id=community_id, id__gt=last_id
+        )
+        if end_id is not None:
+            passport_query = passport_query.filter(id__lte=end_id)
+        if requires_calculation is not None:
+            passport_query = passport_query.filter(
+                requires_calculation=requires_calculation
+            )
+        if providers is not None:
+            passport_query = with_providers(passport_query, providers)
+
+        passports = list(passport_query[:batch_size].iterator())
+        if not passports:
+            return
+
+        last_id = passports[-1].id
+        yield passports
+
+
+def rescore_passports(scorer, community_id: int, passports: List[Passport]) -> None:
+    """
+    Recompute and save the scores of a batch of passports of the community
+    """
+    passport_ids = [p.id for p in passports]
+    stamps = {}
+    for s in Stamp.objects.filter(passport_id__in=passport_ids):
+        if s.passport_id not in stamps:
+            stamps[s.passport_id] = []
+        stamps[s.passport_id].append(s)
+
+    calculated_scores = scorer.recompute_score(passport_ids, stamps)
+    scores = []
+
+    for p, scoreData in zip(passports, calculated_scores):
+        score = Score(passport=p)
+        scores.append(score)
+
+        score.score = scoreData.score
+        score.status = Score.Status.DONE
+        score.last_score_timestamp = get_utc_time()
+        score.evidence = scoreData.evidence[0].as_dict() if scoreData.evidence else None
+        score.error = None
+        score.stamp_scores = scoreData.stamp_scores
+
+    write_scores(scores)
+
+    # The bulk writer does not send the signals that invalidate the cache
+    if is_score_cache_enabled():
+        invalidate_scores(community_id, [p.address for p in passports])
+
+
+def get_shards(community_id: int, num_shards: int) -> List[Tuple[int, int]]:
+    """
+    Split the passport IDs of the community into (at most) `num_shards` ranges of the same width,
+    as inclusive (start_id, end_id) tuples
+    """
+    id_range = Passport.objects.filter(community_id=community_id).aggregate(
+        min_id=Min("id"), max_id=Max("id")
+    )
+    min_id, max_id = id_range["min_id"], id_range["max_id"]
+    if min_id is None:
+        return []
+
+    width = -(-(max_id - min_id + 1) // num_shards)
+    return [
+        (start_id, min(start_id + width - 1, max_id))
+        for start_id in range(min_id, max_id + 1, width)
+    ]
+
+
+def get_chunk_ranges(
+    passports: QuerySet[Passport], chunk_size: int
+) -> Iterator[Tuple[int, int]]:
+    """
+    Split `passports` into chunks of `chunk_size` passports, yields the inclusive (start_id, end_id)
+    range of each chunk
+    """
+    ids = passports.order_by("id").values_list("id", flat=True)
+    start_id = ids.first()
+    while start_id is not None:
+        end_id = next(
+            iter(ids.filter(id__gte=start_id)[chunk_size - 1 : chunk_size]), None
+        )
+        if end_id is None:
+            yield start_id, ids.last()
+            return
+
+        yield start_id, end_id
+        start_id = ids.filter(id__gt=end_id).first()
+
+
+def rescore_flagged_range(
+    community_id: int, start_id: int, end_id: int, batch_size: int
+) -> int:
+    """
+    Rescore the passports of the range that are flagged with `requires_calculation`, from their
+    stored stamps (the credentials are not fetched nor verified again). Chunks can be run more than
+    once: passports are unflagged in the transaction that saves their score.
+    Returns the number of passports rescored.
+    """
+    scorer = Community.objects.get(id=community_id).get_scorer()
+
+    count = 0
+    for passports in iter_passport_batches(
+        community_id, batch_size, start_id, end_id, requires_calculation=True
+    ):
+        with transaction.atomic():
+            rescore_passports(scorer, community_id, passports)
+            Passport.objects.filter(id__in=[p.id for p in passports]).update(
+                requires_calculation=False
+            )
+        count += len(passports)
+
+    return count
+
+
+def with_providers(
+    passports: QuerySet[Passport], providers: Collection[str]
+) -> QuerySet[Passport]:
+    """
+    Filter the passports holding a stamp of one of the providers
+    """
+    return passports.filter(
+        Exists(Stamp.objects.filter(passport_id=OuterRef("id"), provider__in=providers))
+    )
+
+
+def get_changed_providers(scorer, weights: dict, threshold=None) -> Optional[List[str]]:
+    """
+    Compare the weights (and threshold) of the scorer with the new ones. Returns the providers whose
+    weight changes, or None if the scores of all passports are affected.
+    """
+    old_weights = getattr(scorer, "weights", None)
+    if old_weights is None:
+        return None
+
+    old_threshold = getattr(scorer, "threshold", None)
+    if (
+        threshold is not None
+        and old_threshold is not None
+        and Decimal(str(old_threshold)) != Decimal(str(threshold))
+    ):
+        # The threshold applies to every passport
+        return None
+
+    def weight(weights, provider):
+        return Decimal(str(weights.get(provider, 0)))
+
+    return sorted(
+        provider
+        for provider in set(old_weights) | set(weights)
+        if weight(old_weights, provider) != weight(weights, provider)
+    )
+
+
+def get_weights_version(scorer) -> str:
+    weights = {
+        "weights": getattr(scorer, "weights", None),
+        "threshold": str(getattr(scorer, "threshold", None)),
+    }
+    return sha256(json.dumps(weights, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def get_checkpoints(
+    job: str,
+    community_id: int,
+    weights_version: str,
+    shards: List[Tuple[int, Optional[int]]],
+    resume: bool,
+    providers: Optional[List[str]] = None,
+) -> List[RescoreCheckpoint]:
+    """
+    With `resume`, return the checkpoints of the previous run for the community if it used the same
+    weights (its shards and providers are kept). Otherwise, start a new run over `shards`, for the
+    passports holding a stamp of one of `providers` (all passports if None).
+    """
+    checkpoints = list(
+        RescoreCheckpoint.objects.filter(job=job, community_id=community_id).order_by(
+            "start_id"
+        )
+    )
+    if (
+        resume
+        and checkpoints
+        and all(c.weights_version == weights_version for c in checkpoints)
+    ):
+        return checkpoints
+
+    RescoreCheckpoint.objects.filter(job=job, community_id=community_id).delete()
+
+    checkpoints = []
+    for start_id, end_id in shards:
+        passports = Passport.objects.filter(community_id=community_id, id__gte=start_id)
+        if end_id is not None:
+            passports = passports.filter(id__lte=end_id)
+        if providers is not None:
+            passports = with_providers(passports, providers)
+        checkpoints.append(
+            RescoreCheckpoint.objects.create(
+                job=job,
+                community_id=community_id,
+                start_id=start_id,
+                end_id=end_id,
+                weights_version=weights_version,
+                providers=providers,
+                total=passports.count(),
+            )
+        )
+    return checkpoints
+
+
+def run_checkpoint(
+    checkpoint: RescoreCheckpoint,
+    batch_size: int,
+    process_batch: Callable[[List[Passport]], None],
+) -> int:
+    """
+    Call `process_batch` for the passports of the checkpoint's range that have not been processed
+    yet. The checkpoint is saved in the transaction of each batch, so processing a batch must be
+    idempotent: after a crash, the batch that was in progress is processed again.
+    Returns the number of passports processed.
+    """
+    if checkpoint.finished:
+        return 0
+
+    start_id = (
+        checkpoint.last_passport_id + 1
+        if checkpoint.last_passport_id is not None
+        else checkpoint.start_id
+    )
+
+    count = 0
+    for passports in iter_passport_batches(
+        checkpoint.community_id,
+        batch_size,
+        start_id,
+        checkpoint.end_id,
+        providers=checkpoint.providers,
+    ):
+        with transaction.atomic():
+            process_batch(passports)
+            checkpoint.last_passport_id = passports[-1].id
+            checkpoint.processed += len(passports)
+            checkpoint.save(
+                update_fields=["last_passport_id", "processed", "updated_at"]
+            )
+        count += len(passports)
+
+    checkpoint.finished = True
+    checkpoint.save(update_fields=["finished", "updated_at"])
+    return count
+
+
+def rescore_checkpoint(
+    checkpoint: RescoreCheckpoint,
+    batch_size: int,
+    on_batch: Optional[Callable[[List[Passport]], None]] = None,
+) -> int:
+    scorer = Community.objects.get(id=checkpoint.community_id).get_scorer()
+
+    def process_batch(passports: List[Passport]):
+        rescore_passports(scorer, checkpoint.community_id, passports)
+        if on_batch:
+            on_batch(passports)
+
+    return run_checkpoint(checkpoint, batch_size, process_batch)
+
+
+def rescore_shard(index: int, checkpoint_id: int, batch_size: int) -> ShardResult:
+    start = time.monotonic()
+    checkpoint = RescoreCheckpoint.objects.get(id=checkpoint_id)
+    count = rescore_checkpoint(checkpoint, batch_size)
+    return ShardResult(
+        index,
+        checkpoint.start_id,
+        checkpoint.end_id,
+        count,
+        time.monotonic() - start,
+    )
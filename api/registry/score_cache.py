@@ -0,0 +1,191 @@
+"""
+Read-through cache for the `DetailedScoreResponse` of an address in a community.
+
+Scores only change when a submission (or a rescore) finishes, while clients poll the score endpoints.
+The serialized response is cached in 2 tiers:
+
+- a small per-process `ExpiringLRUCache` with a short TTL, which absorbs bursts of polls
+- the shared Django cache (Redis), which is invalidated whenever a `Score` is saved
+
+A read that loads a score before a concurrent write commits could store the old score after the
+write's invalidation. So each invalidation also sets a new version for the address, and entries are
+only used if they were loaded under the current version.
+
+Entries also carry the ETag / Last-Modified validators of the score, so that conditional requests
+can be answered without a database query as well.
+"""
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Iterable, Optional
+
+import api_logging as logging
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from registry.api.schema import DetailedScoreResponse
+from registry.api.utils import make_etag
+from registry.models import Score
+from scorer.lru_cache import ExpiringLRUCache
+
+log = logging.getLogger(__name__)
+
+local_score_cache = ExpiringLRUCache(
+    "score_responses", settings.SCORE_RESPONSE_LOCAL_CACHE_SIZE
+)
+
+# Hits / misses of the shared tier, the local tier keeps its own counters
+shared_cache_stats = {"hits": 0, "misses": 0, "errors": 0}
+
+
+@dataclass
+class CachedScore:
+    etag: str
+    last_modified: Optional[datetime]
+    # DetailedScoreResponse serialized as JSON
+    response: str
+    # Version of the address when the score was loaded, see `get_score_version_key`
+    version: Optional[str] = None
+
+    def get_response(self) -> DetailedScoreResponse:
+        return DetailedScoreResponse.parse_raw(self.response)
+
+
+def is_score_cache_enabled() -> bool:
+    return settings.FF_SCORE_RESPONSE_CACHE == "on"
+
+
+def get_score_cache_key(community_id: int, address: str) -> str:
+    return f"score-response:{community_id}:{address.lower()}"
+
+
+def get_score_version_key(community_id: int, address: str) -> str:
+    return f"score-response-version:{community_id}:{address.lower()}"
+
+
+def build_cached_score(score: Score, version: Optional[str] = None) -> CachedScore:
+    return CachedScore(
+        etag=make_etag(
+            "score", score.id, score.status, score.score, score.last_score_timestamp
+        ),
+        last_modified=score.last_score_timestamp,
+        response=DetailedScoreResponse.from_orm(score).json(),
+        version=version,
+    )
+
+
+def get_cached_score(community_id: int, address: str) -> Optional[CachedScore]:
+    """
+    Returns the cached score of `address` in the community, loading it from the database on a miss.
+    Returns None if there is no score for this address.
+    """
+    key = get_score_cache_key(community_id, address)
+    version_key = get_score_version_key(community_id, address)
+
+    cached_score = local_score_cache.get(key)
+    if cached_score:
+        return cached_score
+
+    # The version is read before the score: an invalidation after this point changes the version,
+    # and the entry stored below is then ignored
+    cached_score = version = None
+    try:
+        entries = cache.get_many([key, version_key])
+        cached_score = entries.get(key)
+        version = entries.get(version_key)
+    except Exception:
+        log.warning("Failed to read score response cache", exc_info=True)
+        shared_cache_stats["errors"] += 1
+
+    if cached_score and cached_score.version != version:
+        cached_score = None
+
+    if cached_score:
+        shared_cache_stats["hits"] += 1
+    else:
+        shared_cache_stats["misses"] += 1
+        score = (
+            Score.objects.select_related("passport")
+            .filter(
+                passport__address=address.lower(), passport__community_id=community_id
+            )
+            .first()
+        )
+        if not score:
+            return None
+
+        cached_score = build_cached_score(score, version)
+        try:
+            cache.set(key, cached_score, settings.SCORE_RESPONSE_CACHE_TTL)
+        except Exception:
+            log.warning("Failed to write score response cache", exc_info=True)
+            shared_cache_stats["errors"] += 1
+
+    local_score_cache.set(
+        key, cached_score, time.time() + settings.SCORE_RESPONSE_LOCAL_CACHE_TTL
+    )
+
+    lookups = shared_cache_stats["hits"] + shared_cache_stats["misses"]
+    if lookups % local_score_cache.stats_log_interval == 0:
+        log.info("Score response cache stats: %s", score_cache_stats())
+
+    return cached_score
+
+
+def invalidate_scores(community_id: int, addresses: Iterable[str]) -> None:
+    """
+    Drop the cached scores of the addresses in the community.
+    The local tier of the other processes is not reached, their entries expire after
+    `SCORE_RESPONSE_LOCAL_CACHE_TTL` seconds.
+    """
+    addresses = list(addresses)
+    keys = [get_score_cache_key(community_id, address) for address in addresses]
+    for key in keys:
+        local_score_cache.delete(key)
+
+    try:
+        # The versions outlive the entries loaded before the invalidation
+        version = uuid.uuid4().hex
+        cache.set_many(
+            {
+                get_score_version_key(community_id, address): version
+                for address in addresses
+            },
+            2 * settings.SCORE_RESPONSE_CACHE_TTL,
+        )
+        cache.delete_many(keys)
+    except Exception:
+        log.error("Failed to invalidate score response cache", exc_info=True)
+
+
+@receiver(post_save, sender=Score)
+def score_saved(sender, instance, **kwargs):
+    if not is_score_cache_enabled():
+        return
+
+    community_id = instance.passport.community_id
+    address = instance.passport.address
+    # Invalidating before the commit would let a concurrent read cache the old score again
+    transaction.on_commit(lambda: invalidate_scores(community_id, [address]))
+
+
+def score_cache_stats() -> dict:
+    lookups = shared_cache_stats["hits"] + shared_cache_stats["misses"]
+    local_stats = local_score_cache.stats()
+    total_lookups = local_stats["hits"] + local_stats["misses"]
+    return {
+        "local": local_stats,
+        "shared": {
+            **shared_cache_stats,
+            "hit_rate": shared_cache_stats["hits"] / lookups if lookups else None,
+        },
+        # Share of all lookups that did not need a database query
+        "hit_rate": (
+            (total_lookups - shared_cache_stats["misses"]) / total_lookups
+            if total_lookups
+            else None
+        ),
+    }
@@ -0,0 +1,195 @@
+"""
+Dry-run of a weights change: computes the scores of passports with the current and the new weights,
+without writing anything.
+
+Passports are processed in chunks (keyset by ID). For each chunk, the stamps are loaded as a
+(passport x provider) boolean matrix, and the raw scores (sum of the weights of the distinct
+providers, as in `scorer_weighted.computation`) are computed with a matrix product for both weight
+maps. Only aggregates and the top movers are kept across chunks, so memory use is bounded by the
+chunk size.
+"""
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Tuple
+
+import numpy as np
+import pyarrow as pa
+from registry.models import Passport, Stamp
+
+DIFF_SCHEMA = pa.schema(
+    [
+        ("community_id", pa.int64()),
+        ("passport_id", pa.int64()),
+        ("address", pa.string()),
+        ("old_score", pa.float64()),
+        ("new_score", pa.float64()),
+        ("delta", pa.float64()),
+        ("old_passing", pa.bool_()),
+        ("new_passing", pa.bool_()),
+    ]
+)
+
+
+@dataclass
+class ScoreChunk:
+    passport_ids: np.ndarray
+    addresses: List[str]
+    old_scores: np.ndarray
+    new_scores: np.ndarray
+
+    @property
+    def deltas(self) -> np.ndarray:
+        return self.new_scores - self.old_scores
+
+
+def get_weight_vectors(
+    old_weights: dict, new_weights: dict
+) -> Tuple[Dict[str, int], np.ndarray, np.ndarray]:
+    """
+    Returns the column of each provider and the old and new weights, as vectors over the columns
+    """
+    providers = sorted(set(old_weights) | set(new_weights))
+    columns = {provider: i for i, provider in enumerate(providers)}
+    old = np.array([float(old_weights.get(p, 0)) for p in providers])
+    new = np.array([float(new_weights.get(p, 0)) for p in providers])
+    return columns, old, new
+
+
+def iter_score_chunks(
+    community_id: int,
+    old_weights: dict,
+    new_weights: dict,
+    chunk_size: int,
+    database: str,
+) -> Iterator[ScoreChunk]:
+    columns, old, new = get_weight_vectors(old_weights, new_weights)
+
+    last_id = 0
+    while True:
+        passports = list(
+            Passport.objects.using(database)
+            .filter(community_id=community_id, id__gt=last_id)
+            .order_by("id")
+            .values_list("id", "address")[:chunk_size]
+        )
+        if not passports:
+            return
+
+        passport_ids = np.array([p[0] for p in passports], dtype=np.int64)
+        last_id = passports[-1][0]
+
+        rows = []
+        cols = []
+        stamps = (
+            Stamp.objects.using(database)
+            .filter(
+                passport__community_id=community_id,
+                passport_id__gte=passport_ids[0],
+                passport_id__lte=last_id,
+            )
+            .values_list("passport_id", "provider")
+        )
+        for passport_id, provider in stamps.iterator(chunk_size=10000):
+            column = columns.get(provider)
+            if column is not None:
+                rows.append(passport_id)
+                cols.append(column)
+
+        # Passport IDs are sorted, so the row of a passport is found with a binary search. A
+        # provider held twice only sets the same cell again, as it is only counted once.
+        held = np.zeros((len(passport_ids), len(columns)), dtype=bool)
+        if rows:
+            held[np.searchsorted(passport_ids, rows), cols] = True
+
+        yield ScoreChunk(
+            passport_ids=passport_ids,
+            addresses=[p[1] for p in passports],
+            old_scores=held @ old,
+            new_scores=held @ new,
+        )
+
+
+@dataclass
+class ScoreImpact:
+    new_threshold: float
+    top: int = 20
+    count: int = 0
+    changed: int = 0
+    sums: Dict[str, float] = field(
+        default_factory=lambda: {"old": 0.0, "new": 0.0, "delta": 0.0}
+    )
+    # Number of passports per (integer) score bucket
+    old_histogram: np.ndarray = field(default_factory=lambda: np.zeros(0, np.int64))
+    new_histogram: np.ndarray = field(default_factory=lambda: np.zeros(0, np.int64))
+    now_passing: int = 0
+    now_failing: int = 0
+    # (delta, community_id, passport_id, address, old score, new score), largest |delta| first
+    top_movers: List[tuple] = field(default_factory=list)
+
+    def add(
+        self, community_id: int, chunk: ScoreChunk, old_threshold: float
+    ) -> pa.RecordBatch:
+        """
+        Add a chunk to the aggregates, returns the diff of the chunk (the passports with a new
+        score or passing state)
+        """
+        deltas = chunk.deltas
+        old_passing = chunk.old_scores >= old_threshold
+        new_passing = chunk.new_scores >= self.new_threshold
+
+        self.count += len(deltas)
+        self.sums["old"] += float(chunk.old_scores.sum())
+        self.sums["new"] += float(chunk.new_scores.sum())
+        self.sums["delta"] += float(deltas.sum())
+        self.old_histogram = add_histogram(self.old_histogram, chunk.old_scores)
+        self.new_histogram = add_histogram(self.new_histogram, chunk.new_scores)
+        self.now_passing += int(np.count_nonzero(new_passing & ~old_passing))
+        self.now_failing += int(np.count_nonzero(old_passing & ~new_passing))
+
+        changed = (deltas != 0) | (old_passing != new_passing)
+        self.changed += int(np.count_nonzero(changed))
+
+        if self.top:
+            candidates = np.argsort(-np.abs(deltas), kind="stable")[: self.top]
+            self.top_movers = sorted(
+                self.top_movers
+                + [
+                    (
+                        float(deltas[i]),
+                        community_id,
+                        int(chunk.passport_ids[i]),
+                        chunk.addresses[i],
+                        float(chunk.old_scores[i]),
+                        float(chunk.new_scores[i]),
+                    )
+                    for i in candidates
+                    if deltas[i] != 0
+                ],
+                key=lambda m: -abs(m[0]),
+            )[: self.top]
+
+        indexes = np.flatnonzero(changed)
+        return pa.RecordBatch.from_arrays(
+            [
+                pa.array(np.full(len(indexes), community_id, dtype=np.int64)),
+                pa.array(chunk.passport_ids[indexes]),
+                pa.array([chunk.addresses[i] for i in indexes], pa.string()),
+                pa.array(chunk.old_scores[indexes]),
+                pa.array(chunk.new_scores[indexes]),
+                pa.array(deltas[indexes]),
+                pa.array(old_passing[indexes]),
+                pa.array(new_passing[indexes]),
+            ],
+            schema=DIFF_SCHEMA,
+        )
+
+    def mean(self, name: str) -> float:
+        return self.sums[name] / self.count if self.count else 0.0
+
+
+def add_histogram(histogram: np.ndarray, scores: np.ndarray) -> np.ndarray:
+    # Negative weights are clipped into the first bucket
+    counts = np.bincount(np.clip(np.floor(scores), 0, None).astype(np.int64))
+    size = max(len(histogram), len(counts))
+    return np.pad(histogram, (0, size - len(histogram))) + np.pad(
+        counts, (0, size - len(counts))
+    )
@@ -0,0 +1,189 @@
+"""
+Bulk writer for scores, used by the bulk rescoring paths instead of `bulk_create` / `bulk_update`
+(which generates an UPDATE with a `CASE WHEN` per column and row).
+
+On PostgreSQL, the score rows are COPYed into a temporary table and applied with a single
+`INSERT ... ON CONFLICT (passport_id) DO UPDATE`. Other databases use `bulk_create` with
+`update_conflicts`, which is the same upsert without the COPY.
+
+Like `Score.save` (see the `score_updated` receiver), a SCORE_UPDATE event and a score snapshot are
+recorded for each score that is DONE.
+"""
+import io
+import json
+from itertools import groupby
+from typing import List
+
+import api_logging as logging
+from django.db import IntegrityError, connections, transaction
+from registry.models import Event, Score, ScoreSnapshot
+
+log = logging.getLogger(__name__)
+
+SCORE_COLUMNS = [
+    "passport_id",
+    "score",
+    "last_score_timestamp",
+    "status",
+    "error",
+    "evidence",
+    "stamp_scores",
+]
+
+TEMP_TABLE = "registry_score_upsert"
+
+COPY_NULL = "\\N"
+
+
+def write_scores(
+    scores: List[Score], using: str = "default", emit_events: bool = True
+) -> None:
+    """
+    Insert or update (by passport) the scores. The passport of each score must be loaded. If a
+    passport has several scores in the batch, the last one is written.
+    """
+    if not scores:
+        return
+
+    # ON CONFLICT cannot update the same row twice in one statement
+    scores = list({s.passport_id: s for s in scores}.values())
+
+    with transaction.atomic(using=using):
+        if connections[using].vendor == "postgresql":
+            copy_scores(scores, using)
+        else:
+            Score.objects.using(using).bulk_create(
+                [
+                    Score(**{column: getattr(s, column) for column in SCORE_COLUMNS})
+                    for s in scores
+                ],
+                update_conflicts=True,
+                unique_fields=["passport"],
+                update_fields=SCORE_COLUMNS[1:],
+            )
+
+        if emit_events:
+            record_score_events(
+                [s for s in scores if s.status == Score.Status.DONE], using
+            )
+
+
+def get_copy_rows(scores: List[Score]) -> io.StringIO:
+    """
+    Serialize the scores in the CSV format of COPY. All the values are quoted, and NULL is written
+    as an unquoted `\\N` (a quoted value is never read as NULL).
+    """
+    json_encoders = {
+        column: Score._meta.get_field(column).encoder
+        for column in ["evidence", "stamp_scores"]
+    }
+
+    def format_value(column, value) -> str:
+        if value is None:
+            return COPY_NULL
+        if column in json_encoders:
+            value = json.dumps(value, cls=json_encoders[column])
+        return '"' + str(value).replace('"', '""') + '"'
+
+    buffer = io.StringIO()
+    for score in scores:
+        buffer.write(
+            ",".join(
+                format_value(column, getattr(score, column)) for column in SCORE_COLUMNS
+            )
+        )
+        buffer.write("\n")
+
+    buffer.seek(0)
+    return buffer
+
+
+def copy_scores(scores: List[Score], using: str) -> None:
+    connection = connections[using]
+    table = connection.ops.quote_name(Score._meta.db_table)
+    columns = ", ".join(SCORE_COLUMNS)
+    updates = ", ".join(f"{c} = EXCLUDED.{c}" for c in SCORE_COLUMNS[1:])
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            CREATE TEMPORARY TABLE IF NOT EXISTS {TEMP_TABLE} (
+                passport_id bigint NOT NULL,
+                score numeric(18, 9),
+                last_score_timestamp timestamp with time zone,
+                status varchar(20),
+                error text,
+                evidence jsonb,
+                stamp_scores jsonb
+            ) ON COMMIT DELETE ROWS
+            """
+        )
+        # Rows of a previous call in the same transaction
+        cursor.execute(f"TRUNCATE {TEMP_TABLE}")
+        cursor.copy_expert(
+            f"COPY {TEMP_TABLE} ({columns}) FROM STDIN WITH (FORMAT csv, NULL '{COPY_NULL}')",
+            get_copy_rows(scores),
+        )
+        cursor.execute(
+            f"""
+            INSERT INTO {table} ({columns})
+            SELECT {columns} FROM {TEMP_TABLE}
+            ON CONFLICT (passport_id) DO UPDATE SET {updates}
+            """
+        )
+
+
+def record_score_events(scores: List[Score], using: str) -> None:
+    if not scores:
+        return
+
+    events = Event.objects.using(using).bulk_create(
+        [
+            Event(
+                action=Event.Action.SCORE_UPDATE,
+                address=score.passport.address,
+                community_id=score.passport.community_id,
+                data={
+                    "score": float(score.score) if score.score != None else 0,
+                    "evidence": score.evidence,
+                },
+            )
+            for score in scores
+        ]
+    )
+
+    try:
+        with transaction.atomic(using=using):
+            record_snapshots(events, using)
+    except IntegrityError:
+        # A concurrent score update has opened an interval in the meantime, fall back to recording
+        # the snapshots one by one
+        log.warning("Conflict recording %s score snapshots", len(events))
+        for event in events:
+            ScoreSnapshot.record(event)
+
+
+def record_snapshots(events: List[Event], using: str) -> None:
+    """
+    Close the current intervals of the addresses and open new ones. All the intervals of the batch
+    start at the same time (the creation of the first event), so that no gap is left between the
+    intervals of an address.
+    """
+    valid_from = min(e.created_at for e in events)
+    events = sorted(events, key=lambda e: e.community_id)
+
+    snapshots = []
+    for community_id, community_events in groupby(events, key=lambda e: e.community_id):
+        community_events = list(community_events)
+        ScoreSnapshot.objects.using(using).filter(
+            community_id=community_id,
+            address__in=[e.address for e in community_events],
+            valid_to__isnull=True,
+        ).update(valid_to=valid_from)
+
+        for event in community_events:
+            snapshot = ScoreSnapshot.from_event(event)
+            snapshot.valid_from = valid_from
+            snapshots.append(snapshot)
+
+    ScoreSnapshot.objects.using(using).bulk_create(snapshots)
@@ -0,0 +1,189 @@
+"""
+Process-local index of the stamp metadata (`stampMetadata.json` of the passport app).
+
+The metadata is loaded once per process and then served from memory. When it is older than
+`STAMP_METADATA_REFRESH_INTERVAL`, the stale metadata keeps being served while a background thread
+refreshes it (stale-while-revalidate).
+
+The fetched metadata is shared between the workers through the Django cache. Only the worker
+holding the fetch lock downloads it again, the other workers pick up the result from the cache.
+"""
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import urljoin
+
+import api_logging as logging
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from registry.api.schema import StampDisplayResponse
+
+log = logging.getLogger(__name__)
+
+METADATA_URL = urljoin(settings.PASSPORT_PUBLIC_URL, "stampMetadata.json")
+
+METADATA_CACHE_KEY = "stamp-metadata"
+METADATA_FETCH_LOCK_KEY = "stamp-metadata-fetch-lock"
+METADATA_FETCH_LOCK_TIMEOUT = 60
+
+# (timestamp of the fetch, metadata)
+MetadataEntry = Tuple[float, List[StampDisplayResponse]]
+
+
+def fetch_metadata() -> List[StampDisplayResponse]:
+    response = requests.get(METADATA_URL, timeout=10)
+    response.raise_for_status()
+
+    # Append base URL to icon URLs
+    return [
+        StampDisplayResponse(
+            **{
+                **platformData,
+                "icon": urljoin(settings.PASSPORT_PUBLIC_URL, platformData["icon"]),
+            }
+        )
+        for platformData in response.json()
+    ]
+
+
+def index_by_provider(metadata: List[StampDisplayResponse]) -> Dict[str, dict]:
+    return {
+        stamp.name: {
+            "name": stamp.name,
+            "description": stamp.description,
+            "hash": stamp.hash,
+            "group": group.name,
+            "platform": {
+                "name": platform.name,
+                "id": platform.id,
+                "icon": platform.icon,
+                "description": platform.description,
+                "connectMessage": platform.connectMessage,
+            },
+        }
+        for platform in metadata
+        for group in platform.groups
+        for stamp in group.stamps
+    }
+
+
+class StampMetadataIndex:
+    def __init__(
+        self,
+        refresh_interval: float,
+        max_age: float,
+        retry_interval: float = 60,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.refresh_interval = refresh_interval
+        self.max_age = max_age
+        self.retry_interval = retry_interval
+        self.clock = clock
+        self._fetched_at: Optional[float] = None
+        self._metadata: Optional[List[StampDisplayResponse]] = None
+        self._by_provider: Dict[str, dict] = {}
+        # Held while loading, `_lock` only protects the refresh flag and is never held during I/O
+        self._load_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self._last_refresh = 0.0
+
+    def get_metadata(self) -> Optional[List[StampDisplayResponse]]:
+        self._ensure_loaded()
+        return self._metadata
+
+    def get_by_provider(self) -> Optional[Dict[str, dict]]:
+        self._ensure_loaded()
+        return self._by_provider if self._metadata is not None else None
+
+    def clear(self) -> None:
+        with self._load_lock:
+            self._fetched_at = self._metadata = None
+            self._by_provider = {}
+
+    def _ensure_loaded(self) -> None:
+        if self._metadata is None:
+            # Nothing to serve yet, this request has to wait for the metadata
+            with self._load_lock:
+                if self._metadata is None:
+                    self._load(wait_for_lock=False)
+        elif self.clock() - self._fetched_at >= self.refresh_interval:
+            self._start_refresh()
+
+    def _start_refresh(self) -> None:
+        with self._lock:
+            # Do not hammer the metadata URL or the cache when the refresh keeps failing
+            now = self.clock()
+            if self._refreshing or now - self._last_refresh < self.retry_interval:
+                return
+            self._refreshing = True
+            self._last_refresh = now
+
+        threading.Thread(
+            target=self._refresh, name="stamp-metadata-refresh", daemon=True
+        ).start()
+
+    def _refresh(self) -> None:
+        try:
+            with self._load_lock:
+                self._load(wait_for_lock=True)
+        finally:
+            self._refreshing = False
+
+    def _load(self, wait_for_lock: bool) -> None:
+        """
+        Load the metadata from the shared cache, or fetch it if the shared copy is stale as well.
+        With `wait_for_lock`, the metadata is only fetched if no other worker is fetching it.
+        """
+        entry = self._get_shared_entry()
+        now = self.clock()
+
+        if entry is None or now - entry[0] >= self.refresh_interval:
+            fetch_lock = self._acquire_fetch_lock()
+            if fetch_lock or not wait_for_lock or entry is None:
+                try:
+                    entry = (now, fetch_metadata())
+                    self._set_shared_entry(entry)
+                except Exception:
+                    log.exception("Error fetching external metadata")
+                finally:
+                    if fetch_lock:
+                        self._release_fetch_lock()
+
+        if entry is not None and (
+            self._fetched_at is None or entry[0] > self._fetched_at
+        ):
+            self._fetched_at, self._metadata = entry
+            self._by_provider = index_by_provider(self._metadata)
+
+    def _get_shared_entry(self) -> Optional[MetadataEntry]:
+        try:
+            return cache.get(METADATA_CACHE_KEY)
+        except Exception:
+            log.warning("Failed to read stamp metadata from cache", exc_info=True)
+            return None
+
+    def _set_shared_entry(self, entry: MetadataEntry) -> None:
+        try:
+            cache.set(METADATA_CACHE_KEY, entry, self.max_age)
+        except Exception:
+            log.warning("Failed to write stamp metadata to cache", exc_info=True)
+
+    def _acquire_fetch_lock(self) -> bool:
+        try:
+            return cache.add(METADATA_FETCH_LOCK_KEY, 1, METADATA_FETCH_LOCK_TIMEOUT)
+        except Exception:
+            return True
+
+    def _release_fetch_lock(self) -> None:
+        try:
+            cache.delete(METADATA_FETCH_LOCK_KEY)
+        except Exception:
+            pass
+
+
+stamp_metadata_index = StampMetadataIndex(
+    refresh_interval=settings.STAMP_METADATA_REFRESH_INTERVAL,
+    max_age=settings.STAMP_METADATA_MAX_AGE,
+)
@@ -2,7 +2,9 @@ import api_logging as logging
 from account.models import AccountAPIKeyAnalytics
 from asgiref.sync import async_to_sync
 from celery import shared_task
+from django.conf import settings
 from registry.models import Passport, Score, Stamp
+from registry.rescoring import rescore_flagged_range
 
 from .atasks import ascore_passport
 
@@ -30,6 +32,20 @@ def score_registry_passport(community_id: int, address: str):
     score_passport(community_id, address)
 
 
+@shared_task
+def rescore_passport_range(community_id: int, start_id: int, end_id: int):
+    count = rescore_flagged_range(
+        community_id, start_id, end_id, settings.RESCORE_BATCH_SIZE
+    )
+    log.info(
+        "Rescored %s passports of community %s in range [%s, %s]",
+        count,
+        community_id,
+        start_id,
+        end_id,
+    )
+
+
 def score_passport(community_id: int, address: str):
     passport = load_passport_record(community_id, address)
 
@@ -1,11 +1,16 @@
 import json
+from concurrent.futures import Executor, Future
+from io import StringIO
+from types import SimpleNamespace
+from unittest.mock import patch
 
 import pytest
 from account.models import Community
 from django.conf import settings
 from django.core.management import call_command
 from django.test import override_settings
-from registry.models import Passport, Score, Stamp
+from registry.models import Passport, RescoreCheckpoint, Score, Stamp
+from registry.rescoring import get_changed_providers, get_shards, rescore_passports
 
 pytestmark = pytest.mark.django_db
 
@@ -423,3 +428,168 @@ class TestRecalculatScores:
         Score.objects.filter(passport__community=included_community).count() == len(
             weighted_scorer_passports
         )
+
+
+class InlineExecutor(Executor):
+    """
+    Runs the shards in the test process, forked workers would not see the test transaction
+    """
+
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        future.set_result(fn(*args, **kwargs))
+        return future
+
+
+class TestRecalculateScoresInParallel:
+    @override_settings(GITCOIN_PASSPORT_WEIGHTS=TestRecalculatScores.updated_weights)
+    def test_rescoring_with_workers(
+        self,
+        weighted_scorer_passports,
+        scorer_community_with_weighted_scorer,
+    ):
+        out = StringIO()
+        with patch(
+            "registry.management.commands.recalculate_scores.create_process_executor",
+            return_value=InlineExecutor(),
+        ):
+            call_command("recalculate_scores", workers=2, batch_size=1, stdout=out)
+
+        scores = {
+            s.passport_id: s.score
+            for s in Score.objects.filter(
+                passport__community=scorer_community_with_weighted_scorer
+            )
+        }
+        assert scores == {
+            weighted_scorer_passports[0].id: 75,
+            weighted_scorer_passports[1].id: 76,
+            weighted_scorer_passports[2].id: 77,
+        }
+        assert "3 passports" in out.getvalue()
+
+    def test_shards_cover_all_passports(
+        self, weighted_scorer_passports, scorer_community_with_weighted_scorer
+    ):
+        ids = [p.id for p in weighted_scorer_passports]
+        community_id = scorer_community_with_weighted_scorer.id
+
+        shards = get_shards(community_id, 2)
+        assert len(shards) == 2
+        assert shards[0][0] == min(ids)
+        assert shards[-1][1] == max(ids)
+        assert all(a[1] + 1 == b[0] for a, b in zip(shards, shards[1:]))
+
+        # Never more shards than IDs
+        assert len(get_shards(community_id, 10)) == max(ids) - min(ids) + 1
+        assert get_shards(community_id + 1000, 2) == []
+
+
+class TestResumeRescore:
+    def test_resume_after_failure(
+        self, weighted_scorer_passports, scorer_community_with_weighted_scorer
+    ):
+        ids = [p.id for p in weighted_scorer_passports]
+        rescored = []
+
+        def fail_on_second_batch(scorer, community_id, passports):
+            if rescored:
+                raise RuntimeError("preempted")
+            rescore_passports(scorer, community_id, passports)
+            rescored.extend(p.id for p in passports)
+
+        with patch(
+            "registry.rescoring.rescore_passports", side_effect=fail_on_second_batch
+        ):
+            with pytest.raises(RuntimeError):
+                call_command("recalculate_scores", batch_size=1, stdout=StringIO())
+
+        checkpoint = RescoreCheckpoint.objects.get(job="recalculate_scores")
+        assert checkpoint.last_passport_id == ids[0]
+        assert checkpoint.processed == 1
+        assert checkpoint.total == 3
+        assert not checkpoint.finished
+        assert Score.objects.count() == 1
+
+        out = StringIO()
+        call_command("rescore_status", stdout=out)
+        assert "1/3 passports" in out.getvalue()
+        assert "in progress" in out.getvalue()
+
+        with patch(
+            "registry.rescoring.rescore_passports", wraps=rescore_passports
+        ) as mock_rescore:
+            call_command(
+                "recalculate_scores", batch_size=1, resume=True, stdout=StringIO()
+            )
+
+        # Only the remaining passports are rescored
+        assert [c.args[2][0].id for c in mock_rescore.call_args_list] == ids[1:]
+        assert Score.objects.count() == 3
+
+        checkpoint.refresh_from_db()
+        assert checkpoint.finished
+        assert checkpoint.processed == 3
+
+        # Resuming a finished run does nothing
+        with patch("registry.rescoring.rescore_passports") as mock_rescore:
+            call_command(
+                "recalculate_scores", batch_size=1, resume=True, stdout=StringIO()
+            )
+        assert not mock_rescore.called
+
+    def test_resume_with_other_weights_starts_over(
+        self, weighted_scorer_passports, scorer_community_with_weighted_scorer
+    ):
+        call_command("recalculate_scores", stdout=StringIO())
+        assert RescoreCheckpoint.objects.get().finished
+
+        with override_settings(
+            GITCOIN_PASSPORT_WEIGHTS=TestRecalculatScores.updated_weights
+        ):
+            call_command("recalculate_scores", resume=True, stdout=StringIO())
+
+        assert Score.objects.get(passport=weighted_scorer_passports[0]).score == 75
+        checkpoint = RescoreCheckpoint.objects.get()
+        assert checkpoint.finished
+        assert checkpoint.processed == 3
+
+
+class TestChangedProvidersOnly:
+    def test_get_changed_providers(self):
+        scorer = SimpleNamespace(
+            weights={"Facebook": "1", "Google": "2", "Ens": "3"}, threshold=20
+        )
+
+        assert (
+            get_changed_providers(scorer, {"Facebook": 1.0, "Google": "2", "Ens": "3"})
+            == []
+        )
+        assert get_changed_providers(
+            scorer, {"Facebook": "1", "Google": "5", "Poh": "1"}
+        ) == ["Ens", "Google", "Poh"]
+        # A new threshold changes all the scores
+        assert get_changed_providers(scorer, scorer.weights, 25) is None
+        assert get_changed_providers(scorer, scorer.weights, "20.00000") == []
+
+    def test_only_passports_with_changed_providers_are_rescored(
+        self, weighted_scorer_passports, scorer_community_with_weighted_scorer
+    ):
+        call_command("recalculate_scores", stdout=StringIO())
+
+        new_weights = {**settings.GITCOIN_PASSPORT_WEIGHTS, "Ens": "50"}
+        with override_settings(GITCOIN_PASSPORT_WEIGHTS=new_weights):
+            with patch(
+                "registry.rescoring.rescore_passports", wraps=rescore_passports
+            ) as mock_rescore:
+                call_command(
+                    "recalculate_scores",
+                    changed_providers_only=True,
+                    stdout=StringIO(),
+                )
+
+        # Only the last passport has an Ens stamp
+        rescored = [p.id for c in mock_rescore.call_args_list for p in c.args[2]]
+        assert rescored == [weighted_scorer_passports[2].id]
+        assert Score.objects.get(passport=weighted_scorer_passports[2]).score == 52
+        assert RescoreCheckpoint.objects.get().providers == ["Ens"]
@@ -0,0 +1,142 @@
+import pytest
+from ceramic_cache.models import CeramicCache
+from django.core.management import call_command
+from django.test import override_settings
+from registry.models import HashScorerLink, Passport, Stamp, StoredCredential
+
+pytestmark = pytest.mark.django_db
+
+credential = {
+    "type": ["VerifiableCredential"],
+    "issuer": "did:key:z6MkghvGHLobLEdj1bgRLhS4LPGJAvbMA1tn2zcRyqmYU5LC",
+    "credentialSubject": {"hash": "v0.0.0:1234", "provider": "Google"},
+    "expirationDate": "2099-01-01T00:00:00.000Z",
+}
+
+
+def test_hash_does_not_depend_on_key_order():
+    reordered = dict(reversed(list(credential.items())))
+
+    assert StoredCredential.hash_credential(
+        credential
+    ) == StoredCredential.hash_credential(reordered)
+
+
+def test_compressed_credential_round_trip():
+    stored = StoredCredential.objects.store([credential])
+    stored_credential = stored[StoredCredential.hash_credential(credential)]
+
+    stored_credential.compress()
+    stored_credential.save()
+
+    reloaded = StoredCredential.objects.get(pk=stored_credential.pk)
+    assert reloaded.is_compressed
+    assert reloaded.credential is None
+    assert reloaded.get_credential() == credential
+
+
+@override_settings(FF_CREDENTIAL_STORE="on")
+def test_bulk_upsert_stores_credentials_once(passport_holder_addresses):
+    addresses = [h["address"] for h in passport_holder_addresses[:2]]
+
+    for address in addresses:
+        CeramicCache.objects.bulk_upsert(
+            [CeramicCache(address=address, provider="Google", stamp=credential)]
+        )
+
+    assert StoredCredential.objects.count() == 1
+    assert list(CeramicCache.objects.values_list("stamp", flat=True)) == [{}, {}]
+    for c in CeramicCache.objects.with_credentials():
+        assert c.get_stamp() == credential
+
+
+def test_bulk_upsert_inline_clears_stale_reference(passport_holder_addresses):
+    address = passport_holder_addresses[0]["address"]
+    updated_credential = {**credential, "expirationDate": "2100-01-01T00:00:00.000Z"}
+
+    with override_settings(FF_CREDENTIAL_STORE="on"):
+        CeramicCache.objects.bulk_upsert(
+            [CeramicCache(address=address, provider="Google", stamp=credential)]
+        )
+
+    CeramicCache.objects.bulk_upsert(
+        [CeramicCache(address=address, provider="Google", stamp=updated_credential)]
+    )
+
+    cache = CeramicCache.objects.get(address=address)
+    assert cache.stamp_ref_id is None
+    assert cache.get_stamp() == updated_credential
+
+
+def test_migrate_credentials_to_store(passport_holder_addresses, scorer_community):
+    address = passport_holder_addresses[0]["address"]
+    other_credential = {**credential, "credentialSubject": {"hash": "v0.0.0:5678"}}
+
+    CeramicCache.objects.create(address=address, provider="Google", stamp=credential)
+    CeramicCache.objects.create(
+        address=address, provider="Facebook", stamp=other_credential
+    )
+    passport = Passport.objects.create(address=address, community=scorer_community)
+    Stamp.objects.create(
+        passport=passport, hash="v0.0.0:1234", provider="Google", credential=credential
+    )
+
+    call_command("migrate_credentials_to_store", compress_older_than_days=0)
+
+    assert StoredCredential.objects.count() == 2
+    assert all(s.is_compressed for s in StoredCredential.objects.all())
+
+    stamps = {c.provider: c for c in CeramicCache.objects.filter(address=address)}
+    assert stamps["Google"].stamp == {}
+    assert stamps["Google"].get_stamp() == credential
+    assert stamps["Facebook"].get_stamp() == other_credential
+
+    stamp = Stamp.objects.with_credentials().get(passport=passport)
+    assert stamp.credential == {}
+    assert stamp.credential_ref_id == stamps["Google"].stamp_ref_id
+    assert stamp.get_credential() == credential
+
+
+# The stamps are read from the replica (a mirror of the default database in the tests)
+@pytest.mark.django_db(transaction=True, databases=["default", "read_replica_0"])
+def test_backfill_hash_links_reads_stored_credentials(
+    passport_holder_addresses, scorer_community
+):
+    passport = Passport.objects.create(
+        address=passport_holder_addresses[0]["address"], community=scorer_community
+    )
+    valid_credential = {**credential, "issuanceDate": "2023-01-01T00:00:00.000Z"}
+    expired_credential = {
+        **valid_credential,
+        "expirationDate": "2023-06-01T00:00:00.000Z",
+    }
+    stored = StoredCredential.objects.store([valid_credential, expired_credential])
+    compressed = stored[StoredCredential.hash_credential(valid_credential)]
+    compressed.compress()
+    compressed.save()
+
+    Stamp.objects.create(
+        passport=passport,
+        hash="v0.0.0:inline",
+        provider="Google",
+        credential=valid_credential,
+    )
+    Stamp.objects.create(
+        passport=passport,
+        hash="v0.0.0:stored",
+        provider="Facebook",
+        credential_ref=compressed,
+    )
+    Stamp.objects.create(
+        passport=passport,
+        hash="v0.0.0:expired",
+        provider="Ens",
+        credential_ref=stored[StoredCredential.hash_credential(expired_credential)],
+    )
+
+    call_command("backfill_hash_links", iso_timestamp="2024-01-01T00:00:00+00:00")
+
+    assert sorted(HashScorerLink.objects.values_list("hash", flat=True)) == [
+        "v0.0.0:inline",
+        "v0.0.0:stored",
+    ]
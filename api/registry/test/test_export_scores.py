@@ -0,0 +1,93 @@
+import csv
+import io
+import json
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from django.test import Client
+from registry.models import Passport, Score
+
+pytestmark = pytest.mark.django_db
+
+start = datetime(2023, 1, 1, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def export_scores(passport_holder_addresses, scorer_community):
+    scores = []
+    for i, holder in enumerate(passport_holder_addresses[:3]):
+        passport = Passport.objects.create(
+            address=holder["address"], community=scorer_community
+        )
+        scores.append(
+            Score.objects.create(
+                passport=passport,
+                status="DONE",
+                score=i,
+                last_score_timestamp=start + timedelta(days=i),
+                evidence={"type": "ThresholdScoreCheck", "success": True},
+                stamp_scores={"Google": 1},
+            )
+        )
+    return scores
+
+
+def get_export(scorer_community, scorer_api_key, **data):
+    response = Client().get(
+        f"/registry/v2/score/{scorer_community.id}/export",
+        HTTP_AUTHORIZATION="Token " + scorer_api_key,
+        data=data,
+    )
+    assert response.status_code == 200
+    return response, b"".join(response).decode("utf-8")
+
+
+def test_export_scores_ndjson(export_scores, scorer_community, scorer_api_key):
+    response, content = get_export(scorer_community, scorer_api_key)
+
+    assert response["Content-Type"] == "application/x-ndjson"
+    assert [json.loads(line) for line in content.splitlines()] == [
+        {
+            "address": s.passport.address.lower(),
+            "score": "%.9f" % s.score,
+            "status": "DONE",
+            "last_score_timestamp": s.last_score_timestamp.isoformat(),
+            "evidence": {"type": "ThresholdScoreCheck", "success": True},
+            "error": None,
+            "stamp_scores": {"Google": 1},
+        }
+        for s in export_scores
+    ]
+
+
+def test_export_scores_after_watermark(export_scores, scorer_community, scorer_api_key):
+    _, content = get_export(
+        scorer_community,
+        scorer_api_key,
+        last_score_timestamp__gt=export_scores[0].last_score_timestamp.isoformat(),
+    )
+
+    assert [json.loads(line)["address"] for line in content.splitlines()] == [
+        s.passport.address.lower() for s in export_scores[1:]
+    ]
+
+
+def test_export_scores_csv(export_scores, scorer_community, scorer_api_key):
+    response, content = get_export(scorer_community, scorer_api_key, format="csv")
+
+    assert response["Content-Type"] == "text/csv"
+    rows = list(csv.DictReader(io.StringIO(content)))
+    assert [row["address"] for row in rows] == [
+        s.passport.address.lower() for s in export_scores
+    ]
+    assert json.loads(rows[0]["evidence"]) == export_scores[0].evidence
+    assert rows[0]["error"] == ""
+
+
+def test_export_scores_invalid_format(scorer_community, scorer_api_key):
+    response = Client().get(
+        f"/registry/v2/score/{scorer_community.id}/export",
+        HTTP_AUTHORIZATION="Token " + scorer_api_key,
+        data={"format": "xml"},
+    )
+    assert response.status_code == 400
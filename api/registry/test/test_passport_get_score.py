@@ -207,6 +207,45 @@ class TestPassportGetScore:
             == passport_holder_addresses[0]["address"].lower()
         )
 
+    def test_get_single_score_returns_304_if_not_modified(
+        self,
+        scorer_api_key,
+        passport_holder_addresses,
+        scorer_community,
+        paginated_scores,
+    ):
+        client = Client()
+        url = f"{self.base_url}/score/{scorer_community.id}/{passport_holder_addresses[0]['address']}"
+        response = client.get(url, HTTP_AUTHORIZATION="Token " + scorer_api_key)
+        assert response.status_code == 200
+        etag = response.headers["ETag"]
+        assert response.headers["Last-Modified"]
+
+        response = client.get(
+            url,
+            HTTP_AUTHORIZATION="Token " + scorer_api_key,
+            HTTP_IF_NONE_MATCH=etag,
+        )
+        assert response.status_code == 304
+        assert response.headers["ETag"] == etag
+        assert response.content == b""
+
+        # Once the score changes, the full response is returned again
+        score = paginated_scores[0]
+        score.score = "2"
+        score.last_score_timestamp = score.last_score_timestamp + datetime.timedelta(
+            seconds=1
+        )
+        score.save()
+
+        response = client.get(
+            url,
+            HTTP_AUTHORIZATION="Token " + scorer_api_key,
+            HTTP_IF_NONE_MATCH=etag,
+        )
+        assert response.status_code == 200
+        assert response.headers["ETag"] != etag
+
     def test_cannot_get_single_score_for_address_in_path_for_other_community(
         self,
         passport_holder_addresses,
@@ -7,6 +7,7 @@ from django.contrib.auth import get_user_model
 from django.core.cache import cache
 from django.test import Client
 from registry.api.v1 import fetch_stamp_metadata_for_provider
+from registry.stamp_metadata import stamp_metadata_index
 from web3 import Web3
 
 User = get_user_model()
@@ -137,6 +138,7 @@ class TestPassportGetStamps:
         mocker,
     ):
         cache.clear()
+        stamp_metadata_index.clear()
         with mocker.patch(
             "requests.get", return_value=mocker.Mock(json=lambda: mock_stamp_metadata)
         ):
@@ -155,6 +157,7 @@ class TestPassportGetStamps:
         mocker,
     ):
         cache.clear()
+        stamp_metadata_index.clear()
         with mocker.patch(
             "requests.get", return_value=mocker.Mock(json=lambda: mock_stamp_metadata)
         ):
@@ -168,6 +171,7 @@ class TestPassportGetStamps:
         mocker,
     ):
         cache.clear()
+        stamp_metadata_index.clear()
         with mocker.patch(
             "requests.get", return_value=mocker.Mock(json=lambda: mock_stamp_metadata)
         ):
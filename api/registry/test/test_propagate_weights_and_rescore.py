@@ -2,11 +2,15 @@ import pytest
 from account.deduplication import Rules
 from account.models import Community
 from registry.management.commands.propagate_weights_and_rescore import Command
+from registry.models import Passport, Score, Stamp
+from registry.rescoring import get_chunk_ranges
+from registry.tasks import rescore_passport_range
 
 pytestmark = pytest.mark.django_db
 from unittest.mock import patch
 
 from django.core.management import call_command
+from django.test import override_settings
 
 
 @patch("registry.tasks.score_registry_passport.delay")
@@ -44,3 +48,88 @@ def test_fifo_not_included(scorer_account, scorer_community):
 
     assert scorer_community in communities_to_adjust
     assert fifo_community not in communities_to_adjust
+
+
+def test_update_scores_in_chunks(
+    scorer_community, scorer_passport, scorer_score, capsys
+):
+    Stamp.objects.create(
+        passport=scorer_passport, provider="Google", hash="0x1234", credential={}
+    )
+    unscored_passport = Passport.objects.create(
+        address="0x" + "1" * 40, community=scorer_community, requires_calculation=False
+    )
+
+    with patch(
+        "registry.tasks.rescore_passport_range.delay",
+        side_effect=rescore_passport_range,
+    ) as mock_delay:
+        call_command(
+            "propagate_weights_and_rescore", update_all_scores=True, chunked=True
+        )
+
+    # 1 chunk, the unscored passport is not included
+    mock_delay.assert_called_once_with(
+        scorer_community.pk, scorer_passport.id, scorer_passport.id
+    )
+    captured = capsys.readouterr()
+    assert "Updating scores: 1" in captured.out
+    assert "Dispatched chunks: 1" in captured.out
+
+    scorer_score.refresh_from_db()
+    assert scorer_score.status == Score.Status.DONE
+    assert "Google" in scorer_score.stamp_scores
+
+    scorer_passport.refresh_from_db()
+    assert scorer_passport.requires_calculation is False
+    assert not Score.objects.filter(passport=unscored_passport).exists()
+
+
+def test_get_chunk_ranges(scorer_community):
+    passports = [
+        Passport.objects.create(address=f"0x{i:040x}", community=scorer_community)
+        for i in range(5)
+    ]
+    ids = [p.id for p in passports]
+    queryset = Passport.objects.filter(community=scorer_community)
+
+    assert list(get_chunk_ranges(queryset, 2)) == [
+        (ids[0], ids[1]),
+        (ids[2], ids[3]),
+        (ids[4], ids[4]),
+    ]
+    assert list(get_chunk_ranges(queryset, 5)) == [(ids[0], ids[4])]
+    assert list(get_chunk_ranges(queryset.none(), 5)) == []
+
+
+def test_update_scores_in_chunks_for_changed_providers(
+    scorer_community, scorer_passport, scorer_score, capsys
+):
+    Stamp.objects.create(
+        passport=scorer_passport, provider="Google", hash="0x1234", credential={}
+    )
+    other_passport = Passport.objects.create(
+        address="0x" + "1" * 40, community=scorer_community
+    )
+    Stamp.objects.create(
+        passport=other_passport, provider="Ens", hash="0x12345", credential={}
+    )
+    Score.objects.create(passport=other_passport, score=1)
+
+    weights = {**scorer_community.get_scorer().weights, "Ens": "1000"}
+    with override_settings(GITCOIN_PASSPORT_WEIGHTS=weights):
+        with patch("registry.tasks.rescore_passport_range.delay") as mock_delay:
+            call_command(
+                "propagate_weights_and_rescore",
+                update_all_scores=True,
+                chunked=True,
+                changed_providers_only=True,
+            )
+
+    # Only the passport with an Ens stamp is flagged
+    mock_delay.assert_called_once_with(
+        scorer_community.pk, other_passport.id, other_passport.id
+    )
+    assert "Updating scores: 1" in capsys.readouterr().out
+    scorer_passport.refresh_from_db()
+    assert not scorer_passport.requires_calculation
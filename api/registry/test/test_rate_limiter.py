@@ -0,0 +1,161 @@
+import pytest
+from account.models import AccountAPIKey
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.test import Client, override_settings
+from registry.rate_limiter import (
+    LocalRateLimiter,
+    is_ratelimited,
+    local_rate_limiter,
+    split_rate,
+)
+
+locmem_cache = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture(autouse=True)
+def shared_cache():
+    with override_settings(CACHES=locmem_cache):
+        cache.clear()
+        yield
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+def test_requests_are_synced_in_batches(clock):
+    limiter = LocalRateLimiter(local_share=0.1, sync_interval=60, clock=clock)
+
+    for _ in range(9):
+        assert not limiter.is_ratelimited("prefix", "100/m")
+    assert cache.get("rl-local:prefix:100/m:16") is None
+
+    assert not limiter.is_ratelimited("prefix", "100/m")
+    assert cache.get("rl-local:prefix:100/m:16") == 10
+
+
+def test_limit_is_shared_between_processes(clock):
+    # Allowance of 1 request, every request is synced
+    first = LocalRateLimiter(local_share=0.01, sync_interval=60, clock=clock)
+    second = LocalRateLimiter(local_share=0.01, sync_interval=60, clock=clock)
+
+    assert not first.is_ratelimited("prefix", "4/m")
+    assert not second.is_ratelimited("prefix", "4/m")
+    assert not first.is_ratelimited("prefix", "4/m", cost=2)
+    assert second.is_ratelimited("prefix", "4/m")
+    # The first process knows the global count from its last sync
+    assert first.is_ratelimited("prefix", "4/m")
+
+
+def test_limit_resets_with_the_window(clock):
+    limiter = LocalRateLimiter(local_share=0.5, sync_interval=60, clock=clock)
+
+    assert not limiter.is_ratelimited("prefix", "2/m", cost=2)
+    assert limiter.is_ratelimited("prefix", "2/m")
+
+    clock.now += 60
+    assert not limiter.is_ratelimited("prefix", "2/m")
+
+
+def test_sync_after_interval(clock):
+    limiter = LocalRateLimiter(local_share=0.5, sync_interval=1, clock=clock)
+
+    assert not limiter.is_ratelimited("prefix", "100/m")
+    clock.now += 1
+    assert not limiter.is_ratelimited("prefix", "100/m")
+    assert cache.get("rl-local:prefix:100/m:16") == 2
+
+
+def test_async_rate_limit(clock):
+    limiter = LocalRateLimiter(local_share=0.01, sync_interval=60, clock=clock)
+
+    assert not async_to_sync(limiter.ais_ratelimited)("prefix", "1/m")
+    assert async_to_sync(limiter.ais_ratelimited)("prefix", "1/m")
+    assert cache.get("rl-local:prefix:1/m:16") == 1
+
+
+@pytest.mark.django_db
+@override_settings(RATELIMIT_ENABLE=True, FF_LOCAL_RATE_LIMITER="on")
+def test_check_rate_limit_with_local_rate_limiter(scorer_api_key):
+    local_rate_limiter.clear()
+    client = Client()
+
+    # The rate limit of the API key is 3/30seconds
+    for _ in range(3):
+        response = client.get(
+            "/registry/signing-message", HTTP_X_API_KEY=scorer_api_key
+        )
+        assert response.status_code == 200
+
+    response = client.get("/registry/signing-message", HTTP_X_API_KEY=scorer_api_key)
+    assert response.status_code == 429
+
+
+@override_settings(RATELIMIT_ENABLE=True)
+def test_shared_limit_is_charged_by_cost(clock):
+    assert split_rate("125/15m") == (125, 15 * 60)
+    assert split_rate("3/30seconds") == (3, 30)
+    assert split_rate("10/s") == split_rate("10/") == (10, 1)
+
+    assert not is_ratelimited("prefix", "5/m", clock=clock)
+    assert not is_ratelimited("prefix", "5/m", cost=3, clock=clock)
+    assert cache.get("rl:prefix:5/m:16") == 4
+    assert not is_ratelimited("prefix", "5/m", clock=clock)
+    assert is_ratelimited("prefix", "5/m", clock=clock)
+    # Other API keys have their own counter
+    assert not is_ratelimited("other", "5/m", cost=5, clock=clock)
+
+    clock.now += 60
+    assert not is_ratelimited("prefix", "5/m", cost=5, clock=clock)
+
+
+@override_settings(RATELIMIT_ENABLE=True, RATELIMIT_FAIL_OPEN=False)
+def test_shared_limit_without_cache(clock, mocker):
+    mocker.patch.object(cache, "add", side_effect=ConnectionError)
+
+    assert is_ratelimited("prefix", "5/m", clock=clock)
+
+
+@pytest.mark.django_db
+@override_settings(RATELIMIT_ENABLE=True)
+def test_unlimited_api_key(scorer_account, clock):
+    assert split_rate(None) is None
+    assert split_rate("") is None
+    assert not is_ratelimited("prefix", None, clock=clock)
+
+    # A NULL rate limit is unlimited, like an empty one
+    (_, secret) = AccountAPIKey.objects.create_key(
+        account=scorer_account, name="Unlimited", rate_limit=None
+    )
+    client = Client()
+    for _ in range(5):
+        response = client.get("/registry/signing-message", HTTP_X_API_KEY=secret)
+        assert response.status_code == 200
+
+
+@pytest.mark.django_db
+@override_settings(RATELIMIT_ENABLE=True, FF_LOCAL_RATE_LIMITER="on")
+def test_unlimited_api_key_with_local_rate_limiter(scorer_account, clock):
+    limiter = LocalRateLimiter(local_share=0.1, sync_interval=60, clock=clock)
+    assert not limiter.is_ratelimited("prefix", None)
+    assert not limiter.is_ratelimited("prefix", "")
+    assert not async_to_sync(limiter.ais_ratelimited)("prefix", None)
+
+    local_rate_limiter.clear()
+    (_, secret) = AccountAPIKey.objects.create_key(
+        account=scorer_account, name="Unlimited", rate_limit=None
+    )
+    client = Client()
+    for _ in range(5):
+        response = client.get("/registry/signing-message", HTTP_X_API_KEY=secret)
+        assert response.status_code == 200
@@ -1,7 +1,11 @@
 from datetime import datetime
+from unittest.mock import patch
 
 import pytest
 from account.models import AccountAPIKey, AccountAPIKeyAnalytics
+from django.test import Client, override_settings
+from django.utils import timezone
+from registry.analytics import ApiKeyAnalyticsBuffer
 from registry.tasks import save_api_key_analytics
 
 path = "/test_path/"
@@ -22,3 +26,54 @@ class TestSaveApiKeyAnalytics:
 
         assert created_at_day.day is datetime.now().day
         assert created_at_day.month is datetime.now().month
+
+
+@pytest.fixture
+def analytics_buffer():
+    return ApiKeyAnalyticsBuffer(
+        batch_size=2, flush_interval=1, max_buffer_size=3, background=False
+    )
+
+
+@pytest.mark.django_db
+class TestApiKeyAnalyticsBuffer:
+    def test_flush_writes_buffered_records(self, scorer_account, analytics_buffer):
+        (model, _) = AccountAPIKey.objects.create_key(
+            account=scorer_account, name="Another token for user 1"
+        )
+        before = timezone.now()
+
+        for i in range(3):
+            analytics_buffer.add(model.pk, f"{path}{i}")
+        assert AccountAPIKeyAnalytics.objects.count() == 0
+
+        assert analytics_buffer.flush() == 3
+        assert analytics_buffer.flush() == 0
+
+        records = AccountAPIKeyAnalytics.objects.filter(api_key=model).order_by("path")
+        assert [r.path for r in records] == [f"{path}{i}" for i in range(3)]
+        # The time of the request is kept, not the time of the flush
+        assert all(before <= r.created_at <= timezone.now() for r in records)
+
+    def test_full_buffer_drops_records(self, scorer_account, analytics_buffer):
+        (model, _) = AccountAPIKey.objects.create_key(
+            account=scorer_account, name="Another token for user 1"
+        )
+
+        for _ in range(5):
+            analytics_buffer.add(model.pk, path)
+
+        assert analytics_buffer.dropped == 2
+        assert analytics_buffer.flush() == 3
+
+    @override_settings(FF_API_ANALYTICS="on")
+    def test_api_request_is_buffered(self, scorer_api_key, analytics_buffer):
+        with patch("registry.api.utils.api_key_analytics_buffer", analytics_buffer):
+            response = Client().get(
+                "/registry/signing-message", HTTP_X_API_KEY=scorer_api_key
+            )
+        assert response.status_code == 200
+
+        assert AccountAPIKeyAnalytics.objects.count() == 0
+        analytics_buffer.flush()
+        assert AccountAPIKeyAnalytics.objects.get().path == "/registry/signing-message"
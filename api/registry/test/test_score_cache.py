@@ -0,0 +1,124 @@
+import pytest
+import registry.score_cache
+from django.core.cache import cache
+from django.test import Client, override_settings
+from registry.models import Score
+from registry.score_cache import (
+    get_cached_score,
+    invalidate_scores,
+    local_score_cache,
+    score_cache_stats,
+)
+
+pytestmark = pytest.mark.django_db
+
+locmem_cache = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+
+@pytest.fixture(autouse=True)
+def score_response_cache():
+    with override_settings(FF_SCORE_RESPONSE_CACHE="on", CACHES=locmem_cache):
+        cache.clear()
+        local_score_cache.clear()
+        yield
+        local_score_cache.clear()
+
+
+@pytest.fixture
+def cached_score(scorer_passport):
+    return Score.objects.create(
+        passport=scorer_passport,
+        status="DONE",
+        score=1,
+        evidence={
+            "type": "ThresholdScoreCheck",
+            "success": True,
+            "rawScore": 1,
+            "threshold": 1,
+        },
+    )
+
+
+def test_cached_score_is_read_without_query(
+    cached_score, scorer_passport, django_assert_num_queries
+):
+    community_id = scorer_passport.community_id
+
+    assert get_cached_score(community_id, scorer_passport.address.upper()) is not None
+    # The local tier is skipped, the entry is read from the shared cache
+    local_score_cache.clear()
+    with django_assert_num_queries(0):
+        for _ in range(2):
+            entry = get_cached_score(community_id, scorer_passport.address)
+
+    assert entry.get_response().score == "1.000000000"
+    stats = score_cache_stats()
+    assert stats["shared"]["hits"] >= 1
+    assert stats["local"]["hits"] == 1
+
+
+def test_score_save_invalidates_cache(
+    cached_score, scorer_passport, django_capture_on_commit_callbacks
+):
+    community_id = scorer_passport.community_id
+    get_cached_score(community_id, scorer_passport.address)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        cached_score.score = 2
+        cached_score.save()
+
+    entry = get_cached_score(community_id, scorer_passport.address)
+    assert entry.get_response().score == "2.000000000"
+
+
+def test_read_racing_with_score_update_is_not_cached(
+    cached_score, scorer_passport, mocker
+):
+    community_id = scorer_passport.community_id
+    build_cached_score = registry.score_cache.build_cached_score
+
+    def update_score_during_read(score, *args):
+        # The reader has loaded the old score, the writer commits and invalidates before the reader
+        # stores its entry
+        Score.objects.filter(id=cached_score.id).update(score=2)
+        invalidate_scores(community_id, [scorer_passport.address])
+        return build_cached_score(score, *args)
+
+    mocker.patch(
+        "registry.score_cache.build_cached_score",
+        side_effect=update_score_during_read,
+    )
+    stale_entry = get_cached_score(community_id, scorer_passport.address)
+    assert stale_entry.get_response().score == "1.000000000"
+
+    mocker.stopall()
+    # Another process, without the stale entry in its local tier
+    local_score_cache.clear()
+    entry = get_cached_score(community_id, scorer_passport.address)
+    assert entry.get_response().score == "2.000000000"
+
+
+def test_get_score_from_cache(cached_score, scorer_passport, scorer_api_key):
+    client = Client()
+    url = f"/registry/v2/score/{scorer_passport.community_id}/{scorer_passport.address}"
+
+    response = client.get(url, HTTP_AUTHORIZATION="Token " + scorer_api_key)
+    assert response.status_code == 200
+    assert response.json()["score"] == "1.000000000"
+    assert response.json()["address"] == scorer_passport.address.lower()
+
+    not_modified = client.get(
+        url,
+        HTTP_AUTHORIZATION="Token " + scorer_api_key,
+        HTTP_IF_NONE_MATCH=response["ETag"],
+    )
+    assert not_modified.status_code == 304
+
+
+def test_missing_score_is_not_cached(scorer_passport, scorer_api_key):
+    response = Client().get(
+        f"/registry/v2/score/{scorer_passport.community_id}/{scorer_passport.address}",
+        HTTP_AUTHORIZATION="Token " + scorer_api_key,
+    )
+    assert response.status_code == 400
+    assert len(local_score_cache) == 0
@@ -0,0 +1,106 @@
+import json
+from io import StringIO
+
+import pyarrow.parquet as pq
+import pytest
+from django.core.management import call_command
+from registry.models import Passport, Score, Stamp
+from registry.score_impact import iter_score_chunks
+
+pytestmark = pytest.mark.django_db
+
+old_weights = {"Facebook": "1", "Google": "2", "Ens": "3"}
+new_weights = {"Facebook": "1", "Google": "10", "Ens": "3", "Poh": "4"}
+
+
+@pytest.fixture(name="impact_passports")
+def fixture_impact_passports(scorer_community_with_binary_scorer):
+    community = scorer_community_with_binary_scorer
+    scorer = community.get_scorer()
+    scorer.weights = old_weights
+    scorer.threshold = 5
+    scorer.save()
+
+    providers_per_passport = [
+        [],
+        ["Facebook"],
+        ["Facebook", "Google"],
+        ["Google", "Ens", "Unknown"],
+        ["Ens", "Poh"],
+    ]
+    passports = []
+    for i, providers in enumerate(providers_per_passport):
+        passport = Passport.objects.create(address=f"0x{i:040x}", community=community)
+        for provider in providers:
+            Stamp.objects.create(
+                passport=passport,
+                provider=provider,
+                hash=f"{provider}-{i}",
+                credential={},
+            )
+        passports.append(passport)
+    # A provider held twice is only counted once
+    Stamp.objects.create(
+        passport=passports[2], provider="Google", hash="Google-2-bis", credential={}
+    )
+    return passports
+
+
+def test_chunk_scores(impact_passports, scorer_community_with_binary_scorer):
+    chunks = list(
+        iter_score_chunks(
+            scorer_community_with_binary_scorer.id,
+            old_weights,
+            new_weights,
+            chunk_size=2,
+            database="default",
+        )
+    )
+
+    assert [len(c.passport_ids) for c in chunks] == [2, 2, 1]
+    assert [s for c in chunks for s in c.old_scores] == [0, 1, 3, 5, 3]
+    assert [s for c in chunks for s in c.new_scores] == [0, 1, 11, 13, 7]
+
+
+def test_score_impact_report(
+    impact_passports, scorer_community_with_binary_scorer, tmp_path
+):
+    weights_file = tmp_path / "weights.json"
+    weights_file.write_text(json.dumps(new_weights))
+    output = tmp_path / "diff.parquet"
+
+    out = StringIO()
+    call_command(
+        "score_impact_report",
+        weights=str(weights_file),
+        threshold=7,
+        chunk_size=2,
+        output=str(output),
+        top=2,
+        stdout=out,
+    )
+    report = out.getvalue()
+
+    assert "Passports: 5" in report
+    assert "Changed: 3" in report
+    # Passport 2 (3 -> 11) and 4 (3 -> 7) now pass, passport 3 (5 -> 13) still passes
+    assert "Now passing the threshold: 2" in report
+    assert "Now failing the threshold: 0" in report
+    assert "[3, 4): 2 -> 0" in report
+    assert f"passport {impact_passports[2].id} " in report
+    assert f"passport {impact_passports[3].id} " in report
+    assert f"passport {impact_passports[4].id} " not in report
+
+    diff = pq.read_table(output).to_pylist()
+    assert [row["passport_id"] for row in diff] == [p.id for p in impact_passports[2:]]
+    assert diff[0]["address"] == impact_passports[2].address
+    assert diff[0]["old_score"] == 3
+    assert diff[0]["new_score"] == 11
+    assert diff[0]["old_passing"] is False
+    assert diff[0]["new_passing"] is True
+
+    # Dry-run: nothing is written
+    assert Score.objects.count() == 0
+    scorer = scorer_community_with_binary_scorer.get_scorer()
+    scorer.refresh_from_db()
+    assert scorer.weights == old_weights
@@ -0,0 +1,88 @@
+import pytest
+from django.test import Client, override_settings
+from registry.models import Passport, Score
+
+pytestmark = pytest.mark.django_db
+
+locmem_cache = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+
+@pytest.fixture
+def lookup_scores(passport_holder_addresses, scorer_community):
+    scores = []
+    for i, holder in enumerate(passport_holder_addresses[:2]):
+        passport = Passport.objects.create(
+            address=holder["address"].lower(), community=scorer_community
+        )
+        scores.append(
+            Score.objects.create(
+                passport=passport,
+                status="DONE",
+                score=i + 1,
+                evidence={
+                    "type": "ThresholdScoreCheck",
+                    "success": True,
+                    "rawScore": i + 1,
+                    "threshold": 1,
+                },
+                stamp_scores={"Google": 1},
+            )
+        )
+    return scores
+
+
+def post_lookup(scorer_community, scorer_api_key, addresses):
+    return Client().post(
+        f"/registry/v2/score/{scorer_community.id}/lookup",
+        {"addresses": addresses},
+        content_type="application/json",
+        HTTP_AUTHORIZATION="Token " + scorer_api_key,
+    )
+
+
+def test_lookup_scores_in_input_order(
+    lookup_scores, passport_holder_addresses, scorer_community, scorer_api_key
+):
+    first, second, missing = [h["address"] for h in passport_holder_addresses[:3]]
+
+    response = post_lookup(
+        scorer_community, scorer_api_key, [second, missing, first.upper()]
+    )
+
+    assert response.status_code == 200
+    items = response.json()
+    assert [(i["address"], i["found"]) for i in items] == [
+        (second.lower(), True),
+        (missing.lower(), False),
+        (first.upper().lower(), True),
+    ]
+    assert items[0]["score"]["score"] == "2.000000000"
+    assert items[0]["score"]["address"] == second.lower()
+    assert items[1]["score"] is None
+    assert items[2]["score"]["score"] == "1.000000000"
+
+
+def test_lookup_scores_rejects_invalid_address(scorer_community, scorer_api_key):
+    response = post_lookup(scorer_community, scorer_api_key, ["0xinvalid"])
+    assert response.status_code == 400
+
+
+@override_settings(SCORE_LOOKUP_MAX_ADDRESSES=2)
+def test_lookup_scores_rejects_too_many_addresses(
+    passport_holder_addresses, scorer_community, scorer_api_key
+):
+    addresses = [h["address"] for h in passport_holder_addresses[:3]]
+
+    assert post_lookup(scorer_community, scorer_api_key, addresses).status_code == 400
+    assert post_lookup(scorer_community, scorer_api_key, []).status_code == 400
+
+
+@override_settings(RATELIMIT_ENABLE=True, CACHES=locmem_cache)
+def test_lookup_scores_rate_limit_cost_is_batch_size(
+    passport_holder_addresses, scorer_community, scorer_api_key
+):
+    # The rate limit of the API key is 3/30seconds, a batch of 2 addresses counts as 2 requests
+    addresses = [h["address"] for h in passport_holder_addresses[:2]]
+
+    assert post_lookup(scorer_community, scorer_api_key, addresses).status_code == 200
+    assert post_lookup(scorer_community, scorer_api_key, addresses).status_code == 429
@@ -0,0 +1,95 @@
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+import pytest
+from django.core.management import call_command
+from django.test import Client, override_settings
+from registry.models import Event, Score, ScoreSnapshot
+
+pytestmark = pytest.mark.django_db
+
+start = datetime(2023, 1, 1, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def score_events(passport_holder_addresses, scorer_community):
+    """
+    3 score updates for the first address and 1 for the second address, 1 day apart
+    """
+    addresses = [h["address"].lower() for h in passport_holder_addresses[:2]]
+    for day, (address, score) in enumerate(
+        [(addresses[0], 1), (addresses[1], 10), (addresses[0], 2), (addresses[0], 3)]
+    ):
+        event = Event.objects.create(
+            action=Event.Action.SCORE_UPDATE,
+            address=address,
+            community=scorer_community,
+            data={"score": score, "evidence": None},
+        )
+        Event.objects.filter(pk=event.pk).update(created_at=start + timedelta(days=day))
+
+    return addresses
+
+
+def test_score_update_records_snapshots(scorer_passport):
+    score = Score.objects.create(passport=scorer_passport, status="DONE", score=1)
+    score.score = 2
+    score.save()
+
+    first, second = ScoreSnapshot.objects.order_by("id")
+
+    assert first.score == Decimal(1)
+    assert first.valid_to == second.valid_from
+    assert second.score == Decimal(2)
+    assert second.valid_to is None
+
+
+def test_backfill_score_snapshots(score_events, scorer_community):
+    first_address, second_address = score_events
+
+    call_command("backfill_score_snapshots")
+    # Rebuilding replaces the existing snapshots
+    call_command("backfill_score_snapshots", community_id=[scorer_community.id])
+
+    snapshots = list(
+        ScoreSnapshot.objects.filter(address=first_address)
+        .order_by("valid_from")
+        .values_list("score", "valid_from", "valid_to")
+    )
+    assert snapshots == [
+        (Decimal(1), start, start + timedelta(days=2)),
+        (Decimal(2), start + timedelta(days=2), start + timedelta(days=3)),
+        (Decimal(3), start + timedelta(days=3), None),
+    ]
+    assert list(
+        ScoreSnapshot.objects.filter(address=second_address).values_list(
+            "score", "valid_to"
+        )
+    ) == [(Decimal(10), None)]
+
+
+@override_settings(FF_SCORE_HISTORY_SNAPSHOTS="on")
+def test_score_history_from_snapshots(score_events, scorer_community, scorer_api_key):
+    first_address, second_address = score_events
+    call_command("backfill_score_snapshots")
+
+    client = Client()
+    url = f"/registry/v2/score/{scorer_community.id}/history"
+
+    def get_scores(**data):
+        response = client.get(
+            url, HTTP_AUTHORIZATION="Token " + scorer_api_key, data=data
+        )
+        assert response.status_code == 200
+        return {i["address"]: i["score"] for i in response.json()["items"]}
+
+    as_of = start + timedelta(days=2, hours=12)
+    assert get_scores(created_at=as_of.isoformat()) == {
+        first_address: "2.0",
+        second_address: "10.0",
+    }
+    assert get_scores(created_at=start.isoformat()) == {first_address: "1.0"}
+    assert get_scores(created_at=as_of.isoformat(), address=first_address) == {
+        first_address: "2.0"
+    }
+    assert get_scores() == {first_address: "3.0", second_address: "10.0"}
@@ -0,0 +1,124 @@
+from datetime import datetime, timezone
+from decimal import Decimal
+
+import pytest
+from django.db import connection
+from registry.models import Event, Passport, Score, ScoreSnapshot
+from registry.score_writer import get_copy_rows, write_scores
+
+pytestmark = pytest.mark.django_db
+
+timestamp = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def make_score(passport, score, status=Score.Status.DONE):
+    return Score(
+        passport=passport,
+        score=Decimal(score),
+        status=status,
+        last_score_timestamp=timestamp,
+        evidence={"type": "ThresholdScoreCheck", "rawScore": str(score)},
+        error=None,
+        stamp_scores={"Google": score},
+    )
+
+
+@pytest.fixture
+def passports(scorer_community):
+    return [
+        Passport.objects.create(address=f"0x{i:040x}", community=scorer_community)
+        for i in range(3)
+    ]
+
+
+def test_write_scores_inserts_and_updates(passports):
+    existing = Score.objects.create(passport=passports[0], score=1)
+
+    write_scores([make_score(p, i + 10) for i, p in enumerate(passports)])
+
+    scores = {s.passport_id: s for s in Score.objects.all()}
+    assert len(scores) == 3
+    # The existing row is updated in place
+    assert scores[passports[0].id].id == existing.id
+    assert scores[passports[0].id].score == Decimal(10)
+    assert scores[passports[2].id].score == Decimal(12)
+    assert scores[passports[2].id].evidence["rawScore"] == "12"
+    assert scores[passports[2].id].stamp_scores == {"Google": 12}
+
+
+def test_write_scores_records_events_and_snapshots(passports):
+    write_scores(
+        [make_score(passports[0], 1), make_score(passports[1], 1, status=None)]
+    )
+    write_scores([make_score(passports[0], 2)])
+
+    events = list(Event.objects.filter(action=Event.Action.SCORE_UPDATE))
+    assert [e.data["score"] for e in events] == [1, 2]
+    assert {e.address for e in events} == {passports[0].address}
+
+    first, second = ScoreSnapshot.objects.order_by("id")
+    assert first.score == Decimal(1)
+    assert first.valid_to == second.valid_from
+    assert second.score == Decimal(2)
+    assert second.valid_to is None
+
+
+def test_write_scores_without_events(passports):
+    write_scores([make_score(passports[0], 1)], emit_events=False)
+
+    assert Score.objects.count() == 1
+    assert not Event.objects.exists()
+    assert not ScoreSnapshot.objects.exists()
+
+
+def test_copy_rows(passports):
+    score = make_score(passports[0], 3)
+    score.evidence = None
+    score.error = ""
+
+    # NULL is an unquoted \N, the empty string is quoted
+    assert get_copy_rows([score]).getvalue() == (
+        f'"{passports[0].id}","3","2024-01-01 00:00:00+00:00","DONE","",\\N,'
+        '"{""Google"": 3}"\n'
+    )
+
+
+def test_write_scores_keeps_last_score_of_a_passport(passports):
+    write_scores([make_score(passports[0], 1), make_score(passports[0], 2)])
+
+    assert Score.objects.get().score == Decimal(2)
+    assert Event.objects.filter(action=Event.Action.SCORE_UPDATE).count() == 1
+
+
+@pytest.mark.skipif(
+    connection.vendor != "postgresql", reason="COPY is only used on PostgreSQL"
+)
+def test_copy_scores(passports):
+    existing = Score.objects.create(passport=passports[0], score=1)
+    score = make_score(passports[1], 5)
+    score.error = 'quoted "error", with a comma'
+    score.evidence = None
+
+    write_scores(
+        [
+            make_score(passports[0], 10),
+            score,
+            # Duplicate passport in the batch, the last score is kept
+            make_score(passports[2], 11),
+            make_score(passports[2], 12),
+        ]
+    )
+
+    scores = {s.passport_id: s for s in Score.objects.all()}
+    assert len(scores) == 3
+    # Updated on conflict
+    assert scores[passports[0].id].id == existing.id
+    assert scores[passports[0].id].score == Decimal(10)
+    assert scores[passports[0].id].status == Score.Status.DONE
+    assert scores[passports[0].id].last_score_timestamp == timestamp
+    assert scores[passports[0].id].stamp_scores == {"Google": 10}
+    # Inserted
+    assert scores[passports[1].id].error == 'quoted "error", with a comma'
+    assert scores[passports[1].id].evidence is None
+    assert scores[passports[2].id].score == Decimal(12)
+    assert scores[passports[2].id].evidence["rawScore"] == "12"
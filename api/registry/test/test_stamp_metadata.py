@@ -0,0 +1,104 @@
+import threading
+
+import pytest
+from django.core.cache import cache
+from django.test import override_settings
+from registry.stamp_metadata import StampMetadataIndex
+from registry.test.test_passport_get_stamps import mock_stamp_metadata
+
+locmem_cache = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture(autouse=True)
+def shared_cache():
+    with override_settings(CACHES=locmem_cache):
+        cache.clear()
+        yield
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+@pytest.fixture
+def requests_get(mocker):
+    return mocker.patch(
+        "requests.get", return_value=mocker.Mock(json=lambda: mock_stamp_metadata)
+    )
+
+
+def wait_for_refresh():
+    for thread in threading.enumerate():
+        if thread.name == "stamp-metadata-refresh":
+            thread.join()
+
+
+def test_metadata_is_loaded_once(clock, requests_get):
+    index = StampMetadataIndex(refresh_interval=60, max_age=3600, clock=clock)
+
+    for _ in range(3):
+        assert index.get_by_provider()["Provider1"]["platform"]["id"] == "TestPlatform"
+
+    assert requests_get.call_count == 1
+
+
+def test_metadata_is_shared_between_workers(clock, requests_get):
+    first = StampMetadataIndex(refresh_interval=60, max_age=3600, clock=clock)
+    second = StampMetadataIndex(refresh_interval=60, max_age=3600, clock=clock)
+
+    assert first.get_metadata() == second.get_metadata()
+    assert requests_get.call_count == 1
+
+
+def test_stale_metadata_is_served_while_refreshing(clock, requests_get, mocker):
+    index = StampMetadataIndex(refresh_interval=60, max_age=3600, clock=clock)
+    assert "Provider1" in index.get_by_provider()
+
+    renamed_metadata = [
+        {
+            **mock_stamp_metadata[0],
+            "groups": [
+                {
+                    "name": "Test",
+                    "stamps": [{"name": "Renamed", "description": "", "hash": ""}],
+                }
+            ],
+        }
+    ]
+    release_fetch = threading.Event()
+
+    def slow_get(*args, **kwargs):
+        release_fetch.wait()
+        return mocker.Mock(json=lambda: renamed_metadata)
+
+    requests_get.side_effect = slow_get
+    clock.now += 60
+
+    # The stale metadata is returned right away, the refresh runs in the background
+    assert "Provider1" in index.get_by_provider()
+    release_fetch.set()
+    wait_for_refresh()
+
+    assert list(index.get_by_provider().keys()) == ["Renamed"]
+    assert requests_get.call_count == 2
+
+
+def test_failed_refresh_keeps_stale_metadata(clock, requests_get):
+    index = StampMetadataIndex(refresh_interval=60, max_age=3600, clock=clock)
+    index.get_metadata()
+
+    requests_get.side_effect = Exception("Unavailable")
+    clock.now += 60
+    index.get_metadata()
+    wait_for_refresh()
+
+    assert "Provider1" in index.get_by_provider()
@@ -5,10 +5,13 @@ from unittest.mock import patch
 import pytest
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.db import connection
 from django.test import Client
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 from registry.models import Event, Passport, Score
 from registry.test.test_passport_get_score import TestPassportGetScore
+from registry.utils import encode_cursor
 from web3 import Web3
 
 User = get_user_model()
@@ -647,6 +650,126 @@ class TestPassportGetScoreV2(TestPassportGetScore):
             for s in newer_scores
         ]
 
+    def test_v2_get_scores_pages_with_one_score_query_and_keep_filters(
+        self,
+        scorer_api_key,
+        passport_holder_addresses,
+        scorer_community,
+        paginated_scores,
+    ):
+        newer_scores = paginated_scores[1:]
+        client = Client()
+        url = f"{self.base_url}/score/{scorer_community.id}"
+        data = {
+            "last_score_timestamp__gt": paginated_scores[
+                0
+            ].last_score_timestamp.isoformat(),
+            "limit": 2,
+        }
+
+        addresses = []
+        while url:
+            with CaptureQueriesContext(connection) as queries:
+                response = client.get(
+                    url, HTTP_AUTHORIZATION="Token " + scorer_api_key, data=data
+                )
+            assert response.status_code == 200
+
+            score_queries = [q for q in queries if 'FROM "registry_score"' in q["sql"]]
+            assert len(score_queries) == 1
+
+            response_data = response.json()
+            addresses += [item["address"] for item in response_data["items"]]
+            url, data = response_data["next"], None
+
+        assert addresses == [s.passport.address.lower() for s in newer_scores]
+
+    def test_v2_get_scores_pages_through_scores_without_timestamp(
+        self,
+        scorer_api_key,
+        scorer_community,
+        paginated_scores,
+    ):
+        Score.objects.filter(
+            id__in=[paginated_scores[1].id, paginated_scores[3].id]
+        ).update(last_score_timestamp=None)
+        # Scores without timestamp come last
+        expected = [
+            s.passport.address.lower()
+            for s in paginated_scores
+            if s not in (paginated_scores[1], paginated_scores[3])
+        ] + [
+            paginated_scores[1].passport.address.lower(),
+            paginated_scores[3].passport.address.lower(),
+        ]
+
+        client = Client()
+        url = f"{self.base_url}/score/{scorer_community.id}?limit=2"
+        pages = []
+        while url:
+            response_data = client.get(
+                url, HTTP_AUTHORIZATION="Token " + scorer_api_key
+            ).json()
+            pages.append([item["address"] for item in response_data["items"]])
+            url, prev_url = response_data["next"], response_data["prev"]
+
+        assert [address for page in pages for address in page] == expected
+
+        # Back from the last page, which starts in the NULL tier
+        response_data = client.get(
+            prev_url, HTTP_AUTHORIZATION="Token " + scorer_api_key
+        ).json()
+        assert [item["address"] for item in response_data["items"]] == pages[-2]
+
+    def test_v2_get_scores_accepts_cursor_without_key(
+        self,
+        scorer_api_key,
+        scorer_community,
+        paginated_scores,
+    ):
+        # Format of the cursors issued before the values of the sort fields were stored in `k`
+        token = encode_cursor(
+            d="next",
+            id=paginated_scores[1].id,
+            last_score_timestamp=paginated_scores[1].last_score_timestamp.isoformat(),
+            address=None,
+            last_score_timestamp__gt="",
+            last_score_timestamp__gte="",
+        )
+
+        client = Client()
+        response = client.get(
+            f"{self.base_url}/score/{scorer_community.id}",
+            HTTP_AUTHORIZATION="Token " + scorer_api_key,
+            data={"token": token, "limit": 2},
+        )
+
+        assert response.status_code == 200
+        assert [item["address"] for item in response.json()["items"]] == [
+            s.passport.address.lower() for s in paginated_scores[2:4]
+        ]
+
+    @pytest.mark.parametrize(
+        "token",
+        [
+            encode_cursor(d="next", id=1),
+            encode_cursor(d="next", k=["not a timestamp", 1]),
+            encode_cursor(k=[None, 1]),
+            "not a token",
+        ],
+    )
+    def test_v2_get_scores_with_invalid_cursor(
+        self, scorer_api_key, scorer_community, paginated_scores, token
+    ):
+        client = Client()
+        response = client.get(
+            f"{self.base_url}/score/{scorer_community.id}",
+            HTTP_AUTHORIZATION="Token " + scorer_api_key,
+            data={"token": token},
+        )
+
+        assert response.status_code == 400
+
     def test_get_scores_with_shuffled_ids(
         self,
         scorer_api_key,
@@ -1,19 +1,20 @@
 import base64
 import json
+from dataclasses import dataclass
 from datetime import datetime, timezone
 from functools import wraps
-from typing import Tuple
+from typing import List, Optional, Sequence, Tuple
 from urllib.parse import unquote, urlencode
 
 import api_logging as logging
 import didkit
 from django.conf import settings
-from django.db.models import Q
-from django.forms.models import model_to_dict
+from django.core.exceptions import ValidationError
+from django.db.models import BooleanField, F, Func, Q, QuerySet, Value
 from django.shortcuts import render
 from django.urls import reverse_lazy
 from eth_account.messages import encode_defunct
-from registry.exceptions import NoRequiredPermissionsException
+from registry.exceptions import InvalidCursorException, NoRequiredPermissionsException
 from registry.models import Stamp
 from web3 import Web3
 
@@ -147,7 +148,13 @@ def encode_cursor(**kwargs) -> str:
 
 def decode_cursor(token: str) -> dict:
     if token:
-        return json.loads(base64.urlsafe_b64decode(token).decode("utf-8"))
+        try:
+            cursor = json.loads(base64.urlsafe_b64decode(token).decode("utf-8"))
+        except ValueError:
+            raise InvalidCursorException()
+        if not isinstance(cursor, dict):
+            raise InvalidCursorException()
+        return cursor
     return {}
 
 
@@ -155,116 +162,176 @@ def get_utc_time():
     return datetime.now(timezone.utc)
 
 
-def get_cursor_tokens_for_results(
-    base_query, domain, scores, sort_fields, limit, http_query_args, endpoint
-):
-    prev_url = None
-    next_url = None
-    has_more_scores = None
-    has_prev_scores = None
+class RowValueComparison(Func):
+    """
+    Compares row values, for example `(last_score_timestamp, id) > (%s, %s)`.
+    Unlike the equivalent OR-expanded condition, this can be satisfied by a range scan on a composite index.
+    """
 
-    if scores:
-        prev_values = model_to_dict(scores[0])
-        next_values = model_to_dict(scores[-1])
+    output_field = BooleanField()
 
-        next_cursor = dict(
-            d="next",
-        )
-        prev_cursor = dict(
-            d="prev",
+    def __init__(self, fields: Sequence[str], values: Sequence, operator: str):
+        super().__init__(
+            Func(*[F(field) for field in fields], template="(%(expressions)s)"),
+            Func(*[Value(value) for value in values], template="(%(expressions)s)"),
+            template="%(expressions)s",
+            arg_joiner=f" {operator} ",
         )
 
-        for field_name in sort_fields:
-            next_cursor[field_name] = next_values[field_name]
-            prev_cursor[field_name] = prev_values[field_name]
 
-        next_filter_cond, _ = get_cursor_query_condition(next_cursor, sort_fields)
-        prev_filter_cond, _ = get_cursor_query_condition(prev_cursor, sort_fields)
+def get_cursor_key(cursor: dict, model_fields: list) -> list:
+    """
+    Returns the values of the sort fields in the cursor. Cursors issued before the values were
+    stored in `k` have the value of each field under its name.
+    """
+    if "k" in cursor:
+        key = cursor["k"]
+    elif all(field.name in cursor for field in model_fields):
+        key = [cursor[field.name] for field in model_fields]
+    else:
+        raise InvalidCursorException()
+
+    if not isinstance(key, list) or len(key) != len(model_fields):
+        raise InvalidCursorException()
+    try:
+        return [
+            field.to_python(value) if value is not None else None
+            for field, value in zip(model_fields, key)
+        ]
+    except ValidationError:
+        raise InvalidCursorException()
+
+
+def get_keyset_condition(
+    model_fields: list, sort_fields: List[str], key: list, is_ascending: bool
+) -> Q:
+    """
+    Condition selecting the rows after `key` in the order of the page.
 
-        has_more_scores = base_query.filter(next_filter_cond).exists()
-        has_prev_scores = base_query.filter(prev_filter_cond).exists()
+    A row value comparison with NULL is never true, so the NULLs of a nullable leading sort field are
+    handled separately: they are sorted after all the other values (as `NULLS LAST` in ascending
+    order). The other sort fields must not be nullable.
+    """
+    operator = ">" if is_ascending else "<"
+    if not model_fields[0].null:
+        return Q(RowValueComparison(sort_fields, key, operator))
+
+    is_null = Q(**{f"{sort_fields[0]}__isnull": True})
+    if key[0] is None:
+        # Rows after the key in the NULL tier
+        null_tier = (
+            is_null & Q(RowValueComparison(sort_fields[1:], key[1:], operator))
+            if len(sort_fields) > 1
+            else Q(pk__in=[])
+        )
+        return null_tier if is_ascending else null_tier | ~is_null
 
-    next_url = (
-        f"""{domain}{reverse_lazy_with_query(
-            f"registry_v2:{endpoint}",
-            args=http_query_args,
-            query_kwargs={"token": encode_cursor(**next_cursor), "limit": limit},
-        )}"""
-        if has_more_scores
-        else None
-    )
+    condition = Q(RowValueComparison(sort_fields, key, operator))
+    return condition | is_null if is_ascending else condition
 
-    prev_url = (
-        f"""{domain}{reverse_lazy_with_query(
-            f"registry_v2:{endpoint}",
-            args=http_query_args,
-            query_kwargs={"token": encode_cursor(**prev_cursor), "limit": limit},
-        )}"""
-        if has_prev_scores
-        else None
-    )
 
-    return {
-        "prev": prev_url,
-        "next": next_url,
-    }
+@dataclass
+class KeysetPage:
+    items: List
+    next_cursor: Optional[dict]
+    prev_cursor: Optional[dict]
 
 
-def get_cursor_query_condition(cursor, sort_fields):
+def get_keyset_page(
+    query: QuerySet,
+    sort_fields: List[str],
+    cursor: Optional[dict],
+    limit: int,
+    trailing_ordering: Sequence[str] = (),
+    cursor_state: Optional[dict] = None,
+    descending: bool = False,
+) -> KeysetPage:
     """
-    This function will decode a cursor and return a query condition and ordering condition.
-    The last values for all 3 sort fields are expected to be present in the cursor.
+    Returns 1 page of `query`, sorted by `sort_fields` (the combination of these must be unique).
 
-    Assuming the the sort fields are a, b and c the query condition constructed will be the equivalent of this SQL WHERE clause:
+    `limit + 1` rows are fetched: the extra row tells if there is another page in the direction of the
+    pagination, so only 1 query is executed per page.
+    The other direction is known from the cursor: if we paginated in one direction, then there is a page to go back to.
 
-    WHERE (a > cursor_a)
-    OR (a = cursor_a AND b > cursor_b)
-    OR (a = cursor_a AND b = cursor_b AND c > cursor_c)
-
-    This will take into account that values a, b and c can have duplicates, but that the combination of these 3 is always unique,
-    and cand be used as an key for paginating when the records are sorted by these values.
-
-    The field_ordering will be the same for all fields, and is only influenced by the direction of the pagination.
+    The returned cursors contain the values of the sort fields for the first / last item, and `cursor_state`
+    (for example the filters of the request) which is returned unchanged when decoding the cursor.
+    `trailing_ordering` is appended to the ordering, for example for queries using `DISTINCT ON`.
     """
-    if cursor is None:
-        return (Q(), [f"-{field}" for field in sort_fields])
+    if cursor and cursor.get("d") not in ("next", "prev"):
+        raise InvalidCursorException()
+
+    is_next = not cursor or cursor["d"] == "next"
+    # Scanning forward in descending order is scanning backwards in ascending order
+    is_ascending = is_next != descending
+
+    model_fields = [query.model._meta.get_field(field) for field in sort_fields]
+    # NULLs are sorted last in ascending order (see `get_keyset_condition`)
+    field_ordering = [
+        (
+            F(field).asc(nulls_last=True)
+            if is_ascending
+            else F(field).desc(nulls_first=True)
+        )
+        if model_field.null
+        else f"{'' if is_ascending else '-'}{field}"
+        for field, model_field in zip(sort_fields, model_fields)
+    ]
+
+    if cursor:
+        query = query.filter(
+            get_keyset_condition(
+                model_fields,
+                sort_fields,
+                get_cursor_key(cursor, model_fields),
+                is_ascending,
+            )
+        )
 
-    is_next = cursor["d"] == "next"
-    filter_condition = Q()
+    items = list(query.order_by(*field_ordering, *trailing_ordering)[: limit + 1])
+    has_more = len(items) > limit
+    items = items[:limit]
 
     if is_next:
-        for i in range(len(sort_fields)):
-            condition_for_or = Q()
-            for j in range(i + 1):
-                if i == j:
-                    cursor_value = cursor.get(sort_fields[j], None)
-                    if cursor_value is not None:
-                        condition_for_or &= Q(
-                            **{f"{sort_fields[j]}__gt": cursor[sort_fields[j]]}
-                        )
-                else:
-                    condition_for_or &= Q(
-                        **{f"{sort_fields[j]}__gte": cursor[sort_fields[j]]}
-                    )
-
-            filter_condition |= condition_for_or
+        has_next, has_prev = has_more, cursor is not None
     else:
-        for i in range(len(sort_fields)):
-            condition_for_or = Q()
-            for j in range(i + 1):
-                if i == j:
-                    cursor_value = cursor.get(sort_fields[j], None)
-                    if cursor_value is not None:
-                        condition_for_or &= Q(
-                            **{f"{sort_fields[j]}__lt": cursor[sort_fields[j]]}
-                        )
-                else:
-                    condition_for_or &= Q(
-                        **{f"{sort_fields[j]}__lte": cursor[sort_fields[j]]}
-                    )
-
-            filter_condition |= condition_for_or
-
-    field_ordering = [f"{'-' if not is_next else ''}{field}" for field in sort_fields]
-
-    return (filter_condition, field_ordering)
+        items.reverse()
+        has_next, has_prev = True, has_more
+
+    def make_cursor(direction, item):
+        return dict(
+            **(cursor_state or {}),
+            d=direction,
+            # value_to_string keeps the full precision of timestamps
+            k=[
+                field.value_to_string(item)
+                if field.value_from_object(item) is not None
+                else None
+                for field in model_fields
+            ],
+        )
+
+    return KeysetPage(
+        items=items,
+        next_cursor=make_cursor("next", items[-1]) if items and has_next else None,
+        prev_cursor=make_cursor("prev", items[0]) if items and has_prev else None,
+    )
+
+
+def get_cursor_tokens_for_results(
+    domain: str, page: KeysetPage, limit: int, http_query_args, endpoint: str
+) -> dict:
+    return {
+        direction: (
+            f"""{domain}{reverse_lazy_with_query(
+                f"registry_v2:{endpoint}",
+                args=http_query_args,
+                query_kwargs={"token": encode_cursor(**cursor), "limit": limit},
+            )}"""
+            if cursor
+            else None
+        )
+        for direction, cursor in (
+            ("prev", page.prev_cursor),
+            ("next", page.next_cursor),
+        )
+    }
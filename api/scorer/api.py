@@ -93,6 +93,15 @@ def service_unavailable(request, _):
     )
 
 
+@registry_api_v2.exception_handler(Ratelimited)
+def service_unavailable_v2(request, _):
+    return registry_api_v2.create_response(
+        request,
+        {"detail": "You have been rate limited!"},
+        status=429,
+    )
+
+
 registry_api_v1.add_router(
     "/registry/", registry_router_v1, tags=["Score your passport"]
 )
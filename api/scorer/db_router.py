@@ -0,0 +1,228 @@
+"""
+Database router sending the reads of API requests to the read replicas.
+
+- Only reads made while handling a request (see `ReadReplicaMiddleware`) are routed, for the apps
+  in `DB_REPLICA_APPS`. Writes, reads inside transactions and everything outside of requests
+  (celery tasks, management commands) use the primary.
+- A replica is picked per request, weighted by `DB_READ_REPLICAS` (alias -> weight).
+- The replication lag of each replica is checked every `DB_REPLICA_LAG_CHECK_INTERVAL` seconds,
+  replicas lagging more than `DB_REPLICA_MAX_LAG` seconds are not used. Without a usable replica
+  the reads go to the primary.
+- Read-your-writes: after a request has written, the API key and the address of the request (from
+  the URL, the query string or the DID of a ceramic-cache token) are pinned to the primary for
+  `DB_READ_YOUR_WRITES_WINDOW` seconds (in the shared cache, so this applies to all processes).
+  Reads of later requests with the same API key or address go to the primary during that window.
+"""
+import random
+import re
+import threading
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Set, Tuple
+
+import api_logging as logging
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+
+log = logging.getLogger(__name__)
+
+PRIMARY_DB = "default"
+
+ADDRESS_RE = re.compile(r"0x[a-fA-F0-9]{40}")
+
+
+@dataclass
+class RequestDbState:
+    # API key / address of the request, used for read-your-writes
+    keys: Set[str] = field(default_factory=set)
+    # Memoized result of the pin lookup for `keys`
+    pinned: Optional[bool] = None
+    replica: Optional[str] = None
+    wrote: bool = False
+
+
+_request_state: ContextVar[Optional[RequestDbState]] = ContextVar(
+    "db_request_state", default=None
+)
+
+# alias -> (time of the check, lag in seconds)
+_replica_lag: Dict[str, Tuple[float, float]] = {}
+_replica_lag_lock = threading.Lock()
+
+
+def get_pin_cache_key(key: str) -> str:
+    return f"db-pin:{key}"
+
+
+def add_request_key(key: str) -> None:
+    """
+    Associate the current request with an API key or address, for read-your-writes
+    """
+    state = _request_state.get()
+    if state is not None and key not in state.keys:
+        state.keys.add(key)
+        state.pinned = True if state.wrote else None
+
+
+def set_request_api_key(prefix: str) -> None:
+    add_request_key(f"api-key:{prefix}")
+
+
+def set_request_address(address: str) -> None:
+    add_request_key(f"address:{address.lower()}")
+
+
+def is_pinned_to_primary(state: RequestDbState) -> bool:
+    if state.pinned is None:
+        try:
+            state.pinned = bool(
+                state.keys
+                and cache.get_many([get_pin_cache_key(k) for k in state.keys])
+            )
+        except Exception:
+            log.warning("Failed to read primary pins", exc_info=True)
+            state.pinned = True
+    return state.pinned
+
+
+def pin_to_primary(state: RequestDbState) -> None:
+    if not state.keys:
+        return
+    try:
+        cache.set_many(
+            {get_pin_cache_key(k): 1 for k in state.keys},
+            settings.DB_READ_YOUR_WRITES_WINDOW,
+        )
+    except Exception:
+        log.warning("Failed to pin reads to the primary", exc_info=True)
+
+
+def measure_replica_lag(alias: str) -> float:
+    connection = connections[alias]
+    if connection.vendor != "postgresql":
+        return 0
+
+    with connection.cursor() as cursor:
+        # NULL when the database is not replaying WAL (i.e. is not a replica)
+        cursor.execute(
+            "SELECT COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)"
+        )
+        return float(cursor.fetchone()[0])
+
+
+def get_replica_lag(alias: str) -> float:
+    now = time.time()
+    checked_at, lag = _replica_lag.get(alias, (None, None))
+    if (
+        checked_at is not None
+        and now - checked_at < settings.DB_REPLICA_LAG_CHECK_INTERVAL
+    ):
+        return lag
+
+    with _replica_lag_lock:
+        try:
+            lag = measure_replica_lag(alias)
+        except Exception:
+            log.warning("Failed to measure the lag of replica %s", alias, exc_info=True)
+            lag = float("inf")
+        _replica_lag[alias] = (now, lag)
+
+    if lag > settings.DB_REPLICA_MAX_LAG:
+        log.warning("Replica %s is lagging by %ss, not using it", alias, lag)
+    return lag
+
+
+def choose_replica() -> str:
+    replicas = {
+        alias: weight
+        for alias, weight in settings.DB_READ_REPLICAS.items()
+        if weight > 0 and get_replica_lag(alias) <= settings.DB_REPLICA_MAX_LAG
+    }
+    if not replicas:
+        return PRIMARY_DB
+
+    return random.choices(list(replicas.keys()), weights=list(replicas.values()))[0]
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _request_state.get()
+        if (
+            state is None
+            or not settings.DB_READ_REPLICAS
+            or model._meta.app_label not in settings.DB_REPLICA_APPS
+            or connections[PRIMARY_DB].in_atomic_block
+            or state.wrote
+            or is_pinned_to_primary(state)
+        ):
+            return None
+
+        if state.replica is None:
+            state.replica = choose_replica()
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        state = _request_state.get()
+        if state is not None and not state.wrote:
+            state.wrote = True
+            state.pinned = True
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replicas have the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in settings.DB_READ_REPLICAS:
+            return False
+        return None
+
+
+class ReadReplicaMiddleware:
+    """
+    Enables the routing of reads to the replicas for the duration of a request
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def start(self, request) -> RequestDbState:
+        state = RequestDbState()
+        # The address is in the path, or in the query string (e.g. the stamps of the ceramic cache)
+        for value in [request.path, *request.GET.values()]:
+            for address in ADDRESS_RE.findall(value):
+                state.keys.add(f"address:{address.lower()}")
+        return state
+
+    def finish(self, state: RequestDbState) -> None:
+        if state.wrote:
+            pin_to_primary(state)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        state = self.start(request)
+        token = _request_state.set(state)
+        try:
+            return self.get_response(request)
+        finally:
+            _request_state.reset(token)
+            self.finish(state)
+
+    async def __acall__(self, request):
+        state = self.start(request)
+        token = _request_state.set(state)
+        try:
+            return await self.get_response(request)
+        finally:
+            _request_state.reset(token)
+            self.finish(state)
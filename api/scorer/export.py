@@ -0,0 +1,585 @@
+"""
+Streaming exports of database tables to S3.
+
+Rows are read from a server-side cursor, encoded in batches (as JSON lines or Arrow record batches
+for Parquet files) and uploaded to S3 in parts of a multipart upload as they are produced. Nothing
+is written to local disk, and the memory used is bounded by one batch of rows and one upload part.
+"""
+import base64
+import json
+import zlib
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlparse
+
+import boto3
+import pyarrow as pa
+import zstandard
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Model, Q, QuerySet, TextField
+from django.db.models.functions import Cast
+from registry.models import StoredCredential
+
+# S3 does not accept parts smaller than 5 MiB, except for the last one
+MIN_PART_SIZE = 5 * 1024 * 1024
+DEFAULT_PART_SIZE = 16 * 1024 * 1024
+
+COMPRESSION_EXTENSIONS = {None: "", "gzip": ".gz", "zstd": ".zst"}
+
+# Credential columns backed by the credential store, as field -> reference to the StoredCredential.
+# The inline JSON is empty for the rows referencing a stored credential, the exports write the stored
+# credential in the column instead.
+STORED_CREDENTIAL_FIELDS = {
+    "registry.Stamp": ("credential", "credential_ref"),
+    "ceramic_cache.CeramicCache": ("stamp", "stamp_ref"),
+}
+
+
+def resolve_credential(inline, stored, compressed) -> Any:
+    """
+    Value of a credential column, from the inline JSON and the (possibly compressed) stored credential
+    """
+    if stored is not None:
+        return stored
+    if compressed is not None:
+        return json.loads(StoredCredential.decompress_credential(compressed))
+    return inline
+
+
+def resolve_credential_json(inline, stored, compressed) -> Optional[str]:
+    """
+    Same as `resolve_credential`, for the JSON text of the columns
+    """
+    if stored is not None:
+        return stored
+    if compressed is not None:
+        return StoredCredential.decompress_credential(compressed).decode("utf-8")
+    return inline
+
+
+def get_s3_client():
+    """
+    Client for the S3 data buckets. Set S3_DATA_ENDPOINT_URL to use a local S3 compatible server
+    (for example MinIO).
+    """
+    return boto3.client(
+        "s3",
+        aws_access_key_id=settings.S3_DATA_AWS_SECRET_KEY_ID,
+        aws_secret_access_key=settings.S3_DATA_AWS_SECRET_ACCESS_KEY,
+        endpoint_url=settings.S3_DATA_ENDPOINT_URL,
+    )
+
+
+def parse_s3_uri(s3_uri: str) -> Tuple[str, str]:
+    """
+    Returns the bucket and the folder (without leading or trailing slash) of an s3:// URI
+    """
+    parsed_uri = urlparse(s3_uri)
+    return parsed_uri.netloc, parsed_uri.path.strip("/")
+
+
+class S3MultipartWriter:
+    """
+    Binary file-like object uploading to S3 with a multipart upload. Data is buffered until a part is
+    full, so at most one part is kept in memory. Objects smaller than one part are uploaded with a
+    single PutObject.
+
+    Used as a context manager, the upload is completed on exit, or aborted if an exception is raised.
+    """
+
+    def __init__(
+        self,
+        s3,
+        bucket: str,
+        key: str,
+        part_size: int = DEFAULT_PART_SIZE,
+        extra_args: Optional[dict] = None,
+    ):
+        if part_size < MIN_PART_SIZE:
+            raise ValueError(f"The part size must be at least {MIN_PART_SIZE} bytes")
+
+        self.s3 = s3
+        self.bucket = bucket
+        self.key = key
+        self.part_size = part_size
+        # Same arguments as the `ExtraArgs` of `upload_file` (ACL, ContentType, ...)
+        self.extra_args = extra_args or {}
+        self.buffer = bytearray()
+        self.upload_id = None
+        self.parts = []
+        self.size = 0
+        self.closed = False
+
+    def write(self, data: bytes) -> int:
+        self.buffer += data
+        self.size += len(data)
+        while len(self.buffer) >= self.part_size:
+            self.upload_part(bytes(self.buffer[: self.part_size]))
+            del self.buffer[: self.part_size]
+        return len(data)
+
+    def tell(self) -> int:
+        return self.size
+
+    def flush(self) -> None:
+        # Parts are only uploaded when full
+        pass
+
+    def upload_part(self, body: bytes) -> None:
+        if self.upload_id is None:
+            self.upload_id = self.s3.create_multipart_upload(
+                Bucket=self.bucket, Key=self.key, **self.extra_args
+            )["UploadId"]
+
+        part_number = len(self.parts) + 1
+        response = self.s3.upload_part(
+            Bucket=self.bucket,
+            Key=self.key,
+            UploadId=self.upload_id,
+            PartNumber=part_number,
+            Body=body,
+        )
+        self.parts.append({"ETag": response["ETag"], "PartNumber": part_number})
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        if self.upload_id is None:
+            self.s3.put_object(
+                Bucket=self.bucket,
+                Key=self.key,
+                Body=bytes(self.buffer),
+                **self.extra_args,
+            )
+        else:
+            if self.buffer:
+                self.upload_part(bytes(self.buffer))
+            self.s3.complete_multipart_upload(
+                Bucket=self.bucket,
+                Key=self.key,
+                UploadId=self.upload_id,
+                MultipartUpload={"Parts": self.parts},
+            )
+        self.buffer = bytearray()
+        self.closed = True
+
+    def abort(self) -> None:
+        if self.closed:
+            return
+        # The parts already uploaded are billed until the upload is aborted
+        if self.upload_id is not None:
+            self.s3.abort_multipart_upload(
+                Bucket=self.bucket, Key=self.key, UploadId=self.upload_id
+            )
+        self.buffer = bytearray()
+        self.closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def get_compressor(compression: Optional[str]):
+    """
+    Returns a streaming compressor (with `compress` and `flush` methods) for "gzip" or "zstd", or
+    None if `compression` is None
+    """
+    if compression is None:
+        return None
+    if compression == "gzip":
+        # wbits = 16 + MAX_WBITS writes a gzip header and trailer
+        return zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    if compression == "zstd":
+        return zstandard.ZstdCompressor().compressobj()
+    raise ValueError(f"Unsupported compression '{compression}'")
+
+
+class CompressedWriter:
+    """
+    Compresses the data written to `stream` (an `S3MultipartWriter`)
+    """
+
+    def __init__(self, stream: S3MultipartWriter, compression: Optional[str]):
+        self.stream = stream
+        self.compressor = get_compressor(compression)
+
+    def write(self, data: bytes) -> int:
+        compressed = self.compressor.compress(data) if self.compressor else data
+        if compressed:
+            self.stream.write(compressed)
+        return len(data)
+
+    def close(self) -> None:
+        if self.compressor:
+            self.stream.write(self.compressor.flush())
+        self.stream.close()
+
+    def abort(self) -> None:
+        self.stream.abort()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+class JsonlRows:
+    """
+    Encodes the rows of a model as JSON lines, in the format of the Django python serializer: one
+    object per row with the value of each field (the related object's ID for foreign keys) and the
+    `id`. Foreign keys listed in `select_related` are expanded to an object with the fields of the
+    related row. The credentials moved to the credential store are written in their inline column
+    (see `STORED_CREDENTIAL_FIELDS`).
+
+    The values are read with `values_list`, without instantiating the models.
+    """
+
+    def __init__(self, model: type[Model], select_related: Optional[List[str]] = None):
+        self.lookups = []
+        # Output key of each lookup, the name of the foreign key for the fields of related rows
+        self.layout = []
+        self.binary_lookups = set()
+        # Index of the credential columns, followed by the lookups of the stored credential
+        self.credential_lookups = set()
+        credential_field, credential_ref = STORED_CREDENTIAL_FIELDS.get(
+            model._meta.label, (None, None)
+        )
+
+        for field in self.get_fields(model):
+            if select_related and field.name in select_related:
+                # The foreign key itself tells apart a missing related row
+                self.add_lookup(field.attname, (field.name, None), field)
+                for related_field in self.get_fields(field.related_model):
+                    self.add_lookup(
+                        f"{field.name}__{related_field.attname}",
+                        (field.name, related_field.name),
+                        related_field,
+                    )
+            else:
+                self.add_lookup(field.attname, (field.name,), field)
+                if field.name == credential_field:
+                    self.credential_lookups.add(len(self.lookups) - 1)
+                    self.lookups += [
+                        f"{credential_ref}__credential",
+                        f"{credential_ref}__compressed_credential",
+                    ]
+                    self.layout += [None, None]
+
+        self.add_lookup(model._meta.pk.attname, ("id",), model._meta.pk)
+
+        self.encoder = DjangoJSONEncoder(separators=(",", ": "), ensure_ascii=False)
+
+    @staticmethod
+    def get_fields(model: type[Model]):
+        return [
+            field
+            for field in model._meta.concrete_model._meta.local_fields
+            if field.serialize
+        ]
+
+    def add_lookup(self, lookup: str, key: tuple, field) -> None:
+        if field.get_internal_type() == "BinaryField":
+            self.binary_lookups.add(len(self.lookups))
+        self.lookups.append(lookup)
+        self.layout.append(key)
+
+    def to_dict(self, values: tuple) -> dict:
+        row = {}
+        for index, (key, value) in enumerate(zip(self.layout, values)):
+            if key is None:
+                continue
+            if index in self.credential_lookups:
+                value = resolve_credential(value, *values[index + 1 : index + 3])
+            elif value is not None and index in self.binary_lookups:
+                # As `BinaryField.value_to_string`
+                value = base64.b64encode(value).decode("ascii")
+
+            if len(key) == 1:
+                row[key[0]] = value
+            elif key[1] is None:
+                row[key[0]] = {} if value is not None else None
+            elif row[key[0]] is not None:
+                row[key[0]][key[1]] = value
+        return row
+
+    def iter_batches(
+        self, queryset: QuerySet, batch_size: int
+    ) -> Iterator[Tuple[int, bytes]]:
+        """
+        Yields the number of rows and the encoded rows of the queryset, `batch_size` rows at a time.
+        On PostgreSQL, the rows are streamed from a server-side cursor.
+        """
+        batch = []
+        for values in queryset.values_list(*self.lookups).iterator(
+            chunk_size=batch_size
+        ):
+            batch.append(values)
+            if len(batch) == batch_size:
+                yield len(batch), self.encode(batch)
+                batch = []
+
+        if batch:
+            yield len(batch), self.encode(batch)
+
+    def encode(self, rows: List[tuple]) -> bytes:
+        """
+        Encode rows of `values_list(*self.lookups)` as JSON lines
+        """
+        lines = [self.encoder.encode(self.to_dict(values)) for values in rows]
+        lines.append("")
+        return "\n".join(lines).encode("utf-8")
+
+
+# Arrow type of the columns, by internal type of the django field. Other fields are exported as strings.
+ARROW_TYPES = {
+    "AutoField": pa.int64(),
+    "BigAutoField": pa.int64(),
+    "SmallAutoField": pa.int64(),
+    "IntegerField": pa.int64(),
+    "BigIntegerField": pa.int64(),
+    "SmallIntegerField": pa.int64(),
+    "PositiveIntegerField": pa.int64(),
+    "PositiveBigIntegerField": pa.int64(),
+    "PositiveSmallIntegerField": pa.int64(),
+    "CharField": pa.string(),
+    "TextField": pa.string(),
+    "JSONField": pa.string(),
+    "DateTimeField": pa.timestamp("ms"),
+    "DateField": pa.date32(),
+    "BooleanField": pa.bool_(),
+    "FloatField": pa.float64(),
+    "BinaryField": pa.binary(),
+}
+
+# Larger decimals (for example token amounts in wei) are exported as strings
+MAX_DECIMAL_PRECISION = 76
+
+EVIDENCE_TYPE = pa.struct(
+    [
+        ("type", pa.string()),
+        ("success", pa.bool_()),
+        ("rawScore", pa.float64()),
+        ("threshold", pa.float64()),
+    ]
+)
+
+
+def to_evidence(evidence: dict) -> dict:
+    # The numbers of the evidence are stored as strings (see `ThresholdScoreEvidence.as_dict`)
+    return {
+        "type": evidence.get("type"),
+        "success": evidence.get("success"),
+        "rawScore": float(evidence["rawScore"]) if "rawScore" in evidence else None,
+        "threshold": float(evidence["threshold"]) if "threshold" in evidence else None,
+    }
+
+
+def to_stamp_scores(stamp_scores: dict) -> dict:
+    # The weights are stored as strings by the sync scoring (see `calculate_weighted_score`)
+    return {provider: float(score) for provider, score in stamp_scores.items()}
+
+
+# Typed columns for the JSON fields with a known shape: Arrow type and conversion of the decoded JSON
+JSON_COLUMNS: Dict[str, Tuple[pa.DataType, Callable[[Any], Any]]] = {
+    "registry.Score.evidence": (EVIDENCE_TYPE, to_evidence),
+    "registry.ScoreSnapshot.evidence": (EVIDENCE_TYPE, to_evidence),
+    "registry.Score.stamp_scores": (
+        pa.map_(pa.string(), pa.float64()),
+        to_stamp_scores,
+    ),
+}
+
+
+class ArrowColumns:
+    """
+    Reads the rows of a model into Arrow record batches, one column per concrete field (`<name>_id`
+    for foreign keys).
+
+    The values are fetched with `values_list` and transposed into columns, which are converted to
+    Arrow arrays at once. JSON fields are read as their JSON text (without decoding it), or, with
+    `typed_json`, as typed columns for the shapes listed in `JSON_COLUMNS`. The credentials moved to
+    the credential store are written in their inline column (see `STORED_CREDENTIAL_FIELDS`).
+    """
+
+    def __init__(self, model: type[Model], typed_json: bool = False):
+        self.columns = []
+        fields = []
+        # Conversion of the python values of each column before building the array, if needed
+        self.converters = []
+        # Index of the credential columns -> indexes of the values passed to
+        # `resolve_credential_json`, the values of the stored credential are read after the fields
+        self.credential_columns = {}
+        credential_field, credential_ref = STORED_CREDENTIAL_FIELDS.get(
+            model._meta.label, (None, None)
+        )
+        local_fields = model._meta.concrete_model._meta.local_fields
+        stored_credential_columns = []
+
+        for field in local_fields:
+            internal_type = (
+                field.target_field.get_internal_type()
+                if field.is_relation
+                else field.get_internal_type()
+            )
+            json_column = (
+                JSON_COLUMNS.get(f"{model._meta.label}.{field.name}")
+                if typed_json
+                else None
+            )
+
+            if field.name == credential_field:
+                self.columns.append(Cast(field.attname, output_field=TextField()))
+                arrow_type = pa.string()
+                self.converters.append(None)
+                self.credential_columns[len(self.columns) - 1] = (
+                    len(self.columns) - 1,
+                    len(local_fields),
+                    len(local_fields) + 1,
+                )
+                stored_credential_columns = [
+                    Cast(f"{credential_ref}__credential", output_field=TextField()),
+                    f"{credential_ref}__compressed_credential",
+                ]
+            elif internal_type == "JSONField":
+                self.columns.append(Cast(field.attname, output_field=TextField()))
+                if json_column:
+                    arrow_type, convert = json_column
+                    self.converters.append(
+                        lambda value, convert=convert: convert(json.loads(value))
+                    )
+                else:
+                    arrow_type = pa.string()
+                    self.converters.append(None)
+            elif (
+                internal_type == "DecimalField"
+                and field.max_digits <= MAX_DECIMAL_PRECISION
+            ):
+                self.columns.append(field.attname)
+                arrow_type = pa.decimal256(field.max_digits, field.decimal_places)
+                self.converters.append(None)
+            else:
+                self.columns.append(field.attname)
+                arrow_type = ARROW_TYPES.get(internal_type)
+                if arrow_type is None:
+                    arrow_type = pa.string()
+                    self.converters.append(str)
+                else:
+                    self.converters.append(None)
+
+            fields.append((field.attname, arrow_type))
+
+        self.columns += stored_credential_columns
+        self.schema = pa.schema(fields)
+
+    def to_batch(self, rows: List[tuple]) -> pa.RecordBatch:
+        arrays = []
+        columns = list(zip(*rows))
+        for index, (values, converter, arrow_field) in enumerate(
+            zip(columns, self.converters, self.schema)
+        ):
+            if index in self.credential_columns:
+                values = [
+                    resolve_credential_json(*credential)
+                    for credential in zip(
+                        *(columns[i] for i in self.credential_columns[index])
+                    )
+                ]
+            elif converter:
+                values = [converter(v) if v is not None else None for v in values]
+            arrays.append(pa.array(values, type=arrow_field.type))
+        return pa.RecordBatch.from_arrays(arrays, schema=self.schema)
+
+    def iter_batches(
+        self, queryset: QuerySet, batch_size: int
+    ) -> Iterator[pa.RecordBatch]:
+        """
+        Yields the rows of the queryset as record batches of `batch_size` rows. On PostgreSQL, the
+        rows are streamed from a server-side cursor.
+        """
+        rows = []
+        for values in queryset.values_list(*self.columns).iterator(
+            chunk_size=batch_size
+        ):
+            rows.append(values)
+            if len(rows) == batch_size:
+                yield self.to_batch(rows)
+                rows = []
+
+        if rows:
+            yield self.to_batch(rows)
+
+
+class RowGroupBuffer:
+    """
+    Buffers record batches for a `pyarrow.parquet.ParquetWriter`, so that every row group of the file
+    (but the last one) has exactly `row_group_size` rows
+    """
+
+    def __init__(self, writer, row_group_size: int):
+        self.writer = writer
+        self.row_group_size = row_group_size
+        self.batches = []
+        self.num_rows = 0
+
+    def write_batch(self, batch: pa.RecordBatch) -> None:
+        self.batches.append(batch)
+        self.num_rows += batch.num_rows
+        if self.num_rows >= self.row_group_size:
+            table = pa.Table.from_batches(self.batches)
+            full = self.num_rows - self.num_rows % self.row_group_size
+            self.writer.write_table(
+                table.slice(0, full), row_group_size=self.row_group_size
+            )
+            rest = table.slice(full)
+            self.batches = rest.to_batches()
+            self.num_rows = rest.num_rows
+
+    def flush(self) -> None:
+        if self.num_rows:
+            self.writer.write_table(pa.Table.from_batches(self.batches))
+        self.batches = []
+        self.num_rows = 0
+
+
+def after_key(key: List[str], values: list) -> Q:
+    """
+    Filter on the rows after `values` in the order of the `key` fields (for example
+    `["updated_at", "id"]`), compared as a tuple
+    """
+    condition = Q(**{f"{key[-1]}__gt": values[-1]})
+    for field, value in zip(reversed(key[:-1]), reversed(values[:-1])):
+        condition = Q(**{f"{field}__gt": value}) | (Q(**{field: value}) & condition)
+    return condition
+
+
+def iter_keyset_pages(
+    queryset: QuerySet, columns: list, key: List[str], batch_size: int
+) -> Iterator[List[tuple]]:
+    """
+    Yields the rows of `queryset.values_list(*columns)` in pages of `batch_size` rows, ordered by the
+    `key` fields, which must be unique together and included in `columns` (for example
+    `["updated_at", "id"]`). Each page is a separate query starting after the key of the last row of
+    the previous page, so rows sharing a timestamp are neither skipped nor repeated.
+    """
+    key_indexes = [columns.index(field) for field in key]
+    queryset = queryset.order_by(*key)
+
+    page_query = queryset
+    while True:
+        page = list(page_query.values_list(*columns)[:batch_size])
+        if not page:
+            return
+
+        yield page
+        page_query = queryset.filter(
+            after_key(key, [page[-1][index] for index in key_indexes])
+        )
@@ -0,0 +1,106 @@
+"""
+A small in-process LRU cache, where every entry has its own expiry time.
+
+This is used for caching short lived, per process data like validated tokens, where a round trip
+to a shared cache would cost more than the work it saves.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+import api_logging as logging
+
+log = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+class ExpiringLRUCache:
+    """
+    Bounded LRU cache. Entries are evicted when the cache is full (least recently used first),
+    and are never returned after their `expires_at` timestamp (seconds since the epoch).
+
+    Hit / miss counters are kept for every cache and are logged every `stats_log_interval` lookups.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_size: int,
+        stats_log_interval: int = 10000,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.name = name
+        self.max_size = max_size
+        self.stats_log_interval = stats_log_interval
+        self.clock = clock
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                value = default
+            elif entry[1] <= self.clock():
+                del self._entries[key]
+                self.misses += 1
+                self.expired += 1
+                value = default
+            else:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                value = entry[0]
+
+            lookups = self.hits + self.misses
+
+        if self.stats_log_interval and lookups % self.stats_log_interval == 0:
+            log.info("LRU cache stats: %s", self.stats())
+
+        return value
+
+    def set(self, key: Hashable, value: Any, expires_at: float) -> None:
+        if self.max_size <= 0 or expires_at <= self.clock():
+            return
+
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key: Hashable) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.expired = self.evictions = 0
+
+    @property
+    def hit_rate(self) -> Optional[float]:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else None
+
+    def stats(self) -> dict:
+        return {
+            "name": self.name,
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "expired": self.expired,
+            "evictions": self.evictions,
+            "hit_rate": self.hit_rate,
+        }
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -46,6 +46,24 @@ GENERIC_COMMUNITY_CREATION_LIMIT = env.int(
 USER_COMMUNITY_CREATION_LIMIT = env.int("USER_COMMUNITY_CREATION_LIMIT", default=5)
 
 FF_API_ANALYTICS = env("FF_API_ANALYTICS", default="Off")
+# API key analytics are buffered per process and written in batches, see `registry.analytics`
+API_ANALYTICS_BATCH_SIZE = env.int("API_ANALYTICS_BATCH_SIZE", default=500)
+API_ANALYTICS_FLUSH_INTERVAL = env.float("API_ANALYTICS_FLUSH_INTERVAL", default=5.0)
+API_ANALYTICS_MAX_BUFFER_SIZE = env.int("API_ANALYTICS_MAX_BUFFER_SIZE", default=50000)
+
+# When "on", rate limits are counted per process and synced with the shared cache in batches, see
+# `registry.rate_limiter`. A process syncs when it has used RATE_LIMIT_LOCAL_SHARE of the limit of
+# the API key, or after RATE_LIMIT_SYNC_INTERVAL seconds
+FF_LOCAL_RATE_LIMITER = env("FF_LOCAL_RATE_LIMITER", default="off")
+RATE_LIMIT_LOCAL_SHARE = env.float("RATE_LIMIT_LOCAL_SHARE", default=0.05)
+RATE_LIMIT_SYNC_INTERVAL = env.float("RATE_LIMIT_SYNC_INTERVAL", default=1.0)
+
+# Verified API keys are cached per process (0 disables the cache) and, when
+# FF_API_KEY_SHARED_CACHE is "on", in the shared Django cache. See `account.api_key_cache`
+# API_KEY_CACHE_TTL is also the longest time a key revoked by another process is still accepted
+API_KEY_CACHE_SIZE = env.int("API_KEY_CACHE_SIZE", default=10000)
+API_KEY_CACHE_TTL = env.int("API_KEY_CACHE_TTL", default=30)
+FF_API_KEY_SHARED_CACHE = env("FF_API_KEY_SHARED_CACHE", default="off")
 LOGGING_STRATEGY = env(
     "LOGGING_STRATEGY", default="default"
 )  # default | structlog_json | structlog_flatline
@@ -106,6 +124,7 @@ MIDDLEWARE = [
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
     "social_django.middleware.SocialAuthExceptionMiddleware",
+    "scorer.db_router.ReadReplicaMiddleware",
     # "debug_toolbar.middleware.DebugToolbarMiddleware",
 ]
 
@@ -145,6 +164,28 @@ DATABASES = {
     },
 }
 
+# Additional read replicas, added as "read_replica_1", "read_replica_2", ...
+for i, url in enumerate(env.json("READ_REPLICA_URLS", default=[]), start=1):
+    DATABASES[f"read_replica_{i}"] = {
+        **env.db_url_config(url),
+        "TEST": {"MIRROR": "default"},
+    }
+
+DATABASE_ROUTERS = ["scorer.db_router.ReplicaRouter"]
+
+# Replicas used for the reads of API requests, as alias -> weight (see `scorer.db_router`).
+# Empty by default, in which case all queries that are not explicitly routed use the primary.
+DB_READ_REPLICAS = env.json("DB_READ_REPLICAS", default={})
+# Apps for which reads are routed to the replicas
+DB_REPLICA_APPS = env.list(
+    "DB_REPLICA_APPS", default=["registry", "ceramic_cache", "cgrants"]
+)
+# Replicas lagging behind the primary by more than this (in seconds) are not used
+DB_REPLICA_MAX_LAG = env.float("DB_REPLICA_MAX_LAG", default=5.0)
+DB_REPLICA_LAG_CHECK_INTERVAL = env.float("DB_REPLICA_LAG_CHECK_INTERVAL", default=10.0)
+# After a write, reads for the same API key or address use the primary for this many seconds
+DB_READ_YOUR_WRITES_WINDOW = env.int("DB_READ_YOUR_WRITES_WINDOW", default=10)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
@@ -390,6 +431,9 @@ CERAMIC_CACHE_CACAO_VALIDATION_URL = env(
 
 MAX_BULK_CACHE_SIZE = 100
 
+# Maximum number of addresses in a single batch score lookup
+SCORE_LOOKUP_MAX_ADDRESSES = env.int("SCORE_LOOKUP_MAX_ADDRESSES", default=100)
+
 CACHES = {
     "default": {
         "BACKEND": "django.core.cache.backends.redis.RedisCache",
@@ -398,6 +442,10 @@ CACHES = {
 }
 
 CERAMIC_CACHE_SCORER_ID = env("CERAMIC_CACHE_SCORER_ID")
+# Max number of validated JWT access tokens kept in memory per process, 0 disables the cache
+CERAMIC_CACHE_VALIDATED_TOKEN_CACHE_SIZE = env.int(
+    "CERAMIC_CACHE_VALIDATED_TOKEN_CACHE_SIZE", default=10000
+)
 CERAMIC_CACHE_CONVERT_STAMP_TO_V2_URL = env(
     "CERAMIC_CACHE_CONVERT_STAMP_TO_V2_URL",
     default="http://localhost:8003/api/v0.0.0/convert",
@@ -405,6 +453,13 @@ CERAMIC_CACHE_CONVERT_STAMP_TO_V2_URL = env(
 
 PASSPORT_PUBLIC_URL = env("PASSPORT_PUBLIC_URL", default="http://localhost:80")
 
+# The stamp metadata is served from memory, and refreshed in the background once it is older than
+# STAMP_METADATA_REFRESH_INTERVAL seconds. See `registry.stamp_metadata`
+STAMP_METADATA_REFRESH_INTERVAL = env.int(
+    "STAMP_METADATA_REFRESH_INTERVAL", default=60 * 60
+)
+STAMP_METADATA_MAX_AGE = env.int("STAMP_METADATA_MAX_AGE", default=24 * 60 * 60)
+
 TRUSTED_IAM_ISSUER = env(
     "TRUSTED_IAM_ISSUER", default="did:key:GlMY_1zkc0i11O-wMBWbSiUfIkZiXzFLlAQ89pdfyBA"
 )
@@ -413,6 +468,25 @@ CGRANTS_API_TOKEN = env("CGRANTS_API_TOKEN", default="abc")
 
 FF_DEDUP_WITH_LINK_TABLE = env("FF_DEDUP_WITH_LINK_TABLE", default="off")
 
+# When "on", the score history is read from the ScoreSnapshot table (run `backfill_score_snapshots` first)
+FF_SCORE_HISTORY_SNAPSHOTS = env("FF_SCORE_HISTORY_SNAPSHOTS", default="off")
+
+# When "on", new stamps & credentials are written to the content addressed credential store (StoredCredential)
+FF_CREDENTIAL_STORE = env("FF_CREDENTIAL_STORE", default="off")
+CREDENTIAL_STORE_COMPRESSION_LEVEL = env.int(
+    "CREDENTIAL_STORE_COMPRESSION_LEVEL", default=3
+)
+
+# When "on", score reads are served from the read-through score response cache (see `registry.score_cache`)
+FF_SCORE_RESPONSE_CACHE = env("FF_SCORE_RESPONSE_CACHE", default="off")
+# Expiry (in seconds) of the entries in the shared cache, entries are also invalidated when the score is saved
+SCORE_RESPONSE_CACHE_TTL = env.int("SCORE_RESPONSE_CACHE_TTL", default=300)
+# Size and expiry (in seconds) of the per process tier, which is not invalidated across processes
+SCORE_RESPONSE_LOCAL_CACHE_SIZE = env.int(
+    "SCORE_RESPONSE_LOCAL_CACHE_SIZE", default=1000
+)
+SCORE_RESPONSE_LOCAL_CACHE_TTL = env.int("SCORE_RESPONSE_LOCAL_CACHE_TTL", default=2)
+
 IPWARE_META_PRECEDENCE_ORDER = (
     "X_FORWARDED_FOR",
     "HTTP_X_FORWARDED_FOR",  # <client>, <proxy1>, <proxy2>
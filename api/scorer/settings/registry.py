@@ -1,3 +1,7 @@
 from .env import env
 
 REGISTRY_API_READ_DB = env("REGISTRY_API_READ_DB", default="default")
+
+# Number of passports rescored per batch (1 query for the stamps, 1 bulk write for the scores) by the
+# chunk tasks of `propagate_weights_and_rescore --chunked`
+RESCORE_BATCH_SIZE = env.int("RESCORE_BATCH_SIZE", default=500)
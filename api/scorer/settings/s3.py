@@ -6,3 +6,9 @@ from .env import env
 S3_DATA_AWS_SECRET_KEY_ID = env("S3_DATA_AWS_SECRET_KEY_ID", default=None)
 S3_DATA_AWS_SECRET_ACCESS_KEY = env("S3_DATA_AWS_SECRET_ACCESS_KEY", default=None)
 S3_WEEKLY_BACKUP_BUCKET_NAME = env("S3_WEEKLY_BACKUP_BUCKET_NAME", default=None)
+# Endpoint of a local S3 compatible server (for example MinIO), instead of AWS
+S3_DATA_ENDPOINT_URL = env("S3_DATA_ENDPOINT_URL", default=None)
+
+# Incremental exports only include the rows older than this many seconds, to not miss rows written by
+# transactions that were still in progress (and were not visible) when the export ran
+INCREMENTAL_EXPORT_LAG = env.int("INCREMENTAL_EXPORT_LAG", default=300)
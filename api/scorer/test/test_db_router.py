@@ -0,0 +1,182 @@
+import json
+from unittest.mock import patch
+
+import pytest
+from account.models import Account
+from ceramic_cache.models import CeramicCache
+from django.core.cache import cache
+from django.test import Client, RequestFactory, override_settings
+from registry.models import Score
+from scorer import db_router
+from scorer.db_router import ReadReplicaMiddleware, ReplicaRouter, set_request_api_key
+
+locmem_cache = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+address = "0x" + "a" * 40
+other_address = "0x" + "b" * 40
+
+router = ReplicaRouter()
+
+
+@pytest.fixture(autouse=True)
+def replicas():
+    with override_settings(
+        CACHES=locmem_cache,
+        DB_READ_REPLICAS={"read_replica_0": 1},
+        DB_REPLICA_APPS=["registry"],
+    ):
+        cache.clear()
+        db_router._replica_lag.clear()
+        yield
+
+
+def handle_request(path, view):
+    """
+    Run `view` as the view of a request to `path`, going through the middleware
+    """
+    middleware = ReadReplicaMiddleware(lambda request: view())
+    return middleware(RequestFactory().get(path))
+
+
+def test_reads_outside_requests_use_primary():
+    assert router.db_for_read(Score) is None
+
+
+def test_request_reads_use_replica():
+    assert handle_request(
+        f"/registry/v2/score/1/{address}", lambda: router.db_for_read(Score)
+    ) == ("read_replica_0")
+    # Apps that are not listed are always read from the primary
+    assert handle_request("/", lambda: router.db_for_read(Account)) is None
+
+
+def test_no_replicas_configured():
+    with override_settings(DB_READ_REPLICAS={}):
+        assert handle_request("/", lambda: router.db_for_read(Score)) is None
+
+
+def test_reads_after_write_use_primary():
+    def view():
+        before = router.db_for_read(Score)
+        router.db_for_write(Score)
+        return before, router.db_for_read(Score)
+
+    assert handle_request(f"/registry/v2/score/1/{address}", view) == (
+        "read_replica_0",
+        None,
+    )
+
+
+def test_read_your_writes_across_requests():
+    def write_view():
+        set_request_api_key("key1")
+        router.db_for_write(Score)
+
+    def read_view(api_key):
+        def view():
+            set_request_api_key(api_key)
+            return router.db_for_read(Score)
+
+        return view
+
+    handle_request(f"/registry/v2/score/1/{address}", write_view)
+
+    # Same address or same API key: pinned to the primary
+    assert handle_request(f"/registry/v2/score/1/{address}", read_view("key2")) is None
+    assert handle_request("/registry/v2/stamps", read_view("key1")) is None
+    # Unrelated request
+    assert (
+        handle_request(f"/registry/v2/score/1/{other_address}", read_view("key2"))
+        == "read_replica_0"
+    )
+
+    # The pin expires
+    cache.clear()
+    assert (
+        handle_request(f"/registry/v2/score/1/{address}", read_view("key1"))
+        == "read_replica_0"
+    )
+
+
+def test_query_string_address_is_pinned():
+    handle_request(
+        f"/registry/v2/score/1/{address}", lambda: router.db_for_write(Score)
+    )
+
+    assert (
+        handle_request(
+            f"/ceramic-cache/stamp?address=0x{address[2:].upper()}",
+            lambda: router.db_for_read(Score),
+        )
+        is None
+    )
+    assert (
+        handle_request(
+            f"/ceramic-cache/stamp?address={other_address}",
+            lambda: router.db_for_read(Score),
+        )
+        == "read_replica_0"
+    )
+
+
+@pytest.mark.django_db(transaction=True, databases=["default", "read_replica_0"])
+def test_ceramic_cache_read_after_bulk_write_uses_primary(
+    mocker, sample_address, sample_token, ui_scorer
+):
+    reads = []
+    db_for_read = ReplicaRouter.db_for_read
+
+    def record_read(self, model, **hints):
+        db = db_for_read(self, model, **hints)
+        reads.append((model, db or "default"))
+        return db
+
+    mocker.patch.object(ReplicaRouter, "db_for_read", record_read)
+    client = Client()
+
+    with override_settings(DB_REPLICA_APPS=["ceramic_cache"]):
+        # The address of the write is only known from the DID of the token
+        response = client.post(
+            "/ceramic-cache/stamps/bulk",
+            json.dumps([{"provider": "Google", "stamp": {"stamp": 1}}]),
+            content_type="application/json",
+            HTTP_AUTHORIZATION=f"Bearer {sample_token}",
+        )
+        assert response.status_code == 201
+
+        reads.clear()
+        response = client.get(f"/ceramic-cache/stamp?address={sample_address}")
+
+    assert response.status_code == 200
+    assert response.json()["stamps"][0]["provider"] == "Google"
+    assert {db for model, db in reads if model is CeramicCache} == {"default"}
+
+
+def test_lagging_replica_falls_back_to_primary():
+    with override_settings(
+        DB_READ_REPLICAS={"read_replica_0": 1, "read_replica_1": 1},
+        DB_REPLICA_MAX_LAG=5,
+    ):
+        with patch.object(
+            db_router,
+            "measure_replica_lag",
+            side_effect=lambda alias: 60 if alias == "read_replica_1" else 0,
+        ) as measure_replica_lag:
+            for _ in range(10):
+                assert (
+                    handle_request("/", lambda: router.db_for_read(Score))
+                    == "read_replica_0"
+                )
+
+            # The lag is only measured once per check interval
+            assert measure_replica_lag.call_count == 2
+
+        db_router._replica_lag.clear()
+        with patch.object(db_router, "measure_replica_lag", side_effect=Exception):
+            assert handle_request("/", lambda: router.db_for_read(Score)) == "default"
+
+
+@pytest.mark.django_db
+def test_reads_in_transactions_use_primary():
+    # The test runs inside a transaction
+    assert handle_request("/", lambda: router.db_for_read(Score)) is None
@@ -0,0 +1,360 @@
+import gzip
+import io
+import json
+from concurrent.futures import Executor, Future
+from decimal import Decimal
+from io import StringIO
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+import zstandard
+from django.core import serializers
+from django.core.management import call_command
+from registry.models import Event, Passport, Score, Stamp, StoredCredential
+from scorer.export import MIN_PART_SIZE, ArrowColumns, JsonlRows, S3MultipartWriter
+
+pytestmark = pytest.mark.django_db
+
+
+class LocalS3:
+    """
+    In-memory stand-in for the S3 client, implementing the calls used by the exports and imports
+    """
+
+    def __init__(self):
+        self.objects = {}
+        self.uploads = {}
+        self.aborted = []
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self.objects[(Bucket, Key)] = Body
+
+    def get_object(self, Bucket, Key):
+        return {"Body": io.BytesIO(self.objects[(Bucket, Key)])}
+
+    def create_multipart_upload(self, Bucket, Key, **kwargs):
+        upload_id = f"upload-{len(self.uploads)}"
+        self.uploads[upload_id] = {}
+        return {"UploadId": upload_id}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        self.uploads[UploadId][PartNumber] = Body
+        return {"ETag": f"etag-{PartNumber}"}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        parts = self.uploads.pop(UploadId)
+        self.objects[(Bucket, Key)] = b"".join(
+            parts[part["PartNumber"]] for part in MultipartUpload["Parts"]
+        )
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        self.uploads.pop(UploadId)
+        self.aborted.append(Key)
+
+
+@pytest.fixture
+def local_s3(mocker):
+    s3 = LocalS3()
+    for command in ["scorer_dump_data", "scorer_dump_data_parquet"]:
+        mocker.patch(
+            f"ceramic_cache.management.commands.{command}.get_s3_client",
+            return_value=s3,
+        )
+    return s3
+
+
+class InlineExecutor(Executor):
+    """
+    Runs the exports in the test process, forked workers would not see the test transaction
+    """
+
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        future.set_result(fn(*args, **kwargs))
+        return future
+
+
+@pytest.fixture
+def scores(scorer_community):
+    passports = Passport.objects.bulk_create(
+        [Passport(address=f"0x{i:040x}", community=scorer_community) for i in range(25)]
+    )
+    return Score.objects.bulk_create(
+        [
+            Score(
+                passport=passport,
+                score=i,
+                status=Score.Status.DONE,
+                evidence={"rawScore": f"{i}.5", "type": "ThresholdScoreCheck"},
+            )
+            for i, passport in enumerate(passports)
+        ]
+    )
+
+
+def read_lines(data: bytes):
+    return [json.loads(line) for line in data.decode("utf-8").splitlines()]
+
+
+class TestS3MultipartWriter:
+    def test_small_object_is_put(self):
+        s3 = LocalS3()
+        with S3MultipartWriter(s3, "bucket", "key") as writer:
+            writer.write(b"hello ")
+            writer.write(b"world")
+
+        assert s3.objects == {("bucket", "key"): b"hello world"}
+
+    def test_large_object_is_uploaded_in_parts(self):
+        s3 = LocalS3()
+        chunk = bytes(range(256)) * 4096
+        with S3MultipartWriter(s3, "bucket", "key", part_size=MIN_PART_SIZE) as writer:
+            for _ in range(12):
+                writer.write(chunk)
+            # Only the last incomplete part is buffered
+            assert len(writer.buffer) < MIN_PART_SIZE
+            upload_id = writer.upload_id
+            assert len(s3.uploads[upload_id]) == 2
+
+        assert s3.objects[("bucket", "key")] == chunk * 12
+        assert not s3.uploads
+
+    def test_upload_is_aborted_on_error(self):
+        s3 = LocalS3()
+        with pytest.raises(RuntimeError):
+            with S3MultipartWriter(
+                s3, "bucket", "key", part_size=MIN_PART_SIZE
+            ) as writer:
+                writer.write(b"x" * (MIN_PART_SIZE + 1))
+                raise RuntimeError("export failed")
+
+        assert s3.aborted == ["key"]
+        assert not s3.objects
+
+
+def test_jsonl_rows_match_the_python_serializer(scores):
+    events = Event.objects.bulk_create(
+        [
+            Event(
+                action=Event.Action.SCORE_UPDATE,
+                address=score.passport.address,
+                community=score.passport.community,
+                data={"score": float(score.score)},
+            )
+            for score in scores[:3]
+        ]
+    )
+
+    for model in [Score, Event]:
+        batches = list(JsonlRows(model).iter_batches(model.objects.order_by("id"), 10))
+        expected = [
+            {**obj["fields"], "id": obj["pk"]}
+            for obj in serializers.serialize("python", model.objects.order_by("id"))
+        ]
+        # Values are compared after a JSON round trip, as they are in the dump
+        expected = json.loads(
+            json.dumps(expected, cls=serializers.json.DjangoJSONEncoder)
+        )
+
+        assert [count for count, _ in batches] == (
+            [10, 10, 5] if model is Score else [len(events)]
+        )
+        assert [row for _, data in batches for row in read_lines(data)] == expected
+
+
+@pytest.mark.parametrize(
+    "compression,decompress",
+    [
+        (None, lambda data: data),
+        ("gzip", gzip.decompress),
+        (
+            "zstd",
+            lambda data: zstandard.ZstdDecompressor().decompressobj().decompress(data),
+        ),
+    ],
+)
+def test_dump_scores_to_s3(scores, scorer_community, local_s3, compression, decompress):
+    config = [
+        {
+            "name": "registry.Score",
+            "filter": {"passport__community_id": scorer_community.id},
+            "select_related": ["passport"],
+        }
+    ]
+    call_command(
+        "scorer_dump_data",
+        config=json.dumps(config),
+        s3_uri="s3://bucket/dumps/",
+        batch_size=10,
+        compression=compression,
+    )
+
+    extension = {None: "", "gzip": ".gz", "zstd": ".zst"}[compression]
+    rows = read_lines(
+        decompress(
+            local_s3.objects[("bucket", f"dumps/registry_score.jsonl{extension}")]
+        )
+    )
+    assert [row["id"] for row in rows] == [score.id for score in scores]
+    assert rows[3]["passport"] == {
+        "address": scores[3].passport.address,
+        "community": scorer_community.id,
+        "requires_calculation": None,
+    }
+    assert rows[3]["evidence"] == {"rawScore": "3.5", "type": "ThresholdScoreCheck"}
+    assert rows[3]["score"] == "3.000000000"
+
+    summary = json.loads(local_s3.objects[("bucket", "dumps/export_summary.json")])
+    assert summary[0]["records"] == len(scores)
+    assert summary[0]["s3_key"] == f"dumps/registry_score.jsonl{extension}"
+
+
+class TestArrowColumns:
+    def test_score_columns(self, scores):
+        batches = list(
+            ArrowColumns(Score).iter_batches(Score.objects.order_by("id"), 10)
+        )
+
+        assert [batch.num_rows for batch in batches] == [10, 10, 5]
+        assert batches[0].schema.field("passport_id").type == pa.int64()
+        assert batches[0].schema.field("score").type == pa.decimal256(18, 9)
+        assert batches[0].schema.field("evidence").type == pa.string()
+
+        table = pa.Table.from_batches(batches)
+        assert table.column("passport_id").to_pylist() == [
+            score.passport_id for score in scores
+        ]
+        assert table.column("score").to_pylist()[3] == Decimal("3.000000000")
+        assert json.loads(table.column("evidence").to_pylist()[3]) == {
+            "rawScore": "3.5",
+            "type": "ThresholdScoreCheck",
+        }
+        assert table.column("stamp_scores").to_pylist()[3] is None
+
+    def test_typed_json_columns(self, scores):
+        Score.objects.filter(id=scores[3].id).update(
+            evidence={
+                "type": "ThresholdScoreCheck",
+                "success": True,
+                "rawScore": "21.5",
+                "threshold": "20.00000",
+            },
+            stamp_scores={"Google": 2.25, "Ens": 1},
+        )
+
+        table = pa.Table.from_batches(
+            ArrowColumns(Score, typed_json=True).iter_batches(
+                Score.objects.order_by("id"), 10
+            )
+        )
+
+        assert table.column("evidence").to_pylist()[3] == {
+            "type": "ThresholdScoreCheck",
+            "success": True,
+            "rawScore": 21.5,
+            "threshold": 20.0,
+        }
+        assert table.column("evidence").to_pylist()[4] == {
+            "type": "ThresholdScoreCheck",
+            "success": None,
+            "rawScore": 4.5,
+            "threshold": None,
+        }
+        assert table.column("stamp_scores").to_pylist()[3] == [
+            ("Google", 2.25),
+            ("Ens", 1.0),
+        ]
+
+    def test_typed_stamp_scores_stored_as_strings(self, scores):
+        Score.objects.filter(id=scores[0].id).update(
+            stamp_scores={"Google": "0.525", "Ens": "2"}
+        )
+
+        table = pa.Table.from_batches(
+            ArrowColumns(Score, typed_json=True).iter_batches(
+                Score.objects.filter(id=scores[0].id), 10
+            )
+        )
+
+        assert table.column("stamp_scores").to_pylist() == [
+            [("Google", 0.525), ("Ens", 2.0)]
+        ]
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_dump_parquet_to_s3(scores, local_s3, mocker, workers):
+    mocker.patch(
+        "ceramic_cache.management.commands.scorer_dump_data_parquet.create_process_executor",
+        return_value=InlineExecutor(),
+    )
+
+    out = StringIO()
+    call_command(
+        "scorer_dump_data_parquet",
+        apps="registry",
+        s3_uri="s3://bucket/dumps/",
+        batch_size=10,
+        row_group_size=8,
+        compression="zstd",
+        typed_json=True,
+        workers=workers,
+        stdout=out,
+    )
+
+    assert "Error" not in out.getvalue()
+    parquet_file = pq.ParquetFile(
+        pa.BufferReader(local_s3.objects[("bucket", "dumps/registry_score.parquet")])
+    )
+    assert [
+        parquet_file.metadata.row_group(i).num_rows
+        for i in range(parquet_file.num_row_groups)
+    ] == [8, 8, 8, 1]
+    assert parquet_file.schema_arrow.field("evidence").type == pa.struct(
+        [
+            ("type", pa.string()),
+            ("success", pa.bool_()),
+            ("rawScore", pa.float64()),
+            ("threshold", pa.float64()),
+        ]
+    )
+
+    table = parquet_file.read()
+    assert table.column("id").to_pylist() == [score.id for score in scores]
+    assert ("bucket", "dumps/registry_passport.parquet") in local_s3.objects
+    # Tables without rows are skipped
+    assert ("bucket", "dumps/registry_gtcstakeevent.parquet") not in local_s3.objects
+
+
+def test_stored_credentials_are_exported(scores):
+    credentials = [
+        {"credentialSubject": {"hash": f"v0.0.0:{i}"}, "issuer": "did:key:1234"}
+        for i in range(3)
+    ]
+    stored = StoredCredential.objects.store(credentials[1:])
+    compressed = stored[StoredCredential.hash_credential(credentials[2])]
+    compressed.compress()
+    compressed.save()
+
+    passport = scores[0].passport
+    Stamp.objects.bulk_create(
+        [
+            Stamp(passport=passport, hash="inline", credential=credentials[0]),
+            Stamp(
+                passport=passport,
+                hash="stored",
+                credential_ref=stored[StoredCredential.hash_credential(credentials[1])],
+            ),
+            Stamp(passport=passport, hash="compressed", credential_ref=compressed),
+        ]
+    )
+    queryset = Stamp.objects.order_by("id")
+
+    [(_, data)] = JsonlRows(Stamp).iter_batches(queryset, 10)
+    assert [row["credential"] for row in read_lines(data)] == credentials
+
+    [batch] = ArrowColumns(Stamp).iter_batches(queryset, 10)
+    assert [
+        json.loads(value) for value in batch.column("credential").to_pylist()
+    ] == credentials
+    assert batch.schema.names == [f.attname for f in Stamp._meta.local_fields]
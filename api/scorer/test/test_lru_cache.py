@@ -0,0 +1,51 @@
+from scorer.lru_cache import ExpiringLRUCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_entries_are_not_served_after_expiry():
+    clock = FakeClock()
+    cache = ExpiringLRUCache("test", max_size=10, clock=clock)
+
+    cache.set("key", "value", expires_at=clock.now + 5)
+    assert cache.get("key") == "value"
+
+    clock.now += 5
+    assert cache.get("key") is None
+    assert len(cache) == 0
+
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["expired"] == 1
+    assert stats["hit_rate"] == 0.5
+
+
+def test_already_expired_entries_are_not_stored():
+    clock = FakeClock()
+    cache = ExpiringLRUCache("test", max_size=10, clock=clock)
+
+    cache.set("key", "value", expires_at=clock.now)
+    assert len(cache) == 0
+
+
+def test_least_recently_used_entry_is_evicted():
+    clock = FakeClock()
+    cache = ExpiringLRUCache("test", max_size=2, clock=clock)
+
+    cache.set("a", 1, expires_at=clock.now + 60)
+    cache.set("b", 2, expires_at=clock.now + 60)
+    # Touch "a" so that "b" becomes the least recently used entry
+    assert cache.get("a") == 1
+    cache.set("c", 3, expires_at=clock.now + 60)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.stats()["evictions"] == 1
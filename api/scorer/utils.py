@@ -0,0 +1,16 @@
+"""
+Helpers shared by the bulk jobs (exports, imports and rescoring).
+"""
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor
+
+from django.db import connections
+
+
+def create_process_executor(workers: int) -> Executor:
+    # The forked workers must not share the database connections of this process, they will open
+    # their own connections
+    connections.close_all()
+    return ProcessPoolExecutor(
+        max_workers=workers, mp_context=multiprocessing.get_context("fork")
+    )